@@ -0,0 +1,124 @@
+"""Small asyncio HTTP/1.1 client for the check-in session.
+
+One keep-alive connection to one server, requests sent one at a time.
+Everything is an await on the event loop, so a request in flight (a
+long-poll held by the server, a stalled TLS handshake) is cancelled the
+moment its task is: the connection is dropped and the next request opens a
+new one.  Bodies come back inflated when the server gzipped them.
+
+Only what server_checkin.py needs: POST, Content-Length or chunked
+responses, no redirects, no proxies.  Response header names are lower case.
+"""
+import asyncio
+import gzip
+import json
+import urllib.parse
+
+class HTTPError(Exception):
+    """The server's reply was not HTTP we can read."""
+
+class Response:
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers          # {lower-case name: value}
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+class Connection:
+    def __init__(self, url, headers=None):
+        u = urllib.parse.urlsplit(url)
+        self.tls = u.scheme == "https"
+        self.host = u.hostname
+        self.port = u.port or (443 if self.tls else 80)
+        self.path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        default_port = self.port == (443 if self.tls else 80)
+        self.headers = {"Host": u.hostname if default_port else f"{u.hostname}:{self.port}"}
+        self.headers.update(headers or {})
+        self._reader = self._writer = None
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _connect(self, timeout):
+        ctx = None
+        if self.tls:
+            import ssl
+            ctx = ssl.create_default_context()
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ctx), timeout)
+
+    async def post(self, body, headers=None, timeout=(3, 7)):
+        """POST body; return a Response.  timeout is (connect, read) seconds.
+
+        A request on a reused connection the server has meanwhile closed is
+        retried once on a new one, as keep-alive clients do.
+        """
+        head = dict(self.headers, **(headers or {}))
+        head["Content-Length"] = str(len(body))
+        request = (f"POST {self.path} HTTP/1.1\r\n"
+                   + "".join(f"{k}: {v}\r\n" for k, v in head.items()) + "\r\n").encode() + body
+        while True:
+            fresh = self._writer is None
+            if fresh:
+                await self._connect(timeout[0])
+            try:
+                self._writer.write(request)
+                await self._writer.drain()
+                return await asyncio.wait_for(self._response(), timeout[1])
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                if fresh:
+                    raise
+            except BaseException:
+                self.close()  # timed out or cancelled mid-reply: the stream is unusable
+                raise
+
+    async def _response(self):
+        while True:
+            status_line = await self._reader.readuntil(b"\r\n")
+            parts = status_line.decode("latin-1").split(None, 2)
+            if len(parts) < 2 or not parts[0].startswith("HTTP/") or not parts[1].isdigit():
+                raise HTTPError(f"bad status line {status_line[:80]!r}")
+            status = int(parts[1])
+            headers = {}
+            while True:
+                line = (await self._reader.readuntil(b"\r\n")).decode("latin-1").rstrip("\r\n")
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if status >= 200:
+                break  # 1xx interim responses carry no body
+        if status in (204, 304):
+            content = b""
+        elif "chunked" in headers.get("transfer-encoding", "").lower():
+            content = await self._chunked()
+        elif "content-length" in headers:
+            content = await self._reader.readexactly(int(headers["content-length"]))
+        else:
+            content = await self._reader.read()
+            headers["connection"] = "close"
+        if "close" in headers.get("connection", "").lower():
+            self.close()
+        if headers.get("content-encoding", "").lower() == "gzip":
+            content = gzip.decompress(content)
+        return Response(status, headers, content)
+
+    async def _chunked(self):
+        chunks = []
+        while True:
+            size = int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            if not size:
+                while (await self._reader.readuntil(b"\r\n")) != b"\r\n":
+                    pass  # trailers
+                return b"".join(chunks)
+            chunks.append(await self._reader.readexactly(size))
+            await self._reader.readexactly(2)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""UPS-Lite fuel gauge and the TX duty-cycle governor built on it.
+
+The UPS-Lite carries a MAX17040 (v1.2, I2C 0x36) or CW2015 (v1.3, 0x62)
+fuel gauge; both report cell voltage at register 0x02 and state of charge
+at 0x04.  They are read through /dev/i2c-N directly, so no smbus package is
+needed.  WSPR_FUEL_GAUGE_FILE points at a JSON file {"soc": 55, "volts": 3.8}
+instead, for tests and bench runs.
+
+Governor.sample() keeps an hour of readings, predicts the remaining runtime
+from the discharge slope and picks the TX duty from DUTY_STEPS; below the
+last step the unit stops transmitting (and receives, if it has an RX band).
+Duty is the share of WSPR slots the transmitter may use: wspr_control.py
+leaves the other slots out rather than touching wspr's power argument.  With WSPR_TRIP_HOURS set it steps down
+further whenever the prediction falls short of the rest of the trip, and
+back up one step at a time once the charge has lasted comfortably (or the
+cell has been charging) for RELAX_SECONDS.
+
+    battery.py            # print one reading and the governor's choice
+"""
+import json
+import os
+import sys
+import time
+
+I2C_BUS = int(os.environ.get("WSPR_I2C_BUS", "1"))
+GAUGE_ADDR = int(os.environ.get("WSPR_FUEL_GAUGE_ADDR", "0x36"), 0)
+MOCK_FILE = os.environ.get("WSPR_FUEL_GAUGE_FILE", "")
+SAMPLE_INTERVAL = float(os.environ.get("WSPR_BATTERY_SAMPLE_SECS", "60"))
+TRIP_HOURS = float(os.environ.get("WSPR_TRIP_HOURS", "0"))  # 0: no trip target
+HISTORY_SECONDS = 3600
+MIN_SPAN = 300      # seconds of history needed before predicting
+HYSTERESIS = 3      # % above a step's floor before stepping back up
+RELAX_SECONDS = 1800    # trip target: sustained recovery before undoing a step...
+RELAX_MARGIN = 1.5      # ...with the forecast this many times the rest of the trip
+FULL_DUTY = 100     # TX in every slot, as wspr -r does without the governor
+
+# "min SOC %:% of slots with TX", highest first; below the last floor -> no TX
+DUTY_STEPS = [tuple(int(x) for x in step.split(":"))
+              for step in os.environ.get("WSPR_DUTY_STEPS", f"50:{FULL_DUTY},30:50,15:20").split(",")]
+
+I2C_SLAVE = 0x0703
+CW2015_ADDR = 0x62
+
+def _i2c_read(addr, reg, n):
+    import fcntl
+    fd = os.open(f"/dev/i2c-{I2C_BUS}", os.O_RDWR)
+    try:
+        fcntl.ioctl(fd, I2C_SLAVE, addr)
+        os.write(fd, bytes([reg]))
+        return os.read(fd, n)
+    finally:
+        os.close(fd)
+
+def _i2c_write(addr, reg, value):
+    import fcntl
+    fd = os.open(f"/dev/i2c-{I2C_BUS}", os.O_RDWR)
+    try:
+        fcntl.ioctl(fd, I2C_SLAVE, addr)
+        os.write(fd, bytes([reg, value]))
+    finally:
+        os.close(fd)
+
+def read_gauge():
+    """Return (soc_percent, volts), or None if there is no gauge to read."""
+    if MOCK_FILE:
+        try:
+            with open(MOCK_FILE) as f:
+                d = json.load(f)
+            return float(d["soc"]), float(d.get("volts", 0))
+        except (OSError, ValueError, KeyError):
+            return None
+    try:
+        if GAUGE_ADDR == CW2015_ADDR:
+            _i2c_write(GAUGE_ADDR, 0x0A, 0x00)  # MODE: wake from sleep
+        v = _i2c_read(GAUGE_ADDR, 0x02, 2)
+        s = _i2c_read(GAUGE_ADDR, 0x04, 2)
+    except OSError:
+        return None
+    raw = v[0] << 8 | v[1]
+    volts = (raw & 0x3FFF) * 305e-6 if GAUGE_ADDR == CW2015_ADDR else (raw >> 4) * 1.25e-3
+    return min(100.0, s[0] + s[1] / 256), round(volts, 3)
+
+class Governor:
+    """TX duty from the fuel gauge; see the module docstring.
+
+    A trip target that steps the duty down after a sag undoes the step once
+    the cell has recovered for RELAX_SECONDS:
+
+    >>> t, soc = [0.0], [90.0]
+    >>> gov = Governor(read=lambda: (soc[0], 3.9), clock=lambda: t[0], trip_hours=10)
+    >>> for _ in range(10):            # brown-out: 2 % a minute, empty well before the trip ends
+    ...     t[0] += 60; soc[0] -= 2; _ = gov.sample()
+    >>> gov.trip_steps, gov.duty
+    (1, 50)
+    >>> for _ in range(75):            # then 75 minutes on the charger
+    ...     t[0] += 60; soc[0] = min(100, soc[0] + 0.5); _ = gov.sample()
+    >>> gov.trip_steps, gov.duty
+    (0, 100)
+    """
+    def __init__(self, read=read_gauge, clock=time.monotonic, steps=DUTY_STEPS,
+                 trip_hours=TRIP_HOURS, interval=SAMPLE_INTERVAL):
+        self.read = read
+        self.clock = clock
+        self.steps = steps
+        self.interval = interval
+        self.trip_end = clock() + trip_hours * 3600 if trip_hours else None
+        self.history = []   # (t, soc)
+        self.soc = self.volts = None
+        self.level = 0          # index into steps; len(steps) means receive-only
+        self.trip_steps = 0     # extra steps taken to stretch runtime to the trip end
+        self._recovered = None  # since when the forecast has covered the trip with margin
+        self._next = clock()
+
+    @property
+    def rx_only(self):
+        return self.level >= len(self.steps)
+
+    @property
+    def duty(self):
+        return self.steps[min(self.level, len(self.steps) - 1)][1]
+
+    @property
+    def throttled(self):
+        """Transmitting, but in fewer than every slot."""
+        return not self.rx_only and self.duty < FULL_DUTY
+
+    def due(self):
+        return max(0.0, self._next - self.clock())
+
+    def maybe_sample(self):
+        """Sample if due; True when the duty or mode changed."""
+        return self.sample() if self.due() == 0.0 else False
+
+    def sample(self):
+        self._next = self.clock() + self.interval
+        reading = self.read()
+        if reading is None:
+            return False
+        now = self.clock()
+        self.soc, self.volts = reading
+        self.history.append((now, self.soc))
+        self.history = [(t, s) for t, s in self.history if now - t <= HISTORY_SECONDS]
+        before = self.level
+        self.level = self._choose()
+        if self.level == before:
+            return False
+        # The old slope belongs to the old duty; predict afresh from here
+        self.history = self.history[-1:]
+        return True
+
+    def _slope(self):
+        """Charge trend in % per second; None until there is MIN_SPAN of history."""
+        if len(self.history) < 2 or self.history[-1][0] - self.history[0][0] < MIN_SPAN:
+            return None
+        n = len(self.history)
+        mt = sum(t for t, _ in self.history) / n
+        ms = sum(s for _, s in self.history) / n
+        var = sum((t - mt) ** 2 for t, _ in self.history)
+        return sum((t - mt) * (s - ms) for t, s in self.history) / var
+
+    def runtime_hours(self):
+        """Predicted hours to empty from the recent discharge slope; None if not discharging."""
+        slope = self._slope()
+        if slope is None or slope >= 0:
+            return None
+        return self.soc / -slope / 3600
+
+    def _choose(self):
+        # First step whose floor the charge clears; stepping back up needs HYSTERESIS more
+        level = len(self.steps)
+        for i, (floor, _) in enumerate(self.steps):
+            if self.soc >= floor + (HYSTERESIS if i < self.level else 0):
+                level = i
+                break
+        if self.trip_end:
+            self._trip_target()
+        return min(level + self.trip_steps, len(self.steps))
+
+    def _trip_target(self):
+        # One more step down each time a forecast at this duty falls short of the trip end;
+        # one back up after RELAX_SECONDS of forecasts with RELAX_MARGIN to spare (or charging)
+        now = self.clock()
+        rest, slope = self.trip_end - now, self._slope()
+        if rest <= 0:
+            self.trip_steps, self._recovered = 0, None
+        elif slope is None:
+            pass    # no forecast yet (just started, or just changed duty)
+        elif slope < 0 and self.soc / -slope < rest:
+            self.trip_steps = min(self.trip_steps + 1, len(self.steps))
+            self._recovered = None
+        elif self.trip_steps and (slope >= 0 or self.soc / -slope >= rest * RELAX_MARGIN):
+            if self._recovered is None:
+                self._recovered = now
+            elif now - self._recovered >= RELAX_SECONDS:
+                self.trip_steps -= 1
+                self._recovered = None
+        else:
+            self._recovered = None
+
+    def status(self):
+        left = self.runtime_hours()
+        mode = "no TX" if self.rx_only else f"TX in {self.duty}% of slots"
+        est = f"~{left:.1f} h left" if left is not None else "runtime unknown"
+        return f"battery {self.soc:.0f}% {self.volts:.2f} V, {est}; {mode}"
+
+def main():
+    reading = read_gauge()
+    if reading is None:
+        src = MOCK_FILE or f"/dev/i2c-{I2C_BUS} address {GAUGE_ADDR:#04x}"
+        print(f"No fuel gauge found ({src})")
+        return 1
+    gov = Governor(read=lambda: reading)
+    gov.sample()
+    print(gov.status())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
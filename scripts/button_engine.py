@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""Utility-button state machine, fed by timestamped edge events.
+
+The GPIO edge callback only calls ButtonEngine.on_edge(), which queues
+(timestamp, pressed) and returns.  A single worker thread consumes the
+queue and runs the actions; the multi-press window is a deadline on the
+queue wait, not a polling loop.
+
+Sequences (unchanged from the original utility-button.py):
+  - first press of a sequence    -> actions.pause()   (LED ack)
+  - 5 presses inside the window  -> actions.setup()   (start check-in)
+  - 1 press held >= hold_time    -> actions.shutdown() on release
+  - window expires, no action    -> actions.resume()
+
+FakeGPIO stands in for RPi.GPIO so press sequences can be replayed and
+timed off the Pi:
+
+    button_engine.py --replay "p0 r0.1 p0.3 r0.4 ..." [--window 2] [--hold 1]
+"""
+import argparse
+import queue
+import threading
+import time
+
+class ButtonEngine:
+    def __init__(self, actions, press_window, hold_time, setup_presses=5,
+                 clock=time.monotonic, log=print):
+        self.actions = actions
+        self.press_window = press_window
+        self.hold_time = hold_time
+        self.setup_presses = setup_presses
+        self.clock = clock
+        self.log = log
+        self.events = queue.Queue()
+        # sequence state (worker thread only)
+        self.presses = 0
+        self.last_press = 0.0
+        self.deadline = 0.0
+        self.paused = False     # pause() ran for this sequence
+        self.acted = False      # setup or shutdown happened in this sequence
+        self.down = False
+        self._thread = None
+
+    # -- producer side (GPIO edge thread) --
+    def on_edge(self, pressed, t=None):
+        self.events.put((self.clock() if t is None else t, bool(pressed)))
+
+    def stop(self):
+        self.events.put(None)
+
+    # -- consumer side --
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="button-engine", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def run(self):
+        while True:
+            timeout = None
+            if self._window_pending():
+                timeout = max(0.0, self.deadline - self.clock())
+            try:
+                ev = self.events.get(timeout=timeout)
+            except queue.Empty:
+                self._expire()
+                continue
+            if ev is None:
+                return
+            t, pressed = ev
+            if self._window_pending() and t > self.deadline:
+                self._expire()  # window ran out before this (late-processed) edge
+            if pressed:
+                self._press(t)
+            else:
+                self._release(t)
+
+    def _window_pending(self):
+        return self.paused and not self.acted and not self.down and self.deadline > 0
+
+    def _reset(self):
+        self.presses = 0
+        self.last_press = 0.0
+        self.deadline = 0.0
+
+    def _press(self, t):
+        self.down = True
+        if t > self.deadline:
+            self.presses = 0
+            self.acted = False
+        self.presses += 1
+        self.last_press = t
+        self.deadline = t + self.press_window
+        self.log(f"Button press counted: {self.presses}")
+
+        if self.presses == 1 and not self.paused:
+            self.paused = True
+            self.actions.pause()
+
+        if self.presses >= self.setup_presses and not self.acted:
+            self.log(f"{self.setup_presses} presses detected: starting setup check-in service.")
+            if self.actions.setup():
+                self.acted = True
+                self.paused = False  # setup owns the service lifecycle now
+            self._reset()
+
+    def _release(self, t):
+        self.down = False
+        if not self.last_press:
+            return
+        held = t - self.last_press
+        if held >= self.hold_time and not self.acted and self.presses == 1:
+            self.log(f"Button held for {int(self.hold_time)} seconds: shutting down.")
+            if self.actions.shutdown():
+                self.acted = True
+                self.paused = False
+            else:
+                self.acted = False
+                self._resume()
+                self._reset()
+
+    def _expire(self):
+        self.log("Multi-press window ended with no action.")
+        self._resume()
+        self._reset()
+
+    def _resume(self):
+        if self.paused:
+            self.actions.resume()
+            self.paused = False
+
+class FakeGPIO:
+    """Minimal RPi.GPIO stand-in: records outputs and replays button edges."""
+    BCM = 11; OUT = 1; IN = 0; HIGH = 1; LOW = 0
+    PUD_UP = 22; BOTH = 33; RISING = 31; FALLING = 32
+
+    def __init__(self):
+        self.levels = {}
+        self.callbacks = {}
+        self.outputs = []
+
+    def setmode(self, *a): pass
+    def setwarnings(self, *a): pass
+    def cleanup(self, *a): pass
+
+    def setup(self, pin, mode, pull_up_down=None, initial=None):
+        self.levels[pin] = self.HIGH if mode == self.IN else (initial or self.LOW)
+
+    def input(self, pin):
+        return self.levels.get(pin, self.HIGH)
+
+    def output(self, pin, value):
+        self.levels[pin] = value
+        self.outputs.append((time.monotonic(), pin, value))
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.callbacks[pin] = callback
+
+    def set_button(self, pin, pressed):
+        """Drive the (active-low) button and fire the edge callback."""
+        self.levels[pin] = self.LOW if pressed else self.HIGH
+        cb = self.callbacks.get(pin)
+        if cb:
+            cb(pin)
+
+def replay(gpio, pin, script, speed=1.0):
+    """Play "p<t>"/"r<t>" (press/release at t seconds) tokens against gpio."""
+    t0 = time.monotonic()
+    for tok in script.split():
+        at = float(tok[1:]) / speed
+        delay = t0 + at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        gpio.set_button(pin, tok[0] == "p")
+
+class _RecordingActions:
+    def __init__(self, t0):
+        self.t0 = t0
+        self.calls = []
+
+    def _rec(self, name):
+        self.calls.append((time.monotonic() - self.t0, name))
+        print(f"{time.monotonic() - self.t0:7.3f}s  action: {name}", flush=True)
+        return True
+
+    def pause(self):    return self._rec("pause")
+    def resume(self):   return self._rec("resume")
+    def setup(self):    return self._rec("setup")
+    def shutdown(self): return self._rec("shutdown")
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay a button press sequence through the engine")
+    ap.add_argument("--replay", required=True, help='e.g. "p0 r0.1 p0.3 r0.4" (seconds)')
+    ap.add_argument("--window", type=float, default=12.0, help="multi-press window (s)")
+    ap.add_argument("--hold", type=float, default=10.0, help="shutdown hold time (s)")
+    args = ap.parse_args()
+
+    pin = 19
+    gpio = FakeGPIO()
+    gpio.setup(pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+    t0 = time.monotonic()
+    engine = ButtonEngine(_RecordingActions(t0), args.window, args.hold,
+                          log=lambda m: print(f"{time.monotonic() - t0:7.3f}s  {m}", flush=True))
+    gpio.add_event_detect(pin, gpio.BOTH,
+                          callback=lambda ch: engine.on_edge(gpio.input(ch) == gpio.LOW))
+    worker = engine.start()
+    replay(gpio, pin, args.replay)
+    # Let any pending window expire, then stop
+    time.sleep(max(0.0, engine.deadline - time.monotonic()) + 0.2 if engine.deadline else 0.2)
+    engine.stop()
+    worker.join()
+
+if __name__ == "__main__":
+    main()
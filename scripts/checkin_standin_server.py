@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""Local stand-in for the wspr-zero.com check-in listener.
+
+Lets server_checkin.py be exercised offline: point it here with
+WSPR_SERVER_URL=http://127.0.0.1:8080/ and edit the --config file to
+simulate a user saving settings in the web UI.
+
+The real listener is not in this tree.  What this serves is the protocol
+server_checkin.py proposes; the client works against a listener that
+only answers a plain POST with the config JSON, and uses each extension
+below only once the listener shows it supports it:
+  POST /  {"MAC_address": ..., [status fields]}  -> 200 config JSON + ETag
+  with If-None-Match equal to the current ETag    -> 304, empty body
+  plus "Prefer: wait=N" (long-poll)               -> held until the config
+                                                     changes or N seconds pass
+Every response carries "X-Wspr-Longpoll: 1" (unless --no-longpoll) and,
+once the user has finished, "X-Wspr-Session: done".
+
+Status versions (unless --no-delta): a POST with "X-Wspr-Status-Version: N"
+replaces the device's status with its fields, or with "X-Wspr-Status-Base: B"
+as well, applies them as changes to version B (null removes a field).  The
+response's X-Wspr-Status-Version is the version the server now holds, so a
+delta against a base it does not have is answered with the old version and
+the client resends everything.  Unless --no-gzip, a response to a plain
+request body large enough to be worth compressing advertises
+"Accept-Encoding: gzip" (RFC 7694), and responses are gzipped for clients
+that accept it.
+
+To support the whole protocol, the real listener has to handle:
+  request:  If-None-Match, Prefer: wait=N, X-Wspr-Status-Version,
+            X-Wspr-Status-Base, Content-Encoding: gzip (or 415 if it is
+            unsupported), Accept-Encoding: gzip
+  response: ETag, 304 Not Modified, X-Wspr-Longpoll, X-Wspr-Session,
+            X-Wspr-Status-Version, Accept-Encoding, Content-Encoding
+
+GET /__stats returns connection (handshake), request and byte counters,
+GET /__status the stored status per MAC; POST /__reset zeroes the counters
+and POST /__done ends the setup session.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.connections = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def add(self, **kw):
+        with self.lock:
+            for k, v in kw.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def as_dict(self):
+        with self.lock:
+            return {k: getattr(self, k) for k in
+                    ("connections", "requests", "not_modified", "bytes_in", "bytes_out")}
+
+class _Counting:
+    """File wrapper that adds every byte read/written to a Stats field."""
+    def __init__(self, f, stats, field):
+        self._f, self._stats, self._field = f, stats, field
+
+    def _count(self, data):
+        self._stats.add(**{self._field: len(data)})
+        return data
+
+    def read(self, *a):     return self._count(self._f.read(*a))
+    def readline(self, *a): return self._count(self._f.readline(*a))
+    def write(self, data):
+        self._stats.add(**{self._field: len(data)})
+        return self._f.write(data)
+    def __getattr__(self, name): return getattr(self._f, name)
+
+class ConfigSource:
+    """Config JSON re-read from disk whenever its mtime changes."""
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self.config, self.etag = {}, None
+        self.lock = threading.Lock()
+
+    def current(self):
+        with self.lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                return self.config, self.etag
+            if mtime != self._mtime:
+                with open(self.path) as f:
+                    self.config = json.load(f)
+                body = json.dumps(self.config, sort_keys=True, separators=(',', ':')).encode()
+                self.etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+                self._mtime = mtime
+            return self.config, self.etag
+
+LONGPOLL_RECHECK = 0.2  # seconds between config-file checks while holding a request
+GZIP_MIN_BYTES = 128    # responses smaller than this are sent as they are
+
+def make_handler(source, stats, status_store, done, longpoll=True, delta=True, compress=True):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        advertise_gzip = False         # the request body was worth compressing and was not
+
+        def setup(self):
+            super().setup()
+            stats.add(connections=1)
+            self.rfile = _Counting(self.rfile, stats, "bytes_in")
+            self.wfile = _Counting(self.wfile, stats, "bytes_out")
+
+        def log_message(self, *a):
+            pass
+
+        def _send(self, code, body=b'', etag=None, version=None):
+            self.send_response(code)
+            if longpoll:
+                self.send_header("X-Wspr-Longpoll", "1")
+            if done.is_set():
+                self.send_header("X-Wspr-Session", "done")
+            if self.advertise_gzip:
+                self.send_header("Accept-Encoding", "gzip")
+            if version is not None:
+                self.send_header("X-Wspr-Status-Version", str(version))
+            if etag:
+                self.send_header("ETag", etag)
+            if body:
+                self.send_header("Content-Type", "application/json")
+                if (compress and len(body) >= GZIP_MIN_BYTES
+                        and "gzip" in self.headers.get("Accept-Encoding", "").lower()):
+                    body = gzip.compress(body, mtime=0)
+                    self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/__stats":
+                return self._send(200, json.dumps(stats.as_dict()).encode())
+            if self.path == "/__status":
+                return self._send(200, json.dumps(status_store).encode())
+            self._send(404)
+
+        def _store_status(self, data):
+            """Apply a status POST; return the version now held for the device (None: not a versioned POST)."""
+            mac = data.get("MAC_address", "")
+            entry = status_store.setdefault(mac, {"version": 0, "status": {}})
+            version = self.headers.get("X-Wspr-Status-Version")
+            if not delta or not version:
+                if len(data) > 1:
+                    entry["status"].update(data)
+                return None
+            base = self.headers.get("X-Wspr-Status-Base")
+            if base is None:
+                entry["status"] = dict(data)
+            elif base == str(entry["version"]):
+                entry["status"].update(data)
+                for k in [k for k, v in data.items() if v is None]:
+                    del entry["status"][k]
+            else:
+                return entry["version"]  # unknown base: the client sends everything again
+            entry["version"] = int(version)
+            return entry["version"]
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if self.path == "/__reset":
+                stats.reset()
+                done.clear()
+                return self._send(204)
+            if self.path == "/__done":
+                done.set()
+                return self._send(204)
+            stats.add(requests=1)
+            gzipped = self.headers.get("Content-Encoding", "").lower() == "gzip"
+            self.advertise_gzip = compress and not gzipped and len(body) >= GZIP_MIN_BYTES
+            if gzipped:
+                if not compress:
+                    return self._send(415)
+                try:
+                    body = gzip.decompress(body)
+                except (OSError, EOFError):
+                    return self._send(400)
+            try:
+                data = json.loads(body or b'{}')
+            except ValueError:
+                return self._send(400)
+            version = self._store_status(data)
+            config, etag = source.current()
+            m = re.search(r'wait=(\d+(?:\.\d+)?)', self.headers.get("Prefer", ""))
+            if longpoll and m:
+                deadline = time.monotonic() + float(m.group(1))
+                while (etag and self.headers.get("If-None-Match") == etag
+                       and time.monotonic() < deadline and not done.is_set()):
+                    done.wait(min(LONGPOLL_RECHECK, max(0.0, deadline - time.monotonic())))
+                    config, etag = source.current()
+            if etag and self.headers.get("If-None-Match") == etag:
+                stats.add(not_modified=1)
+                return self._send(304, etag=etag, version=version)
+            self._send(200, json.dumps(config, separators=(',', ':')).encode(), etag, version)
+    return Handler
+
+def serve(config_path, host="127.0.0.1", port=8080, certfile=None, keyfile=None, longpoll=True,
+          delta=True, compress=True):
+    """Start the stand-in in a background thread; return (server, stats)."""
+    stats = Stats()
+    handler = make_handler(ConfigSource(config_path), stats, {}, threading.Event(), longpoll,
+                           delta, compress)
+    httpd = ThreadingHTTPServer((host, port), handler)
+    if certfile:
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ctx.load_cert_chain(certfile, keyfile)
+        httpd.socket = ctx.wrap_socket(httpd.socket, server_side=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, stats
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline stand-in for the check-in listener")
+    ap.add_argument("--config", required=True, help="JSON file served as the device config")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--cert", help="serve HTTPS with this certificate (PEM)")
+    ap.add_argument("--key", help="private key for --cert")
+    ap.add_argument("--no-longpoll", action="store_true", help="behave like an older, poll-only server")
+    ap.add_argument("--no-delta", action="store_true", help="keep no status versions (full status every time)")
+    ap.add_argument("--no-gzip", action="store_true", help="neither take nor send gzipped bodies")
+    args = ap.parse_args()
+    httpd, _ = serve(args.config, args.host, args.port, args.cert, args.key, not args.no_longpoll,
+                     not args.no_delta, not args.no_gzip)
+    scheme = "https" if args.cert else "http"
+    print(f"Stand-in listener on {scheme}://{args.host}:{httpd.server_address[1]}/", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        httpd.shutdown()
+
+if __name__ == "__main__":
+    main()
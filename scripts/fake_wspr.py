@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Stand-in for the WsprryPi `wspr` transmitter, for offline timing benches.
+
+Takes the same command line wspr_control.py builds (-r -o -f CALL GRID
+POWER BAND...) and behaves like the real binary as far as timing goes:
+poll the clock every millisecond until the even minute, wait the WSPR one
+second, log the start, then step through 162 symbols against absolute
+deadlines.  No RF, no root.  The start/end lines use WsprryPi's format so
+tx_timing.py reads them the same way.
+
+    WSPR_SLOT_SECONDS   slot length (default 120); the whole timeline scales with it
+    WSPR_FAKE_TX_COUNT  exit with status 1 after this many transmissions (0: never)
+"""
+import os
+import sys
+import time
+
+SLOT_SECONDS = int(os.environ.get("WSPR_SLOT_SECONDS", "120"))
+TX_COUNT = int(os.environ.get("WSPR_FAKE_TX_COUNT", "0"))
+SCALE = SLOT_SECONDS / 120
+START_DELAY = 1.0 * SCALE               # WSPR transmissions begin 1 s into the slot
+SYMBOL_SECONDS = 8192 / 12000 * SCALE
+SYMBOLS = 162
+
+def _stamp(t):
+    return time.strftime("UTC %Y-%m-%d %H:%M:%S", time.gmtime(t)) + f".{int(t % 1 * 1000):03d}"
+
+def transmit(band):
+    print("Waiting for next WSPR transmission window...", flush=True)
+    boundary = (int(time.time()) // SLOT_SECONDS + 1) * SLOT_SECONDS
+    while time.time() < boundary:
+        time.sleep(0.001)
+    time.sleep(START_DELAY)
+    start = time.time()
+    print(f"TX started at: {_stamp(start)} on {band}", flush=True)
+    for i in range(1, SYMBOLS + 1):
+        delay = start + i * SYMBOL_SECONDS - time.time()
+        if delay > 0:
+            time.sleep(delay)
+    print(f"TX ended at:   {_stamp(time.time())}", flush=True)
+
+def main(argv):
+    repeat = "-r" in argv
+    args = [a for a in argv if not a.startswith("-")]
+    bands = args[3:] or ["20m"]
+    sent = 0
+    while True:
+        for band in bands:
+            transmit(band)
+            sent += 1
+            if TX_COUNT and sent >= TX_COUNT:
+                return 1
+        if not repeat:
+            return 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        sys.exit(0)
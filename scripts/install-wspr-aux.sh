@@ -4,6 +4,7 @@
 # Installs WSPR-zero aux systemd units:
 #   1) wspr-server-checkin.service  (oneshot @ boot + on-demand)
 #   2) wspr-utility-button.service  (continuous; auto-restart)
+#   3) wspr-led.service             (owns the status LED; plays patterns for 1 and 2)
 #
 # Defaults:
 #   - Repo root:  /opt/wsprzero/wspr-zero
@@ -15,6 +16,8 @@
 #   --uninstall         Remove aux units (leaves wspr-service alone)
 #   --checkin-only      Install only the check-in unit
 #   --button-only       Install only the utility-button unit
+#   --tx-cpu <n>        Keep these services off core n (the transmitter's core;
+#                       see install-wspr-service.sh --tx-cpu)
 #
 # Quick start:
 #   sudo chmod +x scripts/install-wspr-aux.sh
@@ -35,12 +38,14 @@ WSPR_ROOT="$WSPR_ROOT_DEFAULT"
 
 CHECKIN_UNIT="wspr-server-checkin.service"
 BUTTON_UNIT="wspr-utility-button.service"
+LED_UNIT="wspr-led.service"
 MAIN_SERVICE="wspr-service.service"
 
 INSTALL_CHECKIN=1
 INSTALL_BUTTON=1
 ENABLE_AFTER_INSTALL=1
 UNINSTALL=0
+TX_CPU=""
 
 BOOTCFG_UNIT="wspr-boot-config.service"
 
@@ -52,6 +57,7 @@ while [[ $# -gt 0 ]]; do
     --uninstall)   UNINSTALL=1; shift ;;
     --checkin-only) INSTALL_CHECKIN=1; INSTALL_BUTTON=0; shift ;;
     --button-only)  INSTALL_CHECKIN=0; INSTALL_BUTTON=1; shift ;;
+    --tx-cpu)      TX_CPU="${2:-}"; [[ "$TX_CPU" =~ ^[0-9]+$ ]] || { echo "--tx-cpu needs a core number"; exit 2; }; shift 2 ;;
     -h|--help)     sed -n '1,200p' "$0"; exit 0 ;;
     *)             echo "Unknown option: $1"; exit 2 ;;
   esac
@@ -59,9 +65,23 @@ done
 
 CHECKIN_SCRIPT="${WSPR_ROOT}/scripts/server_checkin.py"
 BUTTON_SCRIPT="${WSPR_ROOT}/scripts/utility-button.py"
+LED_SCRIPT="${WSPR_ROOT}/scripts/led_service.py"
 CONFIG_JSON="${WSPR_ROOT}/wspr-config.json"
 
 # ---------- helpers ----------
+# CPUAffinity= line listing every core except TX_CPU (nothing if unset or single-core)
+helper_affinity() {
+  [[ -n "$TX_CPU" ]] || return 0
+  local cores=() c
+  for ((c = 0; c < $(nproc --all); c++)); do
+    [[ $c -ne $TX_CPU ]] && cores+=("$c")
+  done
+  if [[ ${#cores[@]} -eq 0 ]]; then
+    echo "Single-core system: not pinning helpers away from cpu${TX_CPU}" >&2
+    return 0
+  fi
+  echo "CPUAffinity=${cores[*]}"
+}
 need_root() {
   if [[ ${EUID:-$(id -u)} -ne 0 ]]; then
     echo "Please run as root (sudo)." >&2
@@ -84,6 +104,7 @@ uninstall_all() {
   stop_disable_rm "$CHECKIN_UNIT"
   stop_disable_rm "$BUTTON_UNIT"
   stop_disable_rm "$BOOTCFG_UNIT"
+  stop_disable_rm "$LED_UNIT"
   systemctl daemon-reload
   echo "Done."
 }
@@ -99,6 +120,7 @@ ConditionPathExists=${WSPR_ROOT}/scripts/wspr-boot-config.py
 [Service]
 Type=oneshot
 WorkingDirectory=${WSPR_ROOT}
+$(helper_affinity)
 User=root
 UMask=0002
 ExecStart=/usr/bin/python3 ${WSPR_ROOT}/scripts/wspr-boot-config.py
@@ -109,27 +131,50 @@ EOF
   chmod 0644 "/etc/systemd/system/${BOOTCFG_UNIT}"
 }
 
+write_led_unit() {
+  cat > "/etc/systemd/system/${LED_UNIT}" <<EOF
+[Unit]
+Description=WSPR-zero status LED (GPIO 18; patterns requested over /run/wspr-led.sock)
+After=local-fs.target
+Before=${CHECKIN_UNIT} ${BUTTON_UNIT}
+ConditionPathExists=${LED_SCRIPT}
+
+[Service]
+Type=simple
+WorkingDirectory=${WSPR_ROOT}
+$(helper_affinity)
+User=root
+Environment=PYTHONUNBUFFERED=1
+ExecStart=/usr/bin/python3 ${LED_SCRIPT}
+Restart=always
+RestartSec=2
+
+[Install]
+WantedBy=multi-user.target
+EOF
+  chmod 0644 "/etc/systemd/system/${LED_UNIT}"
+}
+
 write_checkin_unit() {
   cat > "/etc/systemd/system/${CHECKIN_UNIT}" <<EOF
 [Unit]
 Description=WSPR-zero one-shot server check-in (LED blink + remote config pull)
-Wants=network-online.target
-After=network-online.target
+Wants=network-online.target ${LED_UNIT}
+After=network-online.target ${LED_UNIT}
 Before=${MAIN_SERVICE}
 ConditionPathExists=${CHECKIN_SCRIPT}
 
 [Service]
 Type=oneshot
 WorkingDirectory=${WSPR_ROOT}
+$(helper_affinity)
 User=root
 UMask=0002
 Environment=PYTHONUNBUFFERED=1
 
 TimeoutStartSec=120 
-# If main service running (manual start), stop it first; ignore error if inactive
-ExecStartPre=-/bin/systemctl stop ${MAIN_SERVICE}
-
-# Do the check-in (LED, server pull, write config)
+# Do the check-in (LED, server pull, write config).  The script stops the main
+# service itself, over D-Bus, while it collects status and makes the first POST
 ExecStart=/usr/bin/python3 ${CHECKIN_SCRIPT}
 
 # Start/restart main service after check-in
@@ -145,12 +190,14 @@ write_button_unit() {
   cat > "/etc/systemd/system/${BUTTON_UNIT}" <<EOF
 [Unit]
 Description=WSPR-zero utility button (GPIO 19; 5x = setup, 10s hold = shutdown)
-After=multi-user.target
+Wants=${LED_UNIT}
+After=multi-user.target ${LED_UNIT}
 ConditionPathExists=${BUTTON_SCRIPT}
 
 [Service]
 Type=simple
 WorkingDirectory=${WSPR_ROOT}
+$(helper_affinity)
 User=root
 UMask=0002
 Environment=PYTHONUNBUFFERED=1
@@ -186,6 +233,7 @@ find "${WSPR_ROOT}/logs" -type d -exec chmod 2775 {} +
 find "${WSPR_ROOT}/logs" -type f -exec chmod 0664 {} + || true
 
 # write units
+write_led_unit
 [[ $INSTALL_CHECKIN -eq 1 ]] && write_checkin_unit
 [[ $INSTALL_BUTTON  -eq 1 ]] && write_button_unit
 
@@ -195,12 +243,14 @@ write_bootcfg_unit
 systemctl daemon-reload
 
 if [[ $ENABLE_AFTER_INSTALL -eq 1 ]]; then
+  systemctl enable --now "${LED_UNIT}"
   systemctl enable "${CHECKIN_UNIT}"
   systemctl start --no-block "${CHECKIN_UNIT}"
   [[ $INSTALL_BUTTON  -eq 1 ]] && systemctl enable --now "${BUTTON_UNIT}"
 fi
 
 echo "Installed aux units:"
+echo "  - ${LED_UNIT}"
 [[ $INSTALL_CHECKIN -eq 1 ]] && echo "  - ${CHECKIN_UNIT}"
 [[ $INSTALL_BUTTON  -eq 1 ]] && echo "  - ${BUTTON_UNIT}"
 echo "Done."
@@ -19,6 +19,15 @@
 #   --no-watch         Don’t install the watcher
 #   --supervised       Force supervised mode (default)
 #   --oneshot          Install legacy oneshot unit (no auto-restart)
+#   --tx-sched <p[:n]> Transmitter scheduling policy, e.g. fifo:50 (WSPR_TX_SCHED)
+#   --tx-cpu <n>       Core for the transmitter (WSPR_TX_CPU); pair with
+#                      install-wspr-aux.sh --tx-cpu <n> to move the helpers off it
+#   --tx-ioclass <c>   Transmitter I/O class, e.g. realtime:4 (WSPR_TX_IOCLASS)
+#   --spool            Spool decoded spots and upload them in batches when online
+#                      (WSPR_SPOT_SPOOL=1 + wspr-spot-upload.service); needs --spool-url
+#   --spool-url <url>  Where the uploader posts (WSPR_SPOT_UPLOAD_URL). The batch layout
+#                      is not yet verified against WSPRnet, so there is no default;
+#                      http://wsprnet.org/meptspots.php opts in to the live service
 #
 # Quick start:
 #   sudo chmod +x scripts/install-wspr-service.sh
@@ -50,6 +59,7 @@ set -euo pipefail
 SERVICE_NAME="wspr-service.service"
 RELOAD_SERVICE_NAME="wspr-service-reload.service"
 PATH_UNIT_NAME="wspr-service.path"
+UPLOAD_UNIT_NAME="wspr-spot-upload.service"
 
 # legacy names to purge if they still exist
 LEGACY_UNITS=("wspr.service" "wspr.path" "wspr-reload.service")
@@ -62,6 +72,9 @@ INSTALL_WATCH=1
 UNINSTALL=0
 ENABLE_AFTER_INSTALL=1
 SERVICE_MODE="supervised"   # default; set to "oneshot" with --oneshot
+SERVICE_ENV=()              # extra Environment= lines (transmitter settings, spool)
+INSTALL_SPOOL=0
+SPOOL_URL=""
 
 # -------- args --------
 while [[ $# -gt 0 ]]; do
@@ -72,10 +85,19 @@ while [[ $# -gt 0 ]]; do
     --no-watch)    INSTALL_WATCH=0; shift ;;
     --supervised)  SERVICE_MODE="supervised"; shift ;;
     --oneshot)     SERVICE_MODE="oneshot"; shift ;;
+    --tx-sched)    SERVICE_ENV+=("WSPR_TX_SCHED=${2:?Missing policy for --tx-sched}"); shift 2 ;;
+    --tx-cpu)      SERVICE_ENV+=("WSPR_TX_CPU=${2:?Missing core for --tx-cpu}"); shift 2 ;;
+    --tx-ioclass)  SERVICE_ENV+=("WSPR_TX_IOCLASS=${2:?Missing class for --tx-ioclass}"); shift 2 ;;
+    --spool)       INSTALL_SPOOL=1; SERVICE_ENV+=("WSPR_SPOT_SPOOL=1"); shift ;;
+    --spool-url)   SPOOL_URL="${2:?Missing URL for --spool-url}"; shift 2 ;;
     -h|--help)     sed -n '1,200p' "$0"; exit 0 ;;
     *)             echo "Unknown option: $1"; exit 2 ;;
   esac
 done
+if [[ $INSTALL_SPOOL -eq 1 && -z "$SPOOL_URL" ]]; then
+  echo "--spool needs --spool-url: the decoder stops reporting spots itself, and the uploader has no default server."
+  exit 2
+fi
 
 CONTROLLER="${WSPR_ROOT}/scripts/wspr_control.py"
 CONFIG_JSON="${WSPR_ROOT}/wspr-config.json"
@@ -101,6 +123,7 @@ stop_disable_rm_unit() {
 uninstall_all() {
   echo "Uninstalling ${SERVICE_NAME} and watcher…"
   stop_disable_rm_unit "${PATH_UNIT_NAME}"
+  stop_disable_rm_unit "${UPLOAD_UNIT_NAME}"
   stop_disable_rm_unit "${RELOAD_SERVICE_NAME}"
   stop_disable_rm_unit "${SERVICE_NAME}"
   # also clean any legacy-named units
@@ -109,6 +132,11 @@ uninstall_all() {
   echo "Done."
 }
 
+service_env_lines() {
+  local kv
+  for kv in "${SERVICE_ENV[@]}"; do echo "Environment=${kv}"; done
+}
+
 write_service_unit_supervised() {
   cat > "/etc/systemd/system/${SERVICE_NAME}" <<EOF
 [Unit]
@@ -123,6 +151,7 @@ WorkingDirectory=${WSPR_ROOT}
 User=root
 UMask=0002
 Environment=PYTHONUNBUFFERED=1
+$(service_env_lines)
 Restart=always
 RestartSec=5
 KillMode=control-group
@@ -190,6 +219,31 @@ EOF
   chmod 0644 "/etc/systemd/system/${PATH_UNIT_NAME}"
 }
 
+write_upload_unit() {
+  cat > "/etc/systemd/system/${UPLOAD_UNIT_NAME}" <<EOF
+[Unit]
+Description=WSPR-zero spot uploader (drains ${WSPR_ROOT}/logs/spool when online)
+Wants=network-online.target
+After=network-online.target
+ConditionPathExists=${WSPR_ROOT}/scripts/spot_spool.py
+
+[Service]
+Type=simple
+WorkingDirectory=${WSPR_ROOT}
+User=root
+UMask=0002
+Environment=PYTHONUNBUFFERED=1
+Environment=WSPR_SPOT_UPLOAD_URL=${SPOOL_URL}
+ExecStart=/usr/bin/python3 ${WSPR_ROOT}/scripts/spot_spool.py upload --follow
+Restart=always
+RestartSec=30
+
+[Install]
+WantedBy=multi-user.target
+EOF
+  chmod 0644 "/etc/systemd/system/${UPLOAD_UNIT_NAME}"
+}
+
 # -------- main --------
 need_root
 need_systemd
@@ -326,6 +380,12 @@ if [[ $INSTALL_WATCH -eq 1 ]]; then
   write_watcher_units
 fi
 
+if [[ $INSTALL_SPOOL -eq 1 ]]; then
+  write_upload_unit
+else
+  stop_disable_rm_unit "${UPLOAD_UNIT_NAME}"
+fi
+
 systemctl daemon-reload
 
 if [[ $ENABLE_AFTER_INSTALL -eq 1 ]]; then
@@ -333,10 +393,14 @@ if [[ $ENABLE_AFTER_INSTALL -eq 1 ]]; then
   if [[ $INSTALL_WATCH -eq 1 ]]; then
     systemctl enable --now "${PATH_UNIT_NAME}"
   fi
+  if [[ $INSTALL_SPOOL -eq 1 ]]; then
+    systemctl enable --now "${UPLOAD_UNIT_NAME}"
+  fi
 fi
 
 echo "Installed ${SERVICE_NAME} in ${SERVICE_MODE} mode (controller: ${CONTROLLER})."
 [[ $ENABLE_AFTER_INSTALL -eq 1 ]] && echo "Service enabled and started."
 [[ $INSTALL_WATCH -eq 1 ]] && echo "Watcher installed: ${PATH_UNIT_NAME}."
+[[ $INSTALL_SPOOL -eq 1 ]] && echo "Spot spool uploader installed: ${UPLOAD_UNIT_NAME}."
 echo "Done."
 
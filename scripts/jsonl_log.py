@@ -0,0 +1,107 @@
+"""Buffered JSON Lines logger shared by the helper scripts.
+
+Records are compact one-line JSON objects ({"ts", "cat", "msg", ...fields}).
+They are held in memory and written in one append when FLUSH_BYTES are
+pending or FLUSH_INTERVAL seconds after the first unflushed record, and on
+exit.  sample() collapses runs of identical records in a category into a
+single {"msg": "repeated", "count": N} line.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+FLUSH_INTERVAL = float(os.environ.get("WSPR_JSONL_FLUSH_SECS", "5"))
+FLUSH_BYTES = 16 * 1024
+
+def _utc_stamp(t):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(t)) + f".{int(t % 1 * 1000):03d}Z"
+
+class JsonlLogger:
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL, flush_bytes=FLUSH_BYTES):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self._lock = threading.RLock()
+        self._buf = []
+        self._buf_bytes = 0
+        self._timer = None
+        self._last = {}      # category -> canonical key of the last sampled record
+        self._repeats = {}   # category -> identical records suppressed since then
+        atexit.register(self.close)
+
+    def event(self, cat, msg, **fields):
+        rec = {"ts": _utc_stamp(time.time()), "cat": cat, "msg": msg}
+        rec.update(fields)
+        line = json.dumps(rec, separators=(',', ':'), default=str) + '\n'
+        with self._lock:
+            self._buf.append(line)
+            self._buf_bytes += len(line)
+            if self._buf_bytes >= self.flush_bytes:
+                self.flush()
+            elif self._timer is None and self.flush_interval > 0:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def sample(self, cat, msg, key, **fields):
+        """Log unless key matches the previous sample in cat; then only count it."""
+        try:
+            canon = json.dumps(key, sort_keys=True, separators=(',', ':'), default=str)
+        except (TypeError, ValueError):
+            canon = repr(key)
+        with self._lock:
+            if self._last.get(cat) == canon:
+                self._repeats[cat] = self._repeats.get(cat, 0) + 1
+                return
+            self._emit_repeats(cat)
+            self._last[cat] = canon
+            self.event(cat, msg, **fields)
+
+    def _emit_repeats(self, cat):
+        n = self._repeats.pop(cat, 0)
+        if n:
+            self.event(cat, "repeated", count=n)
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._buf:
+                return
+            data = ''.join(self._buf).encode()
+            self._buf = []
+            self._buf_bytes = 0
+            try:
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o664)
+                try:
+                    os.write(fd, data)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass  # logging must never take the caller down
+
+    def close(self):
+        with self._lock:
+            for cat in list(self._repeats):
+                self._emit_repeats(cat)
+            self.flush()
+
+class JsonlHandler(logging.Handler):
+    """Route stdlib logging records into a JsonlLogger."""
+    def __init__(self, logger, cat="log"):
+        super().__init__()
+        self.logger = logger
+        self.cat = cat
+
+    def emit(self, record):
+        try:
+            self.logger.event(self.cat, record.getMessage(), level=record.levelname)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.logger.flush()
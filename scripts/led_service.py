@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""WSPR-zero LED service: sole owner of the status LED pin.
+
+Plays named blink patterns from one timer-driven loop.  Other scripts ask
+for a pattern by sending its name as a datagram to SOCKET_PATH (see send());
+nobody else touches the pin, so there is no claim/release dance and no need
+to stop wspr-service to free it.
+
+Looping patterns (setup, error) become the background; one-shot patterns
+(preflight, ack, shutdown) play over it and then the background resumes.
+"off" clears both.
+"""
+import os
+import select
+import signal
+import socket
+import sys
+import time
+
+SOCKET_PATH = os.environ.get("WSPR_LED_SOCKET", "/run/wspr-led.sock")
+LED_PIN = int(os.environ.get("WSPR_LED_PIN", "18"))  # BCM; physical pin 12
+ACTIVE_LOW = os.environ.get("WSPR_LED_ACTIVE_LOW", "0") in ("1", "true", "yes", "on")
+
+# name -> (steps of (led_on, seconds), loops).  seconds == 0 holds the level.
+PATTERNS = {
+    "setup":     ([(1, 0.1), (0, 0.1)] * 5 + [(1, 0.5), (0, 0.5)], True),
+    "error":     ([(1, 0.2), (0, 0.2)] * 3 + [(0, 1.4)], True),
+    "preflight": ([(1, 0.2), (0, 0.2)] * 3, False),
+    "ack":       ([(1, 0.08), (0, 0.08)] * 4, False),
+    "shutdown":  ([(1, 0.05), (0, 0.05)] * 20 + [(1, 0)], False),
+    "off":       ([], False),
+}
+
+def send(name, path=SOCKET_PATH):
+    """Ask the LED service to play a pattern; False if it is not running."""
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        s.sendto(name.encode(), path)
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+class LedScheduler:
+    def __init__(self, set_led, clock=time.monotonic):
+        self.set_led = set_led      # callable(bool)
+        self.clock = clock
+        self.background = None      # looping pattern name
+        self.current = None         # pattern being played
+        self.steps = []
+        self.index = 0
+        self.next_at = None         # monotonic time of the next step, None = idle
+
+    def play(self, name):
+        if name not in PATTERNS:
+            print(f"LED: unknown pattern {name!r}", flush=True)
+            return
+        steps, loops = PATTERNS[name]
+        if name == "off":
+            self.background = None
+            self._start(None, [])
+        elif loops:
+            self.background = name
+            if self.current is None or PATTERNS[self.current][1]:
+                self._start(name, steps)  # otherwise resumes after the one-shot
+        else:
+            self._start(name, steps)
+
+    def timeout(self):
+        """Seconds until the next LED change, or None when idle."""
+        if self.next_at is None:
+            return None
+        return max(0.0, self.next_at - self.clock())
+
+    def tick(self):
+        """Advance every step that is due."""
+        while self.next_at is not None and self.clock() >= self.next_at:
+            self.index += 1
+            if self.index >= len(self.steps):
+                if PATTERNS[self.current][1]:
+                    self.index = 0
+                else:
+                    bg = self.background
+                    self._start(bg, PATTERNS[bg][0] if bg else [])
+                    continue
+            self._apply(self.next_at)
+
+    def _start(self, name, steps):
+        self.current, self.steps, self.index = name, steps, 0
+        if steps:
+            self._apply(self.clock())
+        else:
+            self.set_led(False)
+            self.next_at = None
+
+    def _apply(self, at):
+        on, secs = self.steps[self.index]
+        self.set_led(bool(on))
+        self.next_at = at + secs if secs else None
+
+def _init_gpio():
+    import RPi.GPIO as GPIO
+    GPIO.setwarnings(False)
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setup(LED_PIN, GPIO.OUT, initial=GPIO.HIGH if ACTIVE_LOW else GPIO.LOW)
+    try:
+        if GPIO.gpio_function(LED_PIN) != GPIO.OUT:
+            print(f"LED: GPIO{LED_PIN} not set to OUTPUT. If using GPIO18, ensure "
+                  "'dtparam=audio=off' in /boot/config.txt, then reboot.", flush=True)
+    except Exception:
+        pass
+    on, off = (GPIO.LOW, GPIO.HIGH) if ACTIVE_LOW else (GPIO.HIGH, GPIO.LOW)
+    return GPIO, lambda lit: GPIO.output(LED_PIN, on if lit else off)
+
+def main():
+    try:
+        gpio, set_led = _init_gpio()
+    except Exception as e:
+        print(f"LED: GPIO init failed ({e}); patterns will be no-ops.", flush=True)
+        gpio, set_led = None, lambda lit: None
+
+    try:
+        os.unlink(SOCKET_PATH)
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(SOCKET_PATH)
+    os.chmod(SOCKET_PATH, 0o660)
+    print(f"LED service on GPIO{LED_PIN} (active {'low' if ACTIVE_LOW else 'high'}), "
+          f"socket {SOCKET_PATH}", flush=True)
+
+    sched = LedScheduler(set_led)
+    signal.signal(signal.SIGTERM, lambda _sig, _frm: sys.exit(0))  # run the cleanup below
+    try:
+        while True:
+            ready, _, _ = select.select([sock], [], [], sched.timeout())
+            if ready:
+                name = sock.recv(64).decode(errors="replace").strip()
+                sched.play(name)
+            sched.tick()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        try:
+            os.unlink(SOCKET_PATH)
+        except OSError:
+            pass
+        if gpio:
+            set_led(False)
+            gpio.cleanup(LED_PIN)
+
+if __name__ == "__main__":
+    sys.exit(main())
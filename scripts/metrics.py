@@ -0,0 +1,81 @@
+"""Prometheus metrics for node_exporter's textfile collector.
+
+Counters and gauges are kept in memory and rendered in the text exposition
+format at most every `interval` seconds.  The .prom file is replaced with a
+rename so the collector never scrapes a half-written file.  The caller
+drives the schedule the same way as RotatingLogWriter flushes: due() gives
+a select() timeout and maybe_write() writes once it is reached.
+"""
+import os
+import time
+
+METRICS_FILE = os.environ.get("WSPR_METRICS_FILE",
+                              "/var/lib/node_exporter/textfile_collector/wspr_zero.prom")
+METRICS_INTERVAL = float(os.environ.get("WSPR_METRICS_INTERVAL", "30"))
+
+def _labels(labels):
+    if not labels:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels) + "}"
+
+class TextfileMetrics:
+    def __init__(self, path=METRICS_FILE, interval=METRICS_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.collectors = []   # callables run before each write to refresh sampled gauges
+        self._meta = {}        # name -> (type, help)
+        self._values = {}      # name -> {sorted label items: value}
+        self._next = time.monotonic()
+        self._warned = False
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+        self._values.setdefault(name, {})
+
+    def inc(self, name, n=1, **labels):
+        series = self._values.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + n
+
+    def set(self, name, value, **labels):
+        self._values.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def forget(self, name):
+        """Drop every series of name (e.g. labels for things that no longer exist)."""
+        self._values[name] = {}
+
+    def due(self):
+        """Seconds until the next write."""
+        return max(0.0, self._next - time.monotonic())
+
+    def maybe_write(self):
+        if self.due() == 0.0:
+            self.write()
+
+    def render(self):
+        lines = []
+        for name, series in self._values.items():
+            kind, help_text = self._meta.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in series.items():
+                lines.append(f"{name}{_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        self._next = time.monotonic() + self.interval
+        for collect in self.collectors:
+            collect()
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(self.render())
+            os.replace(tmp, self.path)
+            self._warned = False
+        except OSError as e:
+            if not self._warned:
+                print(f"WARNING: writing metrics to {self.path}: {e}", flush=True)
+                self._warned = True
+            try: os.unlink(tmp)
+            except OSError: pass
@@ -0,0 +1,115 @@
+"""Boot readiness checks used instead of fixed startup sleeps.
+
+Each check is a cheap, non-blocking predicate; wait_for() polls a set of
+them until all pass or a timeout expires, so a unit starts the moment its
+dependencies are actually ready.
+"""
+import ctypes
+import ctypes.util
+import glob
+import os
+import time
+
+POLL_INTERVAL = 0.5
+
+# Generic RTL2832U dongles (vendor:product); add others via WSPR_SDR_USB_IDS="vid:pid,..."
+RTLSDR_USB_IDS = {("0bda", "2832"), ("0bda", "2838")} | {
+    tuple(i.strip().lower().split(":", 1))
+    for i in os.environ.get("WSPR_SDR_USB_IDS", "").split(",") if ":" in i
+}
+
+TIME_ERROR = 5  # adjtimex() state: clock not synchronised (STA_UNSYNC set)
+
+_libc = None
+
+def clock_synced():
+    """True once the kernel reports the clock as synchronised (NTP/RTC discipline)."""
+    global _libc
+    try:
+        if _libc is None:
+            _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        buf = ctypes.create_string_buffer(512)  # zeroed struct timex: modes=0 is read-only
+        state = _libc.adjtimex(buf)
+    except (OSError, AttributeError):
+        return True  # can't tell (non-Linux); don't block startup on it
+    return state not in (-1, TIME_ERROR)
+
+def network_up(iface=None):
+    """True if iface (or any non-loopback interface) is up and a default route exists."""
+    names = [iface] if iface else [os.path.basename(p) for p in glob.glob("/sys/class/net/*")
+                                   if os.path.basename(p) != "lo"]
+    up = False
+    for name in names:
+        try:
+            with open(f"/sys/class/net/{name}/operstate") as f:
+                if f.read().strip() in ("up", "unknown"):
+                    up = True
+                    break
+        except OSError:
+            continue
+    if not up:
+        return False
+    try:
+        with open("/proc/net/route") as f:
+            next(f, None)
+            return any(line.split()[1] == "00000000" for line in f if line.strip())
+    except OSError:
+        return False
+
+def _sdr_sysfs():
+    """[(busnum, devnum, serial)] of the RTL-SDR dongles enumerated on USB."""
+    found = []
+    for dev in glob.glob("/sys/bus/usb/devices/*"):
+        try:
+            with open(os.path.join(dev, "idVendor")) as f:
+                vid = f.read().strip()
+            with open(os.path.join(dev, "idProduct")) as f:
+                pid = f.read().strip()
+        except OSError:
+            continue
+        if (vid, pid) not in RTLSDR_USB_IDS:
+            continue
+        attrs = []
+        for name in ("busnum", "devnum", "serial"):
+            try:
+                with open(os.path.join(dev, name)) as f:
+                    attrs.append(f.read().strip())
+            except OSError:
+                attrs.append("")
+        found.append((int(attrs[0] or 0), int(attrs[1] or 0), attrs[2]))
+    return found
+
+def sdr_present():
+    """True if an RTL-SDR dongle is enumerated on USB."""
+    return bool(_sdr_sysfs())
+
+def sdr_serials():
+    """Serials of the attached RTL-SDRs in librtlsdr index order (USB bus, then device number)."""
+    return [serial for _, _, serial in sorted(_sdr_sysfs())]
+
+def sdr_index(device):
+    """librtlsdr device index for an index (int) or serial (str)."""
+    if isinstance(device, int):
+        return device
+    serials = sdr_serials()
+    if device not in serials:
+        raise RuntimeError(f"no RTL-SDR with serial {device!r} (found: {', '.join(serials) or 'none'})")
+    return serials.index(device)
+
+def gpio_present():
+    return os.path.exists("/dev/gpiomem") or os.path.exists("/dev/gpiochip0")
+
+def wait_for(checks, timeout, sleep=time.sleep, interval=POLL_INTERVAL, abort=None):
+    """Poll {name: predicate} until all pass, timeout, or abort(); return names still failing."""
+    deadline = time.monotonic() + timeout
+    pending = dict(checks)
+    while True:
+        pending = {n: c for n, c in pending.items() if not c()}
+        remaining = deadline - time.monotonic()
+        if not pending or remaining <= 0 or (abort and abort()):
+            return sorted(pending)
+        sleep(min(interval, remaining))
+
+def get_uptime():
+    with open("/proc/uptime") as f:
+        return float(f.readline().split()[0])
@@ -0,0 +1,154 @@
+"""Size/age-bounded log writer with batched flushes and background gzip.
+
+Used by wspr_control.py to persist child output without one SD-card write
+per line.  Rotated segments are renamed to <name>.<UTC stamp>, queued for
+gzip on a background thread (rotation never waits for it), and the oldest
+are deleted to stay inside the retention budget.
+"""
+import glob
+import gzip
+import os
+import shutil
+import threading
+import time
+
+MB = 1024 * 1024
+MAX_SEGMENT_BYTES = int(float(os.environ.get("WSPR_LOG_MAX_MB", "1")) * MB)     # rotate after this size
+MAX_SEGMENT_AGE = float(os.environ.get("WSPR_LOG_MAX_AGE_H", "24")) * 3600     # ...or this age (s)
+RETENTION_BYTES = int(float(os.environ.get("WSPR_LOG_RETENTION_MB", "20")) * MB)  # all segments
+FLUSH_INTERVAL = float(os.environ.get("WSPR_LOG_FLUSH_SECS", "30"))            # max buffered time
+FLUSH_BYTES = 64 * 1024                                                        # max buffered size
+
+class RotatingLogWriter:
+    def __init__(self, path, max_bytes=MAX_SEGMENT_BYTES, max_age=MAX_SEGMENT_AGE,
+                 retention_bytes=RETENTION_BYTES, flush_interval=FLUSH_INTERVAL,
+                 flush_bytes=FLUSH_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.retention_bytes = retention_bytes
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self._buf = bytearray()
+        self._first_buffered = None
+        self._fd = None
+        self._size = 0
+        self._opened = 0.0
+        self._compressor = None     # background gzip thread while segments are queued
+        self._queued = []           # rotated segments it has still to compress
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o664)
+        self._size = os.fstat(self._fd).st_size
+        self._opened = time.monotonic()
+
+    def write(self, data):
+        if not data:
+            return
+        if self._first_buffered is None:
+            self._first_buffered = time.monotonic()
+        self._buf += data
+        if len(self._buf) >= self.flush_bytes or time.monotonic() - self._opened >= self.max_age:
+            self.flush()
+
+    def flush_due(self):
+        """Seconds until flush() has work (buffered data, or a segment old enough to
+        rotate), or None if there is none."""
+        due = []
+        if self._first_buffered is not None:
+            due.append(self._first_buffered + self.flush_interval)
+        if self._size:
+            due.append(self._opened + self.max_age)  # a quiet log still rotates by age
+        if not due:
+            return None
+        return max(0.0, min(due) - time.monotonic())
+
+    def maybe_flush(self):
+        if self.flush_due() == 0.0:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            view = memoryview(self._buf)
+            while view:
+                n = os.write(self._fd, view)
+                view = view[n:]
+            self._size += len(self._buf)
+            self._buf = bytearray()
+        self._first_buffered = None
+        if self._size >= self.max_bytes or (
+                self._size and time.monotonic() - self._opened >= self.max_age):
+            self._rotate()
+
+    def close(self):
+        self.flush()
+        os.close(self._fd)
+        self._fd = None
+        compressor = self._compressor
+        if compressor:
+            compressor.join()
+
+    def _rotate(self):
+        os.close(self._fd)
+        stamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+        rotated = f"{self.path}.{stamp}"
+        n = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + '.gz'):
+            rotated = f"{self.path}.{stamp}-{n}"
+            n += 1
+        os.rename(self.path, rotated)
+        self._open()
+        # Queue it: a slow gzip on the SD card must not hold up the caller (the supervisor loop)
+        with self._lock:
+            self._queued.append(rotated)
+            if self._compressor is None:
+                self._compressor = threading.Thread(target=self._compress_queued, daemon=True)
+                self._compressor.start()
+
+    def _compress_queued(self):
+        while True:
+            with self._lock:
+                segment = self._queued.pop(0) if self._queued else None
+            if segment is not None:
+                self._compress(segment)
+                continue
+            # Retention once the queue has drained, so it never deletes a segment awaiting gzip
+            self._enforce_retention()
+            with self._lock:
+                if not self._queued:
+                    self._compressor = None
+                    return
+
+    def _compress(self, segment):
+        try:
+            with open(segment, 'rb') as src, gzip.open(segment + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.unlink(segment)
+        except OSError as e:
+            print(f"WARNING: could not compress {segment}: {e}", flush=True)
+
+    def _enforce_retention(self):
+        with self._lock:
+            queued = set(self._queued)  # rotated while this runs
+        segments = []
+        for p in glob.glob(self.path + '.*'):
+            if p in queued:
+                continue
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            segments.append((st.st_mtime, st.st_size, p))
+        segments.sort()
+        total = self._size + sum(size for _, size, _ in segments)
+        for _, size, p in segments:
+            if total <= self.retention_bytes:
+                break
+            try:
+                os.unlink(p)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Scheduling, CPU and I/O settings for the transmitter child.
+
+WsprryPi times the RF symbols in software, so a symbol that starts late
+because the check-in or a log flush had the CPU is a timing error on air.
+With these set, the supervisor starts the `wspr` child with its own
+scheduling policy, core and I/O class (all off by default; needs root):
+
+    WSPR_TX_SCHED="fifo:50"        # fifo|rr|other|batch[:priority]
+    WSPR_TX_CPU=3                  # core for the transmitter
+    WSPR_TX_IOCLASS="realtime:4"   # realtime|best-effort|idle[:level]
+
+install-wspr-aux.sh --tx-cpu N keeps the helper services off that core.
+
+The settings are put on the calling thread around the fork (inherited()),
+the same way multi-receiver mode pins decoders, so the child has them from
+its first instruction and the supervisor gets its own back afterwards.
+
+    rt_sched.py [--symbols N] [--load N]   # symbol-timing jitter: default vs TX settings
+"""
+import argparse
+import contextlib
+import os
+import subprocess
+import sys
+import time
+
+TX_SCHED = os.environ.get("WSPR_TX_SCHED", "")
+TX_CPU = os.environ.get("WSPR_TX_CPU", "")
+TX_IOCLASS = os.environ.get("WSPR_TX_IOCLASS", "")
+
+SYMBOL_SECONDS = 8192 / 12000   # one WSPR symbol; a transmission is 162 of them
+
+POLICIES = {"other": "SCHED_OTHER", "batch": "SCHED_BATCH", "fifo": "SCHED_FIFO", "rr": "SCHED_RR"}
+IOCLASSES = {"realtime": "IOPRIO_CLASS_RT", "best-effort": "IOPRIO_CLASS_BE", "idle": "IOPRIO_CLASS_IDLE"}
+
+def _split(value, names, what):
+    name, _, level = value.strip().lower().partition(":")
+    if name not in names:
+        raise ValueError(f"{what}: expected one of {', '.join(names)}")
+    return name, int(level) if level else None
+
+def tx_settings(sched=TX_SCHED, cpu=TX_CPU, ioclass=TX_IOCLASS):
+    """kwargs for inherited() from the WSPR_TX_* settings; bad values are warned about and dropped."""
+    out = {}
+    for value, parse in ((sched, lambda v: zip(("policy", "priority"), _split(v, POLICIES, "WSPR_TX_SCHED"))),
+                         (cpu, lambda v: [("cpu", int(v))]),
+                         (ioclass, lambda v: zip(("ioclass", "iolevel"), _split(v, IOCLASSES, "WSPR_TX_IOCLASS")))):
+        if str(value).strip():
+            try:
+                out.update(parse(value))
+            except ValueError as e:
+                print(f"WARNING: bad TX setting {value!r} ({e}); ignoring it", flush=True)
+    return out
+
+def describe(cpu=None, policy=None, priority=None, ioclass=None, iolevel=None):
+    parts = []
+    if policy:
+        parts.append(policy + (f":{priority}" if priority is not None else ""))
+    if cpu is not None:
+        parts.append(f"cpu{cpu}")
+    if ioclass:
+        parts.append("io " + ioclass + (f":{iolevel}" if iolevel is not None else ""))
+    return ", ".join(parts) or "default scheduling"
+
+@contextlib.contextmanager
+def inherited(cpu=None, policy=None, priority=None, ioclass=None, iolevel=None):
+    """Give the calling thread these settings for the duration of the block.
+
+    fork() and exec() keep the thread's affinity, policy and I/O priority,
+    so a child started inside the block runs with them.  A setting that
+    cannot be applied (no permission, no such core) is warned about and the
+    child starts without it.
+    """
+    undo = []
+    if cpu is not None:
+        mask = os.sched_getaffinity(0)
+        try:
+            os.sched_setaffinity(0, {cpu})
+            undo.append(lambda: os.sched_setaffinity(0, mask))
+        except OSError as e:
+            print(f"WARNING: cannot pin to cpu{cpu}: {e}; starting unpinned", flush=True)
+    if policy:
+        old = os.sched_getscheduler(0), os.sched_getparam(0)
+        pol = getattr(os, POLICIES[policy])
+        if priority is None:
+            priority = os.sched_get_priority_min(pol)
+        try:
+            os.sched_setscheduler(0, pol, os.sched_param(priority))
+            undo.append(lambda: os.sched_setscheduler(0, *old))
+        except OSError as e:
+            print(f"WARNING: cannot set {policy}:{priority}: {e}; default scheduling", flush=True)
+    if ioclass:
+        import psutil
+        try:
+            me = psutil.Process()
+            old_io = me.ionice()
+            cls = getattr(psutil, IOCLASSES[ioclass])
+            me.ionice(cls, iolevel if cls != psutil.IOPRIO_CLASS_IDLE else None)
+            undo.append(lambda: me.ionice(old_io.ioclass, old_io.value or None))
+        except (OSError, ValueError, psutil.Error) as e:
+            print(f"WARNING: cannot set I/O class {ioclass}: {e}; default I/O class", flush=True)
+    try:
+        yield
+    finally:
+        for fn in reversed(undo):
+            fn()
+
+# -------- jitter measurement --------
+def _probe(symbols, period):
+    """Sleep to each symbol boundary, as the transmitter does; print each wake-up's lateness (us)."""
+    start = time.monotonic() + period
+    late = []
+    for i in range(symbols):
+        deadline = start + i * period
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        late.append(time.monotonic() - deadline)
+    print(" ".join(f"{x * 1e6:.0f}" for x in late), flush=True)
+
+def measure(symbols, period, settings):
+    """Run the probe in a child started like the transmitter; sorted lateness in microseconds."""
+    with inherited(**settings):
+        probe = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--probe",
+                                  str(symbols), "--period", str(period)], stdout=subprocess.PIPE)
+    out, _ = probe.communicate()
+    return sorted(int(x) for x in out.split())
+
+def _summary(label, late):
+    pct = lambda p: late[min(len(late) - 1, int(p / 100 * len(late)))]
+    return (f"{label:<32} p50 {pct(50):>6} us   p99 {pct(99):>7} us   max {late[-1]:>7} us   "
+            f">1ms {sum(x > 1000 for x in late)}/{len(late)}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Symbol-timing jitter of a child started with default "
+                                             "vs the WSPR_TX_* settings")
+    ap.add_argument("--symbols", type=int, default=162, help="symbols per run (default: one transmission)")
+    ap.add_argument("--period", type=float, default=SYMBOL_SECONDS, help="seconds per symbol")
+    ap.add_argument("--load", type=int, default=0, help="busy-loop processes competing for the CPU")
+    ap.add_argument("--sched", default=TX_SCHED, help="override WSPR_TX_SCHED")
+    ap.add_argument("--cpu", default=TX_CPU, help="override WSPR_TX_CPU")
+    ap.add_argument("--ioclass", default=TX_IOCLASS, help="override WSPR_TX_IOCLASS")
+    ap.add_argument("--probe", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.probe:
+        _probe(args.probe, args.period)
+        return 0
+
+    tuned = tx_settings(args.sched, args.cpu, args.ioclass)
+    hogs = [subprocess.Popen([sys.executable, "-c", "while True: pass"]) for _ in range(args.load)]
+    try:
+        print(f"{args.symbols} symbols of {args.period * 1000:.1f} ms, {args.load} busy processes", flush=True)
+        print(_summary("default scheduling", measure(args.symbols, args.period, {})), flush=True)
+        if tuned:
+            print(_summary(describe(**tuned), measure(args.symbols, args.period, tuned)), flush=True)
+        else:
+            print("No WSPR_TX_* settings (or --sched/--cpu/--ioclass) to compare against.", flush=True)
+    finally:
+        for h in hogs:
+            h.kill()
+            h.wait()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,17 @@
 #!/usr/bin/env python3
-import RPi.GPIO as GPIO
-import requests
+# One asyncio session: the service stop, status collection and first POST overlap,
+# and every HTTP wait is cancellable (window deadline, SIGTERM).  asyncio is slow to
+# import on a Pi Zero, so it loads in main() once the LED preflight is on its way.
 import json
+import signal
 import time
 from datetime import datetime, timezone
-import threading
-import subprocess
 import os
-import shutil
 import re
 import hashlib
-
-ACTIVE_LOW = os.environ.get("WSPR_LED_ACTIVE_LOW", "0") in ("1", "true", "yes", "on")
+from jsonl_log import JsonlLogger
+import wspr_config
+import led_service
 
 def get_uptime_str():
     try:
@@ -31,17 +31,14 @@ def get_uptime_str():
 
 # --- Root-only execution ---
 if os.geteuid() != 0:
-    print("server_checkin.py must run as root for GPIO and file ownership; aborting.")
+    print("server_checkin.py must run as root for file ownership; aborting.")
     raise SystemExit("Run with sudo (root).")
 
-# GPIO pin for WSPR-zero LED (BCM numbering)
-led_pin = 18  # physical pin 12
-
 # Server endpoint
-server_url = "https://wspr-zero.com/ez-config/server-listener.php"
+server_url = os.environ.get("WSPR_SERVER_URL", "https://wspr-zero.com/ez-config/server-listener.php")
 
 # Logs (root-owned)
-log_dir = '/opt/wsprzero/wspr-zero/logs'
+log_dir = os.environ.get("WSPR_LOG_DIR", '/opt/wsprzero/wspr-zero/logs')
 log_file = os.path.join(log_dir, 'setup-post.log')
 
 # Polling window
@@ -49,6 +46,7 @@ CHECKIN_WINDOW = int(os.environ.get("WSPR_CHECKIN_WINDOW", "45"))    # seconds
 POLL_INTERVAL  = float(os.environ.get("WSPR_POLL_INTERVAL", "3"))    # seconds
 IDLE_EXIT_AFTER = float(os.environ.get("WSPR_CHECKIN_IDLE_EXIT", "10"))  # seconds with no updates before exiting early
 MIN_SESSION_TIME = float(os.environ.get("WSPR_CHECKIN_MIN_SESSION", "6"))  # allow at least this many seconds before idle exit
+LONGPOLL_WAIT = float(os.environ.get("WSPR_LONGPOLL_WAIT", "25"))    # seconds the server may hold a long-poll
 if CHECKIN_WINDOW < POLL_INTERVAL + 3:
     CHECKIN_WINDOW = int(POLL_INTERVAL + 3)
 if IDLE_EXIT_AFTER < 1:
@@ -56,6 +54,11 @@ if IDLE_EXIT_AFTER < 1:
 if MIN_SESSION_TIME < 0:
     MIN_SESSION_TIME = 0.0
 
+# Status fields the server has acknowledged (by version) are not resent; see post_status()
+STATUS_STATE = os.environ.get("WSPR_CHECKIN_STATE",
+                              os.path.join(os.path.dirname(wspr_config.CONFIG_PATH), ".checkin-status.json"))
+GZIP_MIN_BYTES = 128  # smaller request bodies grow when gzipped
+
 def safe_chown(path, uid, gid):
     try: os.chown(path, uid, gid)
     except (PermissionError, FileNotFoundError): pass
@@ -72,28 +75,37 @@ if not os.path.exists(log_file):
 safe_chown(log_file, 0, 0)
 safe_chmod(log_file, 0o664)
 
-def log_message(message):
-    with open(log_file, 'a') as f:
-        f.write(message + '\n' + '-'*50 + '\n')
+_log = JsonlLogger(log_file)
 
-# Config I/O
+def log_message(message, **fields):
+    _log.event("checkin", message, **fields)
+
+# Config I/O (parsing, validation and the atomic write live in wspr_config)
 def read_wspr_config():
-    path = '/opt/wsprzero/wspr-zero/wspr-config.json'
     try:
-        with open(path, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        log_message(f"Failed to read {path}: {e}")
+        return wspr_config.thaw(wspr_config.load())
+    except wspr_config.ConfigError as e:
+        log_message(f"Failed to read config: {e}")
         return {}
 
 def write_wspr_config(existing_data, new_data):
-    existing_data.update(new_data)
-    path = '/opt/wsprzero/wspr-zero/wspr-config.json'
+    """Merge new_data and write the config if the result differs from the file.
+
+    existing_data takes the merge only once it is written (or already current).
+    """
+    for note in wspr_config.notes(new_data):
+        log_message(f"Server config: {note}")
+    merged = dict(existing_data, **new_data)
     try:
-        with open(path, 'w') as f:
-            json.dump(existing_data, f, indent=4)
-    except Exception as e:
-        log_message(f"Failed to write {path}: {e}")
+        if not wspr_config.write(merged):
+            log_message(f"{wspr_config.CONFIG_PATH} unchanged; skipping write")
+    except wspr_config.ConfigError as e:
+        log_message(f"Server config rejected; keeping the current one: {e}")
+        return
+    except OSError as e:
+        log_message(f"Failed to write {wspr_config.CONFIG_PATH}: {e}")
+        return
+    existing_data.update(new_data)
 
 # MAC normalization
 _mac_pat = re.compile(r'[^0-9A-Fa-f]')
@@ -108,82 +120,129 @@ def ensure_canonical_mac_in_config(cfg):
     mac = canonical_mac(cfg.get('MAC_address', ''))
     if mac: cfg['MAC_address'] = mac
 
-# HTTP
-def send_data_to_server(data, label="POST"):
+# HTTP: one keep-alive connection for the whole check-in (one TCP/TLS handshake)
+_conn = None
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        import aio_http
+        # Bytes count on metered links: only the headers the server needs, and
+        # gzipped responses where the server has them
+        _conn = aio_http.Connection(server_url, {'Content-Type': 'application/json',
+                                                 'Accept-Encoding': 'gzip',
+                                                 'User-Agent': 'wspr-zero-checkin'})
+    return _conn
+
+_etag = None            # server's version token for the config we last received
+_server_longpoll = False  # server advertised "X-Wspr-Longpoll: 1"
+_session_done = False     # server said the user finished ("X-Wspr-Session: done")
+_last_failed = False      # last completed request errored (as opposed to 200/304)
+_server_gzip = False      # server takes gzipped request bodies ("Accept-Encoding: gzip", RFC 7694)
+_status_ack = None        # X-Wspr-Status-Version of the last response
+
+async def send_data_to_server(data, label="POST", wait=None, headers=None):
+    """POST data; return the config dict, or None on error or 304 Not Modified.
+
+    With wait, ask the server to hold the request (long-poll) for up to wait
+    seconds until the config changes.  Cancelling the calling task abandons
+    the request at once and leaves _last_failed as the last completed one set it.
+    """
+    global _etag, _server_longpoll, _session_done, _last_failed, _server_gzip, _status_ack
     try:
-        headers = {'Content-Type': 'application/json'}
-        log_message(f"{label} -> server payload:\n{json.dumps(data, indent=4)}")
-        response = requests.post(server_url, headers=headers, json=data, timeout=(3, 7))
+        headers = dict(headers or {})
+        if _etag:
+            headers['If-None-Match'] = _etag
+        read_timeout = 7
+        if wait:
+            headers['Prefer'] = f"wait={max(1, int(wait))}"
+            read_timeout += wait
+        # Identical payloads/responses across polls are counted, not rewritten
+        _log.sample("http-out", f"{label} -> server", data, payload=data)
+        body = json.dumps(data, separators=(',', ':')).encode()
+        if _server_gzip and len(body) >= GZIP_MIN_BYTES:
+            import gzip
+            body = gzip.compress(body, mtime=0)
+            headers['Content-Encoding'] = 'gzip'
+        response = await _get_conn().post(body, headers=headers, timeout=(3, read_timeout))
+        if response.status_code == 415 and 'Content-Encoding' in headers:
+            _server_gzip = False  # advertised once, not any more: resend it plain
+            del headers['Content-Encoding']
+            return await send_data_to_server(data, label, wait, headers)
+        _server_longpoll = response.headers.get('x-wspr-longpoll') == '1'
+        if 'accept-encoding' in response.headers:  # only sent when it matters (a 415 withdraws it)
+            _server_gzip = 'gzip' in response.headers['accept-encoding'].lower()
+        _status_ack = response.headers.get('x-wspr-status-version')
+        if response.headers.get('x-wspr-session') == 'done':
+            _session_done = True
+        _last_failed = response.status_code not in (200, 304)
+        if response.status_code == 304:
+            _log.sample("http-in", f"{label} <- not modified", _etag, etag=_etag)
+            return None
         if response.status_code == 200:
             try:
                 j = response.json()
-                log_message(f"{label} <- server response:\n{json.dumps(j, indent=4)}")
+                _etag = response.headers.get('etag') or None
+                _log.sample("http-in", f"{label} <- server", j, response=j)
                 return j
             except Exception as je:
-                log_message(f"{label} response JSON decode failed: {je}\nRaw: {response.text[:4000]}")
+                log_message(f"{label} response JSON decode failed: {je}", raw=response.text[:4000])
                 return None
         else:
-            log_message(f"{label} failed. HTTP {response.status_code}\nBody: {response.text[:4000]}")
+            log_message(f"{label} failed. HTTP {response.status_code}", body=response.text[:4000])
             return None
     except Exception as e:
-        log_message(f"{label} exception: {str(e)}")
+        _last_failed = True
+        log_message(f"{label} exception: {str(e) or type(e).__name__}")
         return None
 
-# ===== GPIO handling =====
-gpio = GPIO
-
-def _raspi_gpio_state(pin=18):
-    """Log raspi-gpio state for the pin (if command exists)."""
-    exe = shutil.which("raspi-gpio")
-    if not exe: return
-    try:
-        out = subprocess.run([exe, "get", str(pin)], text=True, capture_output=True, timeout=2)
-        log_message(f"raspi-gpio get {pin}:\n{out.stdout.strip() or out.stderr.strip()}")
-    except Exception as e:
-        log_message(f"raspi-gpio probe failed: {e}")
-
-def blink_led():
-    on  = gpio.LOW  if ACTIVE_LOW else gpio.HIGH
-    off = gpio.HIGH if ACTIVE_LOW else gpio.LOW
-    try:
-        while True:
-            for _ in range(5):  # rapid blink 5x/sec
-                gpio.output(led_pin, on);  time.sleep(0.1)
-                gpio.output(led_pin, off); time.sleep(0.1)
-            gpio.output(led_pin, on);  time.sleep(0.5)
-            gpio.output(led_pin, off); time.sleep(0.5)
-    except Exception as e:
-        log_message(f"Exception occurred in blink_led: {str(e)}")
-        try: gpio.output(led_pin, off)
-        except Exception: pass
+# ===== LED (owned by led_service.py) =====
+def led(pattern):
+    if not led_service.send(pattern):
+        log_message(f"LED service not reachable; '{pattern}' pattern not shown.")
 
-# systemd control
+# systemd control: jobs over one D-Bus connection to systemd (systemd_bus), no systemctl forks
 SERVICE_NAME = os.environ.get("WSPR_SERVICE", "wspr-service")
-SYSTEMCTL = shutil.which("systemctl") or "systemctl"
-
-def _systemctl(action, timeout=15):
-    cmd = [SYSTEMCTL, '--no-pager', action, SERVICE_NAME]
+SERVICE_UNIT = SERVICE_NAME if "." in SERVICE_NAME else SERVICE_NAME + ".service"
+_manager = None
+
+async def _service_job(action, timeout=15):
+    """Stop the service and wait for systemd to finish the job, or queue its start; True if OK.
+
+    The start is not waited for: the check-in unit is ordered Before= the
+    service, so systemd runs that job only once this process has exited.
+    """
+    import asyncio
+    import systemd_bus
+    global _manager
     try:
-        p = subprocess.run(cmd, check=True, text=True, capture_output=True, timeout=timeout)
-        log_message(f"systemctl {action} {SERVICE_NAME} OK\nstdout:\n{p.stdout}\nstderr:\n{p.stderr}")
-        return True
-    except FileNotFoundError as e:
-        log_message(f"systemctl not found: {e}")
+        if _manager is None or _manager.closed:
+            _manager = await asyncio.to_thread(systemd_bus.Manager)
+        job = await asyncio.to_thread(_manager.start_unit if action == 'start' else _manager.stop_unit,
+                                      SERVICE_UNIT)
+        if action == 'start':
+            log_message(f"start {SERVICE_UNIT} queued ({job.path})")
+            return True
+        result = await job.wait(timeout)
+    except asyncio.TimeoutError:   # before OSError: it is one since Python 3.11
+        log_message(f"{action} {SERVICE_UNIT}: job still running after {timeout}s")
         return False
-    except subprocess.CalledProcessError as e:
-        log_message(f"systemctl {action} {SERVICE_NAME} failed (exit {e.returncode})\nstdout:\n{e.stdout}\nstderr:\n{e.stderr}")
+    except (OSError, systemd_bus.BusError) as e:
+        log_message(f"{action} {SERVICE_UNIT} failed: {e}")
         return False
-    except subprocess.TimeoutExpired:
-        log_message(f"systemctl {action} {SERVICE_NAME} timed out after {timeout}s")
+    if result != 'done':
+        log_message(f"{action} {SERVICE_UNIT} job ended '{result}'")
         return False
+    log_message(f"{action} {SERVICE_UNIT} OK")
+    return True
 
-def stop_wspr():
+async def stop_wspr():
     log_message("Stopping WSPR process via systemd")
-    _systemctl('stop')
+    return await _service_job('stop')
 
-def start_wspr():
+async def start_wspr():
     log_message("Starting WSPR process via systemd")
-    _systemctl('start')
+    return await _service_job('start')
 
 # status payload
 def build_status_payload(full_cfg):
@@ -195,6 +254,66 @@ def build_status_payload(full_cfg):
     out["MAC_address"] = canonical_mac(full_cfg.get("MAC_address", ""))
     return out
 
+def status_delta(full, acked):
+    """Fields of full that differ from acked; fields that went away are sent as null."""
+    delta = {k: v for k, v in full.items() if acked.get(k) != v}
+    delta.update({k: None for k in acked if k not in full})
+    return delta
+
+def _load_status_state():
+    try:
+        with open(STATUS_STATE) as f:
+            st = json.load(f)
+        if st.get("server") == server_url and isinstance(st.get("status"), dict):
+            return st
+    except (OSError, ValueError):
+        pass
+    return {"server": server_url, "version": 0, "status": {}, "gzip": False, "etag": None}
+
+def _save_status_state(**fields):
+    st = _load_status_state()
+    st.update(fields)
+    tmp = STATUS_STATE + ".tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(st, f, separators=(',', ':'))
+        os.replace(tmp, STATUS_STATE)
+    except OSError as e:
+        log_message(f"Failed to save {STATUS_STATE}: {e}")
+
+async def post_status(status):
+    """First POST of the session; return the server's config like send_data_to_server().
+
+    A server that keeps status versions (answers with X-Wspr-Status-Version)
+    gets only the fields changed since the version it last acknowledged,
+    with X-Wspr-Status-Base naming that version.  If it no longer has that
+    base, or has stopped keeping versions, the full status is sent once more.
+    The last session's ETag goes along too, so an unchanged config is a 304.
+    """
+    global _server_gzip, _etag
+    st = _load_status_state()
+    _server_gzip = st.get("gzip", False)
+    _etag = st.get("etag")
+    new = st["version"] + 1
+    headers = {'X-Wspr-Status-Version': str(new)}
+    if st["version"]:
+        headers['X-Wspr-Status-Base'] = str(st["version"])
+        payload = {"MAC_address": status["MAC_address"], **status_delta(status, st["status"])}
+        response = await send_data_to_server(payload, label=f"FIRST POST (status delta v{new})", headers=headers)
+        if not _last_failed and _status_ack != str(new):
+            log_message(f"Server did not take the delta on v{st['version']} (it has "
+                        f"{_status_ack or 'no versions'}); sending the full status")
+            del headers['X-Wspr-Status-Base']
+            response = await send_data_to_server(status, label="FIRST POST (status-only)",
+                                                 headers=headers) or response
+    else:
+        response = await send_data_to_server(status, label="FIRST POST (status-only)", headers=headers)
+    if not _last_failed:
+        acked = _status_ack == str(new)
+        _save_status_state(version=new if acked else 0, status=status if acked else {},
+                           gzip=_server_gzip, etag=_etag)
+    return response
+
 def _hash_obj(o):
     try:
         s = json.dumps(o, sort_keys=True, separators=(',', ':')).encode()
@@ -202,94 +321,50 @@ def _hash_obj(o):
     except Exception:
         return None
 
-# ---- main ----
-def main():
-    global gpio
-
-    # Stop service to free LED pin and pause a bit
-    stop_wspr()
-    time.sleep(3)
-
-    # Init GPIO + verify function
-    try:
-        GPIO.setwarnings(False)
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(led_pin, GPIO.OUT, initial=GPIO.LOW)
-
-        try:
-            fn = GPIO.gpio_function(led_pin)  # 1 means OUTPUT in RPi.GPIO
-            log_message(f"GPIO{led_pin} gpio_function={fn} (1 means OUTPUT)")
-            if fn != GPIO.OUT:
-                log_message(
-                    f"GPIO{led_pin} not set to OUTPUT. "
-                    "If using GPIO18, ensure 'dtparam=audio=off' in /boot/config.txt, then reboot."
-                )
-        except Exception as _:
-            pass
-
-        gpio = GPIO
-        log_message(f"LED armed on GPIO{led_pin} (BCM).")
-    except Exception as e:
-        log_message(f"GPIO init failed ({e}); continuing without LED.")
-        class _NoGPIO:
-            HIGH = 1; LOW = 0
-            def output(self,*a,**k): pass
-            def cleanup(self): pass
-        gpio = _NoGPIO()
-
-    # Log current pin state from kernel view (if raspi-gpio exists)
-    _raspi_gpio_state(led_pin)
-
-    # Preflight visible pulses (both polarities so you see *something* either way)
-    try:
-        on  = gpio.LOW  if ACTIVE_LOW else gpio.HIGH
-        off = gpio.HIGH if ACTIVE_LOW else gpio.LOW
-        # 3 pulses in the configured polarity
-        for _ in range(3):
-            gpio.output(led_pin, on);  time.sleep(0.2)
-            gpio.output(led_pin, off); time.sleep(0.2)
-        # 2 pulses in the opposite polarity (helps detect active-low wiring)
-        gpio.output(led_pin, off); time.sleep(0.15)
-        gpio.output(led_pin, on);  time.sleep(0.15)
-        gpio.output(led_pin, off); time.sleep(0.15)
-        log_message("LED preflight pulses sent.")
-    except Exception as e:
-        log_message(f"Preflight pulse error: {e}")
-
-    # Start LED thread
-    led_thread = threading.Thread(target=blink_led, daemon=True)
-    led_thread.start()
-    log_message("LED blink thread started.")
-
-    # Prepare config + post
-    wspr_config = read_wspr_config()
-    ensure_canonical_mac_in_config(wspr_config)
-    wspr_config['uptime'] = get_uptime_str()
-    wspr_config['setup_timestamp'] = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
-
-    status_payload = build_status_payload(wspr_config)
-    server_response = send_data_to_server(status_payload, label="FIRST POST (status-only)")
-    if server_response:
-        write_wspr_config(wspr_config, server_response)
-
-    # Poll window
-    mac_only = {'MAC_address': wspr_config.get('MAC_address', '')}
-    deadline = time.monotonic() + CHECKIN_WINDOW
+# ---- session ----
+def collect_status():
+    """The local config plus this check-in's facts (file reads: runs in a worker thread)."""
+    cfg = read_wspr_config()
+    ensure_canonical_mac_in_config(cfg)
+    cfg['uptime'] = get_uptime_str()
+    cfg['setup_timestamp'] = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    return cfg
+
+async def poll_window(cfg, deadline):
+    """Long-poll when the server supports it, plain polling otherwise.
+
+    Returns True when the server ended the session on a successful reply,
+    i.e. the config written so far is the final one.
+    """
+    import asyncio
+    mac_only = {'MAC_address': cfg.get('MAC_address', '')}
     prev_hash = None
     i = 1
     session_start = time.monotonic()
     last_change = session_start
-    while time.monotonic() < deadline:
-        server_response = send_data_to_server(mac_only, label=f"POLL {i} (MAC-only)")
+    while time.monotonic() < deadline and not _session_done:
+        remaining = deadline - time.monotonic()
+        wait = min(LONGPOLL_WAIT, remaining) if _server_longpoll else None
+        label = f"LONG-POLL {i} (MAC-only)" if wait else f"POLL {i} (MAC-only)"
+        sent = time.monotonic()
+        server_response = await send_data_to_server(mac_only, label=label, wait=wait)
         if server_response:
-            h = _hash_obj(server_response)
+            # ETag-aware servers only send 200 when the config changed; hash for older ones
+            h = _etag or _hash_obj(server_response)
             if h and h != prev_hash:
-                write_wspr_config(wspr_config, server_response)
+                await asyncio.to_thread(write_wspr_config, cfg, server_response)
                 prev_hash = h
                 last_change = time.monotonic()
+        if _session_done:
+            log_message("Server reported setup session done.")
+            break
         remaining = deadline - time.monotonic()
         if remaining <= 0: break
-        time.sleep(min(POLL_INTERVAL, max(0.05, remaining)))
+        if wait and not _last_failed and time.monotonic() - sent >= 1:
+            # The server held the request for us; no sleep and no idle guessing
+            i += 1
+            continue
+        await asyncio.sleep(min(POLL_INTERVAL, max(0.05, remaining)))
         if (
             time.monotonic() - last_change >= IDLE_EXIT_AFTER
             and time.monotonic() - session_start >= MIN_SESSION_TIME
@@ -300,14 +375,71 @@ def main():
             )
             break
         i += 1
+    return _session_done and not _last_failed
+
+async def session():
+    """One check-in; returns once wspr-service has been asked to start again.
+
+    The service stop runs alongside status collection and the first POST,
+    and is over before the first config write (the path unit would start a
+    reload job against it).  The config is written as responses arrive, so
+    the service restarts as soon as the last one is in.  SIGTERM cancels whatever request is in
+    flight and goes straight to the restart.
+    """
+    import asyncio
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    t0 = time.monotonic()
+    marks = {}  # phase -> seconds since the session started
+    def mark(name):
+        marks[name] = round(time.monotonic() - t0, 3)
+
+    stopped = asyncio.ensure_future(stop_wspr())
+    stopped.add_done_callback(lambda _: mark("stopped"))
+    try:
+        cfg = await asyncio.to_thread(collect_status)
+        server_response = await post_status(build_status_payload(cfg))
+        mark("first_post")
+        # A config write sets off wspr-service.path: the stop job must be over by then
+        await stopped
+        if server_response:
+            await asyncio.to_thread(write_wspr_config, cfg, server_response)
 
-    # Final fetch
-    server_response = send_data_to_server(mac_only, label="FINAL FETCH")
-    if server_response:
-        write_wspr_config(wspr_config, server_response)
+        current = stalled = False
+        try:
+            # The window bounds held requests too: one in flight at the deadline is cancelled
+            current = await asyncio.wait_for(poll_window(cfg, time.monotonic() + CHECKIN_WINDOW),
+                                             CHECKIN_WINDOW)
+        except asyncio.TimeoutError:
+            # The normal end with a long-poll held open; only a server whose last reply
+            # was an error is not asked again
+            stalled = _last_failed
+            log_message(f"Check-in window of {CHECKIN_WINDOW}s over" + (" (server not answering)" if stalled else ""))
+        mark("polled")
+
+        if not current and not stalled:
+            server_response = await send_data_to_server({'MAC_address': cfg.get('MAC_address', '')},
+                                                        label="FINAL FETCH")
+            if server_response:
+                await asyncio.to_thread(write_wspr_config, cfg, server_response)
+            mark("final_fetch")
+        if not _last_failed:
+            _save_status_state(etag=_etag)
+    finally:
+        if _conn is not None:
+            _conn.close()
+        await stopped
+        await start_wspr()
+        mark("restart_queued")
+        log_message(f"Check-in session took {marks['restart_queued']:.2f}s", **marks)
 
-    # Restart WSPR
-    start_wspr()
+def main():
+    led("preflight")
+    led("setup")  # loops once preflight has played
+    import asyncio
+    try:
+        asyncio.run(session())
+    except asyncio.CancelledError:
+        log_message("Check-in cancelled (SIGTERM); service restart queued")
 
 if __name__ == "__main__":
     try:
@@ -315,11 +447,7 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         pass
     finally:
-        try:
-            gpio.output(led_pin, GPIO.LOW if not ACTIVE_LOW else GPIO.HIGH)
-            gpio.cleanup()
-        except Exception:
-            pass
+        led_service.send("off")
 
 # systemctl tips:
 #   sudo systemctl status  wspr-service
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""Offline-first spool of decoded spots and its batched uploader.
+
+rtlsdr_wsprd reports each spot to WSPRnet as it decodes it, so a unit with
+no connectivity loses every spot it hears.  With WSPR_SPOT_SPOOL=1 the
+supervisor runs the decoder with -x (no direct reporting) and appends every
+spot line it sees to this spool instead; `spot_spool.py upload --follow`
+(wspr-spot-upload.service) drains it whenever the network is up.
+
+The spool is a directory of append-only segment files of compact binary
+records (~30 bytes a spot, each with a CRC so a torn write from a power cut
+is found and cut off), and a cursor file naming the first spot not yet
+acknowledged by the server.  Spots keep their original slot timestamp.  When
+the spool outgrows WSPR_SPOOL_MAX_MB the oldest segment is dropped.
+
+The uploader posts up to BATCH_SPOTS spots at a time as wsprd's
+wsprd_spots.txt, and moves the cursor only once the reply says the spots
+were added (WSPRnet answers 200 even when it rejects a file), so a crash
+resends at most one batch (WSPRnet drops duplicate spots).  Failures back
+off exponentially with full jitter so a fleet coming back online does not
+arrive all at once.  Uploading is off until WSPR_SPOT_UPLOAD_URL (or --url)
+names the server: the layout has not yet been checked against WSPRnet's
+WSPRNET_URL, so opt in there deliberately.
+
+    spot_spool.py status
+    spot_spool.py add --log PATH            # spool the spots in a receiver log
+    spot_spool.py upload [--follow] [--url URL] [--batch N]
+
+spot_upload_standin.py is a local server for testing throughput and
+crash recovery.
+"""
+import argparse
+import os
+import random
+import re
+import struct
+import sys
+import time
+import zlib
+
+from spot_store import LOG_DIR, parse_lines
+
+MB = 1024 * 1024
+SPOOL_DIR = os.environ.get("WSPR_SPOOL_DIR", os.path.join(LOG_DIR, "spool"))
+MAX_BYTES = int(float(os.environ.get("WSPR_SPOOL_MAX_MB", "8")) * MB)   # ~250k spots
+SEGMENT_BYTES = 256 * 1024
+WSPRNET_URL = "http://wsprnet.org/meptspots.php"
+UPLOAD_URL = os.environ.get("WSPR_SPOT_UPLOAD_URL", "")   # empty: no uploads
+BATCH_SPOTS = int(os.environ.get("WSPR_SPOOL_BATCH", "500"))
+UPLOAD_TIMEOUT = 30
+IDLE_INTERVAL = 60      # seconds between looks at an empty spool (or a down network)
+BACKOFF_BASE = 30       # first retry within this many seconds...
+BACKOFF_MAX = 3600      # ...doubling up to this
+
+# ts, freq_hz, snr and dt in tenths, drift, power (-1: none); then call and grid, length-prefixed
+_REC = struct.Struct("<IIhhbb")
+_LEN = struct.Struct("<H")
+_CRC = struct.Struct("<I")
+
+def _clamp(v, lo, hi):
+    return max(lo, min(hi, v))
+
+def encode(row):
+    """Frame a spot_store row (ts, band, freq_hz, snr, dt, drift, call, grid, power)."""
+    ts, _band, hz, snr, dt, drift, call, grid, pwr = row
+    call, grid = call.encode()[:255], (grid or "").encode()[:255]
+    body = _REC.pack(ts, hz, _clamp(round(snr * 10), -32768, 32767), _clamp(round(dt * 10), -32768, 32767),
+                     _clamp(drift, -128, 127), -1 if pwr is None else _clamp(pwr, 0, 127)) + \
+        bytes([len(call)]) + call + bytes([len(grid)]) + grid
+    return _LEN.pack(len(body)) + body + _CRC.pack(zlib.crc32(body))
+
+def decode(body):
+    """(ts, freq_hz, snr, dt, drift, call, grid, power) of one record body."""
+    ts, hz, snr, dt, drift, pwr = _REC.unpack_from(body)
+    i = _REC.size
+    call = body[i + 1:i + 1 + body[i]].decode()
+    i += 1 + body[i]
+    grid = body[i + 1:i + 1 + body[i]].decode() or None
+    return ts, hz, snr / 10, dt / 10, drift, call, grid, None if pwr < 0 else pwr
+
+def _scan(data, offset=0):
+    """Yield (spot, end offset) for each intact record from offset; stop at a torn or bad one."""
+    while offset + _LEN.size <= len(data):
+        n, = _LEN.unpack_from(data, offset)
+        end = offset + _LEN.size + n + _CRC.size
+        if end > len(data):
+            return
+        body = data[offset + _LEN.size:end - _CRC.size]
+        if zlib.crc32(body) != _CRC.unpack_from(data, end - _CRC.size)[0]:
+            return
+        yield decode(body), end
+        offset = end
+
+class Spool:
+    """The supervisor appends (append/feed); the uploader reads (read_batch/commit)."""
+    def __init__(self, path=SPOOL_DIR, max_bytes=MAX_BYTES, segment_bytes=SEGMENT_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.dropped = 0        # spots discarded to stay inside max_bytes
+        self._fd = None
+        self._seq = None
+        self._size = 0
+        self._tails = {}        # source -> partial output line
+        self._ctx = {}          # source -> time for spots without their own (parse_lines)
+        self.untimed = 0        # spot lines skipped for having neither
+        os.makedirs(path, exist_ok=True)
+
+    def _segments(self):
+        return sorted(int(n[:-6]) for n in os.listdir(self.path)
+                      if n.endswith(".spool") and n[:-6].isdigit())
+
+    def _seg_path(self, seq):
+        return os.path.join(self.path, f"{seq:010d}.spool")
+
+    # -- writer side --
+    def _open_segment(self, seq):
+        path = self._seg_path(seq)
+        size = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            for _, size in _scan(data):
+                pass
+            if size < len(data):
+                print(f"WARNING: {path}: cut {len(data) - size} bytes of torn record", flush=True)
+                os.truncate(path, size)
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._seq, self._size = seq, size
+
+    def append(self, rows):
+        """Append spot_store rows durably (one write and fsync); return how many."""
+        frames = [encode(r) for r in rows]
+        if not frames:
+            return 0
+        if self._fd is None:
+            segs = self._segments()
+            self._open_segment(segs[-1] if segs else 1)
+        while frames:
+            room, n = self.segment_bytes - self._size, 0
+            while n < len(frames) and (room >= len(frames[n]) or (n == 0 and not self._size)):
+                room -= len(frames[n])
+                n += 1
+            if not n:
+                os.close(self._fd)
+                self._open_segment(self._seq + 1)
+                continue
+            chunk = b"".join(frames[:n])
+            os.write(self._fd, chunk)
+            os.fsync(self._fd)
+            self._size += len(chunk)
+            frames = frames[n:]
+        self._enforce_bound()
+        return len(rows)
+
+    def feed(self, data, source=""):
+        """Spool the spot lines in a chunk of decoder output; partial lines wait for the rest.
+
+        Spots without their own time are dated by the slot headers wspr_control.py
+        stamps into the output as it reads it, never by when feed() happens to run.
+        """
+        buf = self._tails.get(source, b"") + data
+        cut = buf.rfind(b"\n") + 1
+        self._tails[source] = buf[cut:][-512:]
+        if b"Spot" not in buf[:cut] and b"--- read in slot" not in buf[:cut]:
+            return 0
+        rows, self._ctx[source], untimed = parse_lines(
+            buf[:cut].decode("utf-8", "replace").splitlines(), self._ctx.get(source))
+        self.untimed += untimed
+        return self.append(rows)
+
+    def _seg_size(self, seq):
+        try:
+            return os.path.getsize(self._seg_path(seq))
+        except FileNotFoundError:
+            return 0  # the uploader just finished with it
+
+    def _enforce_bound(self):
+        segs = [(s, self._seg_size(s)) for s in self._segments()]
+        total = sum(size for _, size in segs)
+        while total > self.max_bytes and len(segs) > 1:
+            seq, size = segs.pop(0)
+            try:
+                with open(self._seg_path(seq), "rb") as f:
+                    n = sum(1 for _ in _scan(f.read()))
+                os.unlink(self._seg_path(seq))
+            except FileNotFoundError:
+                n = 0
+            total -= size
+            self.dropped += n
+            print(f"WARNING: spool over {self.max_bytes // MB} MB; dropped {n} oldest spots", flush=True)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    # -- reader side --
+    def _cursor(self):
+        try:
+            with open(os.path.join(self.path, "cursor")) as f:
+                seq, off = f.read().split()
+            return int(seq), int(off)
+        except (OSError, ValueError):
+            segs = self._segments()
+            return (segs[0] if segs else 1), 0
+
+    def read_batch(self, limit=BATCH_SPOTS):
+        """Up to limit unacknowledged spots, oldest first, and the cursor just past them."""
+        seq, off = self._cursor()
+        out = []
+        segs = [s for s in self._segments() if s >= seq]
+        for i, s in enumerate(segs):
+            if s != seq:
+                seq, off = s, 0  # next segment (or the cursor's was dropped by the bound)
+            try:
+                with open(self._seg_path(s), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            for spot, off in _scan(data, off):
+                out.append(spot)
+                if len(out) >= limit:
+                    return out, (seq, off)
+            if i < len(segs) - 1 and off < len(data):
+                print(f"WARNING: {self._seg_path(s)}: skipping {len(data) - off} unreadable bytes", flush=True)
+        return out, (seq, off)
+
+    def commit(self, cursor):
+        """Record everything before cursor as uploaded and delete the finished segments."""
+        tmp = os.path.join(self.path, "cursor.tmp")
+        with open(tmp, "w") as f:
+            f.write(f"{cursor[0]} {cursor[1]}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, "cursor"))
+        for s in self._segments():
+            if s < cursor[0]:
+                os.unlink(self._seg_path(s))
+
+    def status(self):
+        """(pending spots, spool bytes, oldest pending slot or None)."""
+        n, oldest, (seq, off) = 0, None, self._cursor()
+        for s in self._segments():
+            if s < seq:
+                continue
+            with open(self._seg_path(s), "rb") as f:
+                for spot, _ in _scan(f.read(), off if s == seq else 0):
+                    n += 1
+                    oldest = spot[0] if oldest is None else oldest
+        size = sum(self._seg_size(s) for s in self._segments())
+        return n, size, oldest
+
+# -------- upload --------
+def mept_lines(spots):
+    """wsprd_spots.txt lines, as wsprd writes them:
+    date time sync snr dt freq message drift cycles jitter.
+
+    rtlsdr_wsprd does not print sync, cycles or jitter, so the spool has
+    none to give; they go out as 0.
+    """
+    for ts, hz, snr, dt, drift, call, grid, pwr in spots:
+        message = " ".join(str(f) for f in (call, grid, pwr) if f is not None and f != "")
+        yield (f"{time.strftime('%y%m%d %H%M', time.gmtime(ts))} {0:3d} {snr:3.0f} {dt:4.1f} "
+               f"{hz / 1e6:10.7f}  {message:<22} {drift:2d} {0:5d} {0:4d}")
+
+# WSPRnet's reply to an accepted file, e.g. "3 out of 5 spot(s) added" (duplicates are not)
+_ADDED = re.compile(rb"(\d+)(?:\s+out of\s+(\d+))?\s+spot\(s\) added")
+
+def post_batch(spots, url, call, grid, timeout=UPLOAD_TIMEOUT):
+    """POST one batch as multipart/form-data and return how many spots were new.
+
+    Raises OSError unless the reply says the server read every spot of the
+    batch: the spool only lets go of spots the server has seen.
+    """
+    import urllib.request
+    boundary = f"wspr-zero-{random.getrandbits(64):016x}"
+    parts = [('name="call"', call.encode()), ('name="grid"', grid.encode()),
+             ('name="allmept"; filename="wsprd_spots.txt"',
+              ("\n".join(mept_lines(spots)) + "\n").encode())]
+    body = b"".join(f"--{boundary}\r\nContent-Disposition: form-data; {disp}\r\n\r\n".encode() + value + b"\r\n"
+                    for disp, value in parts) + f"--{boundary}--\r\n".encode()
+    req = urllib.request.Request(url, data=body, method="POST",
+                                 headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        reply = resp.read(4096)
+        if resp.status != 200:
+            raise OSError(f"HTTP {resp.status}")
+    m = _ADDED.search(reply)
+    if not m:
+        raise OSError("spots not accepted: " + reply.decode("utf-8", "replace").strip()[:200])
+    if m[2] and int(m[2]) != len(spots):
+        raise OSError(f"server read {int(m[2])} of {len(spots)} spots")
+    return int(m[1])
+
+def upload(spool, post, follow=False, batch=BATCH_SPOTS, online=lambda: True,
+           sleep=time.sleep, rand=random.random):
+    """Drain the spool through post(spots) -> new spots; return the number of spots uploaded."""
+    sent = failures = 0
+    while True:
+        spots, cursor = spool.read_batch(batch)
+        if not spots or not online():
+            if not follow:
+                return sent
+            sleep(IDLE_INTERVAL * (0.5 + rand()))
+            continue
+        try:
+            added = post(spots)
+        except OSError as e:
+            failures += 1
+            delay = rand() * min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (failures - 1))
+            print(f"Upload of {len(spots)} spots failed ({e}); retrying in {delay:.0f} s", flush=True)
+            if not follow and failures >= 3:
+                return sent
+            sleep(delay)
+            continue
+        spool.commit(cursor)
+        sent += len(spots)
+        failures = 0
+        print(f"Uploaded {len(spots)} spots, {added} new (oldest "
+              f"{time.strftime('%Y-%m-%d %H:%MZ', time.gmtime(spots[0][0]))})", flush=True)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="WSPR-zero offline spot spool")
+    ap.add_argument("--spool", default=SPOOL_DIR)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+    add = sub.add_parser("add")
+    add.add_argument("--log", action="append", required=True, help="receiver log to spool (repeatable)")
+    up = sub.add_parser("upload")
+    up.add_argument("--follow", action="store_true", help="keep draining as spots arrive")
+    up.add_argument("--url", default=UPLOAD_URL, help=f"upload server (WSPRnet: {WSPRNET_URL})")
+    up.add_argument("--batch", type=int, default=BATCH_SPOTS)
+    args = ap.parse_args(argv)
+
+    spool = Spool(args.spool)
+    if args.cmd == "status":
+        n, size, oldest = spool.status()
+        since = time.strftime(" since %Y-%m-%d %H:%MZ", time.gmtime(oldest)) if oldest else ""
+        print(f"{n} spots pending{since}; spool {size / 1024:.1f} KiB in {args.spool}")
+    elif args.cmd == "add":
+        n = 0
+        for path in args.log:
+            with open(path, "rb") as f:
+                n += spool.feed(f.read() + b"\n", source=path)
+        spool.close()
+        print(f"spooled {n} spots" + (f"; skipped {spool.untimed} with no time and no slot header before them"
+                                      if spool.untimed else ""))
+    elif not args.url:
+        print("Uploads are off: set WSPR_SPOT_UPLOAD_URL or pass --url", file=sys.stderr)
+        return 2
+    else:
+        import wspr_config
+        from readiness import network_up
+        cfg = wspr_config.load()
+        post = lambda spots: post_batch(spots, args.url, cfg.get("call_sign", ""), cfg.get("maidenhead_grid", ""))
+        upload(spool, post, args.follow, args.batch, online=network_up)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
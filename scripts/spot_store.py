@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""Incremental, indexed store of spots decoded by rtlsdr_wsprd.
+
+Tails logs/wspr-receive.log (and the per-receiver wspr-receive-<name>.log
+files of multi-receiver mode) from a byte-offset checkpoint and writes each
+"Spot :" line into an SQLite database indexed by time, band, callsign and
+grid.  The checkpoint is committed in the same transaction as the spots, so
+a crash never loses or duplicates a line.  A spot takes its slot from its
+own line or, as rtlsdr_wsprd prints none, from the slot header the
+supervisor writes into the log; spots with neither are skipped.
+
+    spot_store.py ingest [--follow] [--log PATH ...]
+    spot_store.py query [--band 30m] [--call K6FTP] [--grid CM87]
+                        [--since 2024-06-01T00:00] [--until ...] [--limit N]
+"""
+import argparse
+import calendar
+import glob
+import gzip
+import os
+import re
+import sqlite3
+import sys
+import time
+
+LOG_DIR = '/opt/wsprzero/wspr-zero/logs'
+RX_LOG = os.path.join(LOG_DIR, 'wspr-receive.log')
+DB_PATH = os.path.join(LOG_DIR, 'spots.db')
+
+CHUNK_BYTES = 64 * 1024     # read size; bounds memory regardless of log size
+HEAD_BYTES = 64             # file prefix kept to spot truncate-and-rewrite
+FOLLOW_INTERVAL = 10.0      # seconds between polls in --follow mode
+SLOT_SECONDS = 120
+
+# WSPR sub-band edges in MHz -> band name
+BANDS = [
+    (0.1360, 0.1380, "2200m"), (0.4742, 0.4762, "630m"), (1.8366, 1.8386, "160m"),
+    (3.5686, 3.5706, "80m"),   (5.2872, 5.3666, "60m"),  (7.0386, 7.0406, "40m"),
+    (10.1387, 10.1407, "30m"), (14.0956, 14.0976, "20m"), (18.1046, 18.1066, "17m"),
+    (21.0946, 21.0966, "15m"), (24.9246, 24.9266, "12m"), (28.1246, 28.1266, "10m"),
+    (50.2930, 50.2950, "6m"),  (144.4890, 144.4910, "2m"),
+]
+
+# Optional leading "YYMMDD HHMM" (or "YYYY-MM-DD HH:MM[:SS]") then the
+# rtlsdr_wsprd spot: SNR, DT, frequency (MHz), drift, call, [grid], [power]
+_spot_pat = re.compile(
+    r'^(?:(?P<ymd>\d{6})\s+(?P<hm>\d{4})\s+'
+    r'|(?P<iso>\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2})?)\s+)?'
+    r'Spot\s*:\s*(?P<snr>[-+]?\d+(?:\.\d+)?)\s+(?P<dt>[-+]?\d+(?:\.\d+)?)\s+'
+    r'(?P<freq>\d+\.\d+)\s+(?P<drift>[-+]?\d+)\s+(?P<call>[<>/A-Za-z0-9.]+)'
+    r'(?:\s+(?P<grid>[A-Ra-r]{2}\d{2}(?:[A-Xa-x]{2})?))?(?:\s+(?P<pwr>\d+))?'
+)
+
+# rtlsdr_wsprd prints its spots without a time, so wspr_control.py writes this header into
+# a receiver log before the first output it reads in each slot.  The decoder prints a
+# window's spots once the window is over, so spots after a header are from the slot before.
+_slot_pat = re.compile(r'^--- read in slot (?P<iso>\d{4}-\d{2}-\d{2} \d{2}:\d{2})Z ---$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spots (
+    ts      INTEGER NOT NULL,   -- UTC slot start, unix seconds
+    band    TEXT,
+    freq_hz INTEGER NOT NULL,
+    snr     REAL,
+    dt      REAL,
+    drift   INTEGER,
+    call    TEXT NOT NULL,
+    grid    TEXT,
+    power   INTEGER
+);
+CREATE INDEX IF NOT EXISTS spots_ts   ON spots(ts);
+CREATE INDEX IF NOT EXISTS spots_band ON spots(band, ts);
+CREATE INDEX IF NOT EXISTS spots_call ON spots(call, ts);
+CREATE INDEX IF NOT EXISTS spots_grid ON spots(grid, ts);
+CREATE TABLE IF NOT EXISTS checkpoint (
+    path   TEXT PRIMARY KEY,
+    inode  INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    head   BLOB,
+    slot   INTEGER              -- slot of untimed spots at offset (from the last header)
+);
+"""
+
+def band_for_freq(mhz):
+    for lo, hi, name in BANDS:
+        if lo <= mhz <= hi:
+            return name
+    return None
+
+def slot_start(epoch):
+    return int(epoch) - int(epoch) % SLOT_SECONDS
+
+def slot_header(slot):
+    """The header line wspr_control.py writes for output read in slot (unix seconds)."""
+    return time.strftime('--- read in slot %Y-%m-%d %H:%MZ ---\n', time.gmtime(slot)).encode()
+
+def _iso_time(iso):
+    iso = iso.replace('T', ' ')
+    fmt = '%Y-%m-%d %H:%M:%S' if iso.count(':') == 2 else '%Y-%m-%d %H:%M'
+    return calendar.timegm(time.strptime(iso, fmt))
+
+def _line_time(m):
+    if m.group('ymd'):
+        return calendar.timegm(time.strptime(m.group('ymd') + m.group('hm'), '%y%m%d%H%M'))
+    if m.group('iso'):
+        return _iso_time(m.group('iso'))
+    return None
+
+def parse_spot(line, default_ts=None):
+    """Return a spots row for a decoder line, or None if it is not a spot.
+
+    A spot without its own time gets default_ts; with no default_ts it is
+    skipped (None) rather than given a made-up time.
+    """
+    m = _spot_pat.match(line.strip())
+    if not m:
+        return None
+    ts = _line_time(m)
+    if ts is None:
+        ts = default_ts
+        if ts is None:
+            return None
+    mhz = float(m.group('freq'))
+    return (
+        slot_start(ts),
+        band_for_freq(mhz),
+        int(round(mhz * 1e6)),
+        float(m.group('snr')),
+        float(m.group('dt')),
+        int(m.group('drift')),
+        m.group('call').upper(),
+        (m.group('grid') or '').upper() or None,
+        int(m.group('pwr')) if m.group('pwr') else None,
+    )
+
+def parse_lines(lines, ctx=None):
+    """Spot rows for consecutive log lines: (rows, ctx, untimed).
+
+    ctx is the time given to spots without their own, set by each slot
+    header; pass the returned ctx back in with the next lines of the same
+    log.  untimed counts the spot lines skipped for having neither.
+    """
+    rows, untimed = [], 0
+    for line in lines:
+        line = line.strip()
+        m = _slot_pat.match(line)
+        if m:
+            ctx = _iso_time(m.group('iso')) - SLOT_SECONDS
+            continue
+        row = parse_spot(line, ctx)
+        if row:
+            rows.append(row)
+        elif ctx is None and _spot_pat.match(line):
+            untimed += 1
+    return rows, ctx, untimed
+
+def open_db(path=DB_PATH):
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    if "slot" not in {row[1] for row in db.execute("PRAGMA table_info(checkpoint)")}:
+        db.execute("ALTER TABLE checkpoint ADD COLUMN slot INTEGER")  # store from before headers
+    return db
+
+def _get_checkpoint(db, path):
+    row = db.execute("SELECT inode, offset, head, slot FROM checkpoint WHERE path=?",
+                     (path,)).fetchone()
+    return row if row else (None, 0, b'', None)
+
+def _set_checkpoint(db, path, inode, offset, head, slot):
+    db.execute("INSERT OR REPLACE INTO checkpoint(path, inode, offset, head, slot) VALUES (?,?,?,?,?)",
+               (path, inode, offset, head, slot))
+
+def _read_head(f):
+    f.seek(0)
+    return f.read(HEAD_BYTES)
+
+def _open_rotated(path, inode, head):
+    """Open the renamed segment that still holds an old inode or, once the writer
+    has gzipped it, the .gz that starts with the old file's head; None if gone."""
+    cands = sorted(glob.glob(glob.escape(path) + '.*'), reverse=True)  # newest first
+    for cand in cands:
+        if cand.endswith('.gz'):
+            continue
+        try:
+            if os.stat(cand).st_ino == inode:
+                return open(cand, 'rb')
+        except OSError:
+            continue
+    for cand in cands:
+        if not (head and cand.endswith('.gz')):
+            continue
+        try:
+            f = gzip.open(cand, 'rb')
+            if f.read(len(head)) == head:
+                return f
+            f.close()
+        except (OSError, EOFError):
+            continue
+    return None
+
+def _ingest_file(db, f, start, ctx, ckpt_path, inode, head):
+    """Stream complete lines from offset start; commit spots + offset per chunk.
+
+    Returns (spots, ctx at the end, untimed spot lines skipped).
+    """
+    offset = start
+    f.seek(offset)
+    pending = b''
+    count = untimed = 0
+    while True:
+        chunk = f.read(CHUNK_BYTES)
+        if not chunk:
+            break
+        data = pending + chunk
+        cut = data.rfind(b'\n') + 1
+        pending = data[cut:]
+        rows, ctx, skipped = parse_lines(data[:cut].decode('utf-8', 'replace').splitlines(), ctx)
+        untimed += skipped
+        offset += cut
+        if len(pending) > CHUNK_BYTES:   # runaway line with no newline; skip it
+            offset += len(pending)
+            pending = b''
+        with db:
+            if rows:
+                db.executemany("INSERT INTO spots VALUES (?,?,?,?,?,?,?,?,?)", rows)
+            _set_checkpoint(db, ckpt_path, inode, offset, head, ctx)
+        count += len(rows)
+    return count, ctx, untimed
+
+def ingest(db, path=RX_LOG):
+    """Ingest whatever was appended to path since the last checkpoint."""
+    inode, offset, head, ctx = _get_checkpoint(db, path)
+    count = untimed = 0
+
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return 0
+
+    if inode is not None and st.st_ino != inode:
+        # Rotated: drain the tail of the old segment if it is still around, compressed or not
+        old = _open_rotated(path, inode, head)
+        if old:
+            try:
+                with old:
+                    count, ctx, untimed = _ingest_file(db, old, offset, ctx, path, inode, head)
+            except (OSError, EOFError) as e:  # a .gz cut short: keep what was read
+                print(f"WARNING: {path}: reading the rotated segment: {e}", flush=True)
+        offset, head = 0, b''  # the new segment carries on from the old one's last header
+
+    with open(path, 'rb') as f:
+        cur_head = _read_head(f)
+        # Truncated in place (possibly already refilled): prefix no longer matches
+        if st.st_size < offset or cur_head[:len(head)] != head[:len(cur_head)]:
+            offset, ctx = 0, None
+        n, ctx, skipped = _ingest_file(db, f, offset, ctx, path,
+                                       os.fstat(f.fileno()).st_ino, cur_head)
+    count += n
+    untimed += skipped
+    if untimed:
+        print(f"WARNING: {path}: skipped {untimed} spot line(s) with no time and no slot header before them",
+              flush=True)
+    return count
+
+def query(db, since=None, until=None, band=None, call=None, grid=None, limit=None):
+    where, args = [], []
+    if since is not None: where.append("ts >= ?"); args.append(int(since))
+    if until is not None: where.append("ts < ?");  args.append(int(until))
+    if band: where.append("band = ?"); args.append(band)
+    if call: where.append("call = ?"); args.append(call.upper())
+    if grid: where.append("grid LIKE ?"); args.append(grid.upper() + '%')
+    sql = "SELECT * FROM spots"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY ts"
+    if limit:
+        sql += " LIMIT %d" % int(limit)
+    return db.execute(sql, args).fetchall()
+
+def _parse_when(s):
+    if s is None:
+        return None
+    for fmt in ('%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return calendar.timegm(time.strptime(s, fmt))
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"bad time {s!r}; use YYYY-MM-DD[THH:MM] (UTC)")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="WSPR-zero receive spot store")
+    ap.add_argument('--db', default=DB_PATH)
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    ing = sub.add_parser('ingest')
+    ing.add_argument('--log', action='append',
+                     help="log to tail (repeatable); default: wspr-receive.log and every "
+                          "per-receiver wspr-receive-*.log")
+    ing.add_argument('--follow', action='store_true')
+    q = sub.add_parser('query')
+    q.add_argument('--since', type=_parse_when)
+    q.add_argument('--until', type=_parse_when)
+    q.add_argument('--band')
+    q.add_argument('--call')
+    q.add_argument('--grid')
+    q.add_argument('--limit', type=int)
+    args = ap.parse_args(argv)
+
+    db = open_db(args.db)
+    if args.cmd == 'ingest':
+        while True:
+            logs = args.log or [RX_LOG] + sorted(glob.glob(os.path.join(LOG_DIR, 'wspr-receive-*.log')))
+            n = sum(ingest(db, log) for log in logs)
+            if n:
+                print(f"ingested {n} spots", flush=True)
+            if not args.follow:
+                break
+            time.sleep(FOLLOW_INTERVAL)
+    else:
+        for ts, band, hz, snr, dt, drift, call, grid, pwr in query(
+                db, args.since, args.until, args.band, args.call, args.grid, args.limit):
+            stamp = time.strftime('%Y-%m-%d %H:%M', time.gmtime(ts))
+            print(f"{stamp}  {band or '?':>5}  {hz / 1e6:10.6f}  {snr:6.1f}  {dt:5.1f}  "
+                  f"{drift:3d}  {call:<10} {grid or '':<6} {pwr if pwr is not None else ''}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Local stand-in for WSPRnet's batch spot upload, for testing spot_spool.py.
+
+Accepts the multipart POST spot_spool.upload sends (fields call, grid and
+the allmept spot file) on any path and answers 200 with "N out of M
+spot(s) added", the reply spot_spool.post_batch looks for.  Spots are
+remembered by their full line, so a resent batch shows up as duplicates
+rather than new spots, which is what a crash-recovery test needs to see.
+
+    spot_upload_standin.py [--port 8081] [--fail-rate 0.2] [--latency 0.5]
+    WSPR_SPOT_UPLOAD_URL=http://127.0.0.1:8081/ spot_spool.py upload
+
+GET /__stats returns batch, spot, duplicate and byte counters;
+POST /__reset zeroes them, POST /__down makes uploads fail with 503 until
+POST /__up (a link outage).
+"""
+import argparse
+import email.parser
+import email.policy
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.batches = 0
+        self.rejected = 0
+        self.spots = 0
+        self.duplicates = 0
+        self.bytes_in = 0
+        self.seen = set()
+        self.started = None
+        self.last = None
+
+    def record(self, lines, size):
+        """Count a batch; return how many of its spots were new."""
+        with self.lock:
+            before = self.spots
+            now = time.monotonic()
+            self.started = self.started or now
+            self.last = now
+            self.batches += 1
+            self.bytes_in += size
+            for line in lines:
+                if line in self.seen:
+                    self.duplicates += 1
+                else:
+                    self.seen.add(line)
+                    self.spots += 1
+            return self.spots - before
+
+    def as_dict(self):
+        with self.lock:
+            span = (self.last - self.started) if self.started else 0.0
+            return {"batches": self.batches, "rejected": self.rejected, "spots": self.spots,
+                    "duplicates": self.duplicates, "bytes_in": self.bytes_in,
+                    "spots_per_s": round(self.spots / span, 1) if span else None}
+
+def _spot_lines(content_type, body):
+    """Lines of the allmept file part of a multipart/form-data body."""
+    msg = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    for part in msg.iter_parts():
+        if part.get_param("name", header="content-disposition") == "allmept":
+            return [l for l in part.get_payload(decode=True).decode().splitlines() if l.strip()]
+    return None
+
+def make_handler(stats, down, fail_rate=0.0, latency=0.0):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *a):
+            pass
+
+        def _send(self, code, body=b""):
+            self.send_response(code)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/__stats":
+                return self._send(200, json.dumps(stats.as_dict()).encode())
+            self._send(404)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if self.path == "/__reset":
+                stats.reset()
+                return self._send(204)
+            if self.path in ("/__down", "/__up"):
+                (down.set if self.path == "/__down" else down.clear)()
+                return self._send(204)
+            if latency:
+                time.sleep(latency)
+            if down.is_set() or random.random() < fail_rate:
+                with stats.lock:
+                    stats.rejected += 1
+                return self._send(503)
+            lines = _spot_lines(self.headers.get("Content-Type", ""), body)
+            if lines is None:
+                return self._send(400)
+            added = stats.record(lines, len(body))
+            self._send(200, b"%d out of %d spot(s) added\n" % (added, len(lines)))
+    return Handler
+
+def serve(host="127.0.0.1", port=8081, fail_rate=0.0, latency=0.0):
+    """Start the stand-in in a background thread; return (server, stats)."""
+    stats = Stats()
+    httpd = ThreadingHTTPServer((host, port), make_handler(stats, threading.Event(), fail_rate, latency))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, stats
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline stand-in for the WSPRnet spot upload")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of uploads answered 503")
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every upload")
+    args = ap.parse_args()
+    httpd, _ = serve(args.host, args.port, args.fail_rate, args.latency)
+    print(f"Stand-in spot upload on http://{args.host}:{httpd.server_address[1]}/", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        httpd.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Import-time / first-action latency budget for the scripts in this directory.
+
+Each case runs in a fresh interpreter (median of --runs) with RPi.GPIO
+replaced by a no-op stub and WSPR_LOG_DIR pointing at a scratch directory,
+so it also works on CI machines without Pi hardware and leaves a node's
+logs and processes alone.  A case fails if it is slower than its budget or
+if it pulled in a module that should have been imported lazily.
+
+    startup_budget.py [--runs 7] [--scale 1.0]
+
+Budgets are for a desktop/CI x86 box; use --scale (e.g. 15) on a Pi Zero,
+ideally with wspr-service stopped so the decoder does not skew the times.
+Exit status is 1 if any case is over budget.  A new entry point gets a case
+here.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+GPIO_STUB = """
+BCM = 11; BOARD = 10; OUT = 1; IN = 0; HIGH = 1; LOW = 0
+PUD_UP = 22; PUD_DOWN = 21; RISING = 31; FALLING = 32; BOTH = 33
+def _noop(*a, **k): pass
+setwarnings = setmode = setup = output = cleanup = add_event_detect = _noop
+def input(*a): return HIGH
+def gpio_function(*a): return OUT
+"""
+
+# name, code run in the child, budget (ms), modules that must NOT be loaded
+CASES = [
+    ("wspr_control import", "import wspr_control", 50, ["psutil", "rotating_log"]),
+    # the whole `stop` path, but with no processes to find: it must never signal a live transmitter
+    ("wspr_control stop", "import runpy, sys, psutil; psutil.process_iter = lambda *a, **k: iter(());"
+     "sys.argv = ['wspr_control.py', 'stop']; runpy.run_path('wspr_control.py', run_name='__main__')",
+     150, []),
+    ("server_checkin import", "import server_checkin", 80, ["requests", "asyncio", "RPi.GPIO"]),
+    # what the session loads once the LED preflight is out
+    ("server_checkin session", "import server_checkin, asyncio, aio_http, systemd_bus", 120,
+     ["requests", "RPi.GPIO"]),
+    ("spot_store import", "import spot_store", 50, []),
+    ("spot_spool import", "import spot_spool", 60, ["urllib.request", "wspr_config"]),
+    ("systemd_bus import", "import systemd_bus", 40, ["asyncio"]),
+    ("led_service import", "import led_service", 20, ["RPi.GPIO"]),
+    # up to the button loop, with the GPIO device present
+    ("utility-button startup", "import sys, runpy, readiness, button_engine;"
+     "readiness.gpio_present = lambda: True; button_engine.ButtonEngine.run = lambda self: sys.exit(0);"
+     "runpy.run_path('utility-button.py', run_name='__main__')", 80,
+     ["systemd_bus", "asyncio", "psutil"]),
+    ("wspr-boot-config import", "import runpy; runpy.run_path('wspr-boot-config.py')", 50, []),
+]
+
+CHILD = """
+import sys, time, json
+t0 = time.perf_counter()
+try:
+    exec(compile({code!r}, '<case>', 'exec'))
+except SystemExit:
+    pass
+ms = (time.perf_counter() - t0) * 1000
+print(json.dumps({{"ms": ms, "modules": sorted(sys.modules)}}))
+"""
+
+def _stub_dir():
+    d = tempfile.mkdtemp(prefix="wspr-stubs-")
+    os.makedirs(os.path.join(d, "RPi"))
+    open(os.path.join(d, "RPi", "__init__.py"), "w").close()
+    with open(os.path.join(d, "RPi", "GPIO.py"), "w") as f:
+        f.write(GPIO_STUB)
+    return d
+
+def run_case(code, stubs, runs):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([stubs, HERE]), PYTHONDONTWRITEBYTECODE="1",
+               WSPR_LOG_DIR=os.path.join(stubs, "logs"))
+    times, modules = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", CHILD.format(code=code)], cwd=HERE, env=env,
+                             capture_output=True, text=True, timeout=60)
+        last = (out.stdout.strip().splitlines() or ["{}"])[-1]
+        try:
+            res = json.loads(last)
+        except ValueError:
+            raise RuntimeError(f"case failed:\n{out.stdout}\n{out.stderr}")
+        times.append(res["ms"])
+        modules.update(res["modules"])
+    return statistics.median(times), modules
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--runs", type=int, default=7)
+    ap.add_argument("--scale", type=float, default=1.0, help="multiply every budget (slow hardware)")
+    args = ap.parse_args()
+
+    stubs = _stub_dir()
+    failed = False
+    for name, code, budget, forbidden in CASES:
+        ms, modules = run_case(code, stubs, args.runs)
+        limit = budget * args.scale
+        leaked = [m for m in forbidden if m in modules]
+        ok = ms <= limit and not leaked
+        failed |= not ok
+        note = f"  eagerly imported: {', '.join(leaked)}" if leaked else ""
+        print(f"{'OK' if ok else 'FAIL':<5} {name:<26} {ms:7.1f} ms (budget {limit:.0f} ms){note}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
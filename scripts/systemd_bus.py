@@ -0,0 +1,566 @@
+"""systemd service control over D-Bus, without forking systemctl.
+
+One connection to systemd's manager per process: as root the private
+socket systemctl itself uses (/run/systemd/private, no bus daemon needed),
+otherwise the system bus.  Start, stop and poweroff calls return as soon
+as systemd has queued the job; the JobRemoved signal then says how it
+ended, and the returned Job can be waited on from a thread or awaited from
+asyncio:
+
+    mgr = Manager()
+    job = mgr.stop_unit("wspr-service.service")
+    job.result(15)              # "done", "failed", "canceled", "timeout", ...
+    await job.wait(15)          # the same from a coroutine
+
+WSPR_SYSTEMD_BUS names another socket that answers like the private one.
+FakeSystemd is such a peer, speaking the same wire protocol, for tests
+and benches off the Pi:
+
+    systemd_bus.py fake --socket /tmp/systemd.sock --delay wspr-service.service=1.5
+    WSPR_SYSTEMD_BUS=unix:path=/tmp/systemd.sock systemd_bus.py stop wspr-service.service
+"""
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+SYSTEMD_BUS = os.environ.get("WSPR_SYSTEMD_BUS", "")
+PRIVATE_SOCKET = "/run/systemd/private"
+SYSTEM_BUS = os.environ.get("DBUS_SYSTEM_BUS_ADDRESS", "unix:path=/var/run/dbus/system_bus_socket")
+CALL_TIMEOUT = 10.0    # seconds to wait for a method reply
+
+DBUS = "org.freedesktop.DBus"
+SYSTEMD = "org.freedesktop.systemd1"
+MANAGER_PATH = "/org/freedesktop/systemd1"
+MANAGER = "org.freedesktop.systemd1.Manager"
+
+class BusError(Exception):
+    """A D-Bus error reply, or a connection that is gone."""
+    def __init__(self, name, message=""):
+        super().__init__(f"{name}: {message}" if message else name)
+        self.name = name
+
+# -------- wire format (little-endian out, either endianness in) --------
+_FIXED = {"y": ("B", 1), "b": ("I", 4), "n": ("h", 2), "q": ("H", 2), "i": ("i", 4),
+          "u": ("I", 4), "x": ("q", 8), "t": ("Q", 8), "d": ("d", 8), "h": ("I", 4)}
+METHOD_CALL, METHOD_RETURN, ERROR, SIGNAL = 1, 2, 3, 4
+# header field codes
+F_PATH, F_INTERFACE, F_MEMBER, F_ERROR_NAME, F_REPLY_SERIAL, F_DESTINATION, F_SENDER, F_SIGNATURE = range(1, 9)
+_FIELD_SIGS = {F_PATH: "o", F_INTERFACE: "s", F_MEMBER: "s", F_ERROR_NAME: "s",
+               F_REPLY_SERIAL: "u", F_DESTINATION: "s", F_SENDER: "s", F_SIGNATURE: "g"}
+
+def _type_end(sig, i):
+    if sig[i] == "a":
+        return _type_end(sig, i + 1)
+    if sig[i] in "({":
+        depth = 0
+        for j in range(i, len(sig)):
+            depth += sig[j] in "({"
+            depth -= sig[j] in ")}"
+            if not depth:
+                return j + 1
+        raise ValueError(f"unbalanced signature {sig!r}")
+    return i + 1
+
+def split_signature(sig):
+    """'soa(yv)' -> ['s', 'o', 'a(yv)']"""
+    out, i = [], 0
+    while i < len(sig):
+        j = _type_end(sig, i)
+        out.append(sig[i:j])
+        i = j
+    return out
+
+def _alignment(sig):
+    c = sig[0]
+    if c in _FIXED:
+        return _FIXED[c][1]
+    return {"s": 4, "o": 4, "a": 4, "g": 1, "v": 1}.get(c, 8)
+
+class _Writer:
+    def __init__(self):
+        self.buf = bytearray()
+
+    def pad(self, n):
+        self.buf += b"\0" * (-len(self.buf) % n)
+
+    def write(self, sig, value):
+        c = sig[0]
+        if c in _FIXED:
+            fmt, size = _FIXED[c]
+            self.pad(size)
+            self.buf += struct.pack("<" + fmt, value)
+        elif c in "so":
+            b = value.encode()
+            self.pad(4)
+            self.buf += struct.pack("<I", len(b)) + b + b"\0"
+        elif c == "g":
+            b = value.encode()
+            self.buf += bytes([len(b)]) + b + b"\0"
+        elif c == "v":
+            vsig, v = value
+            self.write("g", vsig)
+            self.write(vsig, v)
+        elif c == "a":
+            self.pad(4)
+            at = len(self.buf)
+            self.buf += b"\0\0\0\0"
+            self.pad(_alignment(sig[1:]))
+            start = len(self.buf)
+            for item in (value.items() if isinstance(value, dict) else value):
+                self.write(sig[1:], item)
+            struct.pack_into("<I", self.buf, at, len(self.buf) - start)
+        elif c in "({":
+            self.pad(8)
+            for s, v in zip(split_signature(sig[1:-1]), value):
+                self.write(s, v)
+        else:
+            raise ValueError(f"unsupported D-Bus type {c!r}")
+
+class _Reader:
+    def __init__(self, data, endian, pos=0):
+        self.data, self.e, self.pos = data, endian, pos
+
+    def pad(self, n):
+        self.pos += -self.pos % n
+
+    def read(self, sig):
+        c = sig[0]
+        if c in _FIXED:
+            fmt, size = _FIXED[c]
+            self.pad(size)
+            v = struct.unpack_from(self.e + fmt, self.data, self.pos)[0]
+            self.pos += size
+            return bool(v) if c == "b" else v
+        if c in "sog":
+            if c == "g":
+                n, self.pos = self.data[self.pos], self.pos + 1
+            else:
+                self.pad(4)
+                n = struct.unpack_from(self.e + "I", self.data, self.pos)[0]
+                self.pos += 4
+            s = bytes(self.data[self.pos:self.pos + n]).decode()
+            self.pos += n + 1
+            return s
+        if c == "v":
+            return self.read(self.read("g"))
+        if c == "a":
+            self.pad(4)
+            n = struct.unpack_from(self.e + "I", self.data, self.pos)[0]
+            self.pos += 4
+            self.pad(_alignment(sig[1:]))
+            end, items = self.pos + n, []
+            while self.pos < end:
+                items.append(self.read(sig[1:]))
+            return dict(items) if sig[1] == "{" else items
+        if c in "({":
+            self.pad(8)
+            return tuple(self.read(s) for s in split_signature(sig[1:-1]))
+        raise ValueError(f"unsupported D-Bus type {c!r}")
+
+class Message:
+    def __init__(self, mtype, serial, fields, body=(), flags=0):
+        self.type, self.serial, self.fields, self.body, self.flags = mtype, serial, fields, list(body), flags
+
+    member = property(lambda self: self.fields.get(F_MEMBER))
+    reply_serial = property(lambda self: self.fields.get(F_REPLY_SERIAL))
+
+    def encode(self):
+        sig = self.fields.get(F_SIGNATURE) or ""
+        body = _Writer()
+        for s, v in zip(split_signature(sig), self.body):
+            body.write(s, v)
+        h = _Writer()
+        for s, v in (("y", ord("l")), ("y", self.type), ("y", self.flags), ("y", 1),
+                     ("u", len(body.buf)), ("u", self.serial)):
+            h.write(s, v)
+        h.write("a(yv)", [(code, (_FIELD_SIGS[code], v)) for code, v in self.fields.items() if v is not None])
+        h.pad(8)
+        return bytes(h.buf + body.buf)
+
+    @classmethod
+    def decode(cls, buf):
+        """(message, bytes used), or (None, 0) if buf does not hold a whole message yet."""
+        if len(buf) < 16:
+            return None, 0
+        e = "<" if buf[0:1] == b"l" else ">"
+        body_len, serial, fields_len = struct.unpack_from(e + "III", buf, 4)
+        header_len = 16 + fields_len + (-fields_len % 8)
+        if len(buf) < header_len + body_len:
+            return None, 0
+        r = _Reader(buf, e, 12)
+        fields = dict(r.read("a(yv)"))
+        r.pos = header_len
+        body = [r.read(s) for s in split_signature(fields.get(F_SIGNATURE, ""))]
+        return cls(buf[1], serial, fields, body, buf[2]), header_len + body_len
+
+def call_message(serial, dest, path, iface, member, sig="", args=()):
+    return Message(METHOD_CALL, serial, {F_PATH: path, F_INTERFACE: iface, F_MEMBER: member,
+                                         F_DESTINATION: dest, F_SIGNATURE: sig or None}, args)
+
+# -------- connection --------
+def _socket_for(address):
+    for part in address.split(";"):
+        kind, _, params = part.partition(":")
+        kv = dict(p.split("=", 1) for p in params.split(",") if "=" in p)
+        if kind == "unix" and ("path" in kv or "abstract" in kv):
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.connect(kv["path"] if "path" in kv else "\0" + kv["abstract"])
+            return s
+    raise BusError("org.freedesktop.DBus.Error.BadAddress", address)
+
+def default_address():
+    """(address, is_bus): a peer that is systemd itself, or the system bus daemon."""
+    if SYSTEMD_BUS:
+        return SYSTEMD_BUS, False
+    if os.geteuid() == 0 and os.path.exists(PRIVATE_SOCKET):
+        return f"unix:path={PRIVATE_SOCKET}", False
+    return SYSTEM_BUS, True
+
+class Connection:
+    """One authenticated D-Bus connection; replies and signals are read on a background thread.
+
+    is_bus: talking to a bus daemon (Hello, match rules) rather than straight to systemd.
+    """
+    def __init__(self, sock=None, is_bus=False, address=None):
+        if sock is None:
+            if address is None:
+                address, is_bus = default_address()
+            sock = _socket_for(address)
+        self.sock, self.is_bus = sock, is_bus
+        self.closed = False
+        self.on_signal = []             # callables(Message), run on the reader thread
+        self.on_close = []              # callables(BusError) run once when the connection goes
+        self._serial = itertools.count(1)
+        self._pending = {}              # serial -> Future
+        self._lock = threading.Lock()
+        self._auth()
+        threading.Thread(target=self._read_loop, name="dbus-reader", daemon=True).start()
+        if is_bus:
+            self.call(DBUS, "/org/freedesktop/DBus", DBUS, "Hello").result(CALL_TIMEOUT)
+
+    def _auth(self):
+        self.sock.sendall(b"\0AUTH EXTERNAL " + str(os.geteuid()).encode().hex().encode() + b"\r\n")
+        line = b""
+        while not line.endswith(b"\r\n"):
+            chunk = self.sock.recv(1)
+            if not chunk:
+                raise BusError("org.freedesktop.DBus.Error.AuthFailed", "connection closed")
+            line += chunk
+        if not line.startswith(b"OK "):
+            raise BusError("org.freedesktop.DBus.Error.AuthFailed", line.decode(errors="replace").strip())
+        self.sock.sendall(b"BEGIN\r\n")
+
+    def call(self, dest, path, iface, member, sig="", *args):
+        """Send a method call; return a Future for the reply's body (a list), or BusError."""
+        fut = concurrent.futures.Future()
+        with self._lock:
+            if self.closed:
+                raise BusError("org.freedesktop.DBus.Error.Disconnected", "connection closed")
+            serial = next(self._serial)
+            self._pending[serial] = fut
+            self.sock.sendall(call_message(serial, dest, path, iface, member, sig, args).encode())
+        return fut
+
+    def _read_loop(self):
+        buf = b""
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    break
+                buf += data
+                while True:
+                    msg, used = Message.decode(buf)
+                    if not msg:
+                        break
+                    buf = buf[used:]
+                    self._dispatch(msg)
+        except OSError:
+            pass
+        finally:
+            self._shut()
+
+    def _dispatch(self, msg):
+        if msg.type in (METHOD_RETURN, ERROR):
+            with self._lock:
+                fut = self._pending.pop(msg.reply_serial, None)
+            if fut is None or fut.done():
+                return
+            if msg.type == ERROR:
+                fut.set_exception(BusError(msg.fields.get(F_ERROR_NAME, "error"),
+                                           msg.body[0] if msg.body and isinstance(msg.body[0], str) else ""))
+            else:
+                fut.set_result(msg.body)
+        elif msg.type == SIGNAL:
+            for fn in list(self.on_signal):
+                fn(msg)
+
+    def _shut(self):
+        with self._lock:
+            was_closed, self.closed = self.closed, True
+            pending, self._pending = self._pending, {}
+        if was_closed:
+            return
+        err = BusError("org.freedesktop.DBus.Error.Disconnected", "connection closed")
+        for fut in pending.values():
+            if not fut.done():
+                fut.set_exception(err)
+        for fn in list(self.on_close):
+            fn(err)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self._shut()
+
+# -------- systemd manager --------
+class Job:
+    """A queued systemd job; its result is JobRemoved's ("done", "failed", "canceled", ...)."""
+    def __init__(self, path, unit):
+        self.path, self.unit = path, unit
+        self.future = concurrent.futures.Future()
+
+    def result(self, timeout=None):
+        """Block until the job has finished (concurrent.futures.TimeoutError after timeout)."""
+        return self.future.result(timeout)
+
+    async def wait(self, timeout=None):
+        """Await the job's result (asyncio.TimeoutError after timeout; the job carries on)."""
+        import asyncio
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self.future)), timeout)
+
+    def on_done(self, fn):
+        """Call fn(result) when the job finishes (on the D-Bus reader thread)."""
+        self.future.add_done_callback(lambda f: fn(f.exception() or f.result()))
+
+class Manager:
+    def __init__(self, conn=None):
+        self.conn = conn or Connection()
+        self._jobs = {}                                 # path -> Job still running
+        self._finished = collections.OrderedDict()      # path -> result seen before its reply
+        self._lock = threading.Lock()
+        self.conn.on_signal.append(self._signal)
+        self.conn.on_close.append(self._fail_jobs)
+        if self.conn.is_bus:
+            self.conn.call(DBUS, "/org/freedesktop/DBus", DBUS, "AddMatch", "s",
+                           f"type='signal',sender='{SYSTEMD}',interface='{MANAGER}',member='JobRemoved'"
+                           ).result(CALL_TIMEOUT)
+        self._call("Subscribe")   # systemd only sends job signals to subscribers
+
+    @property
+    def closed(self):
+        return self.conn.closed
+
+    def _call(self, member, sig="", *args):
+        try:
+            return self.conn.call(SYSTEMD, MANAGER_PATH, MANAGER, member, sig, *args).result(CALL_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            raise BusError("org.freedesktop.DBus.Error.Timeout", f"no reply to {member}") from None
+
+    def _job(self, member, unit, mode):
+        path = self._call(member, "ss", unit, mode)[0]
+        job = Job(path, unit)
+        with self._lock:
+            if path in self._finished:
+                job.future.set_result(self._finished.pop(path))
+            elif self.conn.closed:   # gone since the reply: _fail_jobs has already run
+                job.future.set_exception(BusError("org.freedesktop.DBus.Error.Disconnected",
+                                                  "connection closed"))
+            else:
+                self._jobs[path] = job
+        return job
+
+    def _signal(self, msg):
+        if msg.member != "JobRemoved" or len(msg.body) != 4:
+            return
+        _, path, _, result = msg.body
+        with self._lock:
+            job = self._jobs.pop(path, None)
+            if job is None:
+                self._finished[path] = result   # our reply may still be on its way
+                while len(self._finished) > 64:
+                    self._finished.popitem(last=False)
+        if job is not None and not job.future.done():
+            job.future.set_result(result)
+
+    def _fail_jobs(self, err):
+        # No JobRemoved can arrive any more: waiters get the disconnect now, not at their timeout
+        with self._lock:
+            jobs, self._jobs = self._jobs, {}
+        for job in jobs.values():
+            if not job.future.done():
+                job.future.set_exception(err)
+
+    def start_unit(self, unit, mode="replace"):
+        return self._job("StartUnit", unit, mode)
+
+    def stop_unit(self, unit, mode="replace"):
+        return self._job("StopUnit", unit, mode)
+
+    def power_off(self):
+        """Clean shutdown, inhibitors ignored: what `systemctl poweroff -i` queues."""
+        return self._job("StartUnit", "poweroff.target", "replace-irreversibly")
+
+    def close(self):
+        self.conn.close()
+
+# -------- fake systemd --------
+class FakeSystemd:
+    """Answers Subscribe/StartUnit/StopUnit like systemd's private socket, over real D-Bus framing.
+
+    Jobs finish after delays[unit] seconds (default 0) with results.get(unit, "done");
+    units outside `units` (when given) get NoSuchUnit.  calls records (member, args).
+    """
+    def __init__(self, delays=None, results=None, units=None):
+        self.delays, self.results = dict(delays or {}), dict(results or {})
+        self.units = set(units) if units is not None else None
+        self.calls = []
+        self._ids = itertools.count(1)
+        self._server = None
+
+    def connect(self):
+        """A Manager talking to this fake over a socketpair."""
+        a, b = socket.socketpair()
+        threading.Thread(target=self._serve, args=(b,), daemon=True).start()
+        return Manager(Connection(a))
+
+    def listen(self, path):
+        """Serve connections on a UNIX socket at path from a background thread."""
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen()
+
+        def accept():
+            while True:
+                try:
+                    s, _ = self._server.accept()
+                except OSError:
+                    return
+                threading.Thread(target=self._serve, args=(s,), daemon=True).start()
+        threading.Thread(target=accept, daemon=True).start()
+
+    def close(self):
+        if self._server:
+            self._server.close()
+
+    def _serve(self, s):
+        lock = threading.Lock()
+        serial = itertools.count(1)
+
+        def send(msg):
+            with lock:
+                s.sendall(msg.encode())
+
+        def reply(to, sig="", *body):
+            send(Message(METHOD_RETURN, next(serial), {F_REPLY_SERIAL: to.serial, F_SIGNATURE: sig or None}, body))
+
+        def job_removed(job_id, path, unit, result):
+            try:
+                send(Message(SIGNAL, next(serial), {F_PATH: MANAGER_PATH, F_INTERFACE: MANAGER,
+                                                    F_MEMBER: "JobRemoved", F_SIGNATURE: "uoss"},
+                             (job_id, path, unit, result)))
+            except OSError:
+                pass  # the client has gone
+
+        try:
+            f = s.makefile("rb")
+            if f.read(1) != b"\0" or not f.readline().startswith(b"AUTH EXTERNAL"):
+                return
+            s.sendall(b"OK 0123456789abcdef0123456789abcdef\r\n")
+            if f.readline().strip() != b"BEGIN":
+                return
+            buf = b""
+            while True:
+                data = f.read1(65536)
+                if not data:
+                    return
+                buf += data
+                while True:
+                    msg, used = Message.decode(buf)
+                    if not msg:
+                        break
+                    buf = buf[used:]
+                    self.calls.append((msg.member, tuple(msg.body)))
+                    if msg.member in ("StartUnit", "StopUnit"):
+                        unit = msg.body[0]
+                        if self.units is not None and unit not in self.units:
+                            send(Message(ERROR, next(serial), {
+                                F_REPLY_SERIAL: msg.serial, F_ERROR_NAME: SYSTEMD + ".NoSuchUnit",
+                                F_SIGNATURE: "s"}, (f"Unit {unit} not found.",)))
+                            continue
+                        job_id = next(self._ids)
+                        path = f"{MANAGER_PATH}/job/{job_id}"
+                        reply(msg, "o", path)
+                        threading.Timer(self.delays.get(unit, 0.0), job_removed,
+                                        (job_id, path, unit, self.results.get(unit, "done"))).start()
+                    elif msg.member in ("Subscribe", "AddMatch"):
+                        reply(msg)
+                    elif msg.member == "Hello":
+                        reply(msg, "s", ":1.1")
+                    else:
+                        send(Message(ERROR, next(serial), {
+                            F_REPLY_SERIAL: msg.serial, F_ERROR_NAME: DBUS + ".Error.UnknownMethod",
+                            F_SIGNATURE: "s"}, (f"Unknown method {msg.member}",)))
+        except OSError:
+            pass
+        finally:
+            s.close()
+
+def main():
+    ap = argparse.ArgumentParser(description="systemd jobs over D-Bus (and a fake systemd to test against)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("start", "stop"):
+        p = sub.add_parser(name, help=f"{name} a unit and wait for the job")
+        p.add_argument("unit")
+        p.add_argument("--timeout", type=float, default=30)
+    sub.add_parser("poweroff", help="queue a clean poweroff (like systemctl poweroff -i)")
+    f = sub.add_parser("fake", help="serve a fake systemd manager on a UNIX socket")
+    f.add_argument("--socket", required=True)
+    f.add_argument("--delay", action="append", default=[], metavar="UNIT=SECONDS")
+    f.add_argument("--fail", action="append", default=[], metavar="UNIT", help="jobs on UNIT end 'failed'")
+    args = ap.parse_args()
+
+    if args.cmd == "fake":
+        delays = {u: float(s) for u, _, s in (d.partition("=") for d in args.delay)}
+        fake = FakeSystemd(delays, {u: "failed" for u in args.fail})
+        fake.listen(args.socket)
+        print(f"Fake systemd on unix:path={args.socket}", flush=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            fake.close()
+        return 0
+
+    t0 = time.monotonic()
+    try:
+        mgr = Manager()
+        if args.cmd == "poweroff":
+            print(f"Queued {mgr.power_off().path}")
+            return 0
+        job = (mgr.start_unit if args.cmd == "start" else mgr.stop_unit)(args.unit)
+        queued = time.monotonic() - t0
+        result = job.result(args.timeout)
+    except concurrent.futures.TimeoutError:   # before OSError: it is one since Python 3.11
+        print(f"{args.cmd} {args.unit}: job still running after {args.timeout:g}s", file=sys.stderr)
+        return 1
+    except (OSError, BusError) as e:
+        print(f"{args.cmd} {getattr(args, 'unit', 'poweroff.target')}: {e}", file=sys.stderr)
+        return 1
+    print(f"{args.cmd} {args.unit}: {result} (queued in {queued * 1000:.1f} ms, "
+          f"finished after {time.monotonic() - t0:.3f} s)")
+    return 0 if result == "done" else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
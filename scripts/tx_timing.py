@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""How accurately does each transmission start on the WSPR slot grid?
+
+Reads the "TX started at:" lines the transmitter writes to
+wspr-transmit.log (and its rotated, possibly gzipped segments) and reports
+the distribution of start offsets from the even minute plus the nominal
+one second, in milliseconds.  Pass/fail thresholds make it usable as a
+regression check: the exit status is 1 when one is exceeded.
+
+`bench` runs the real supervisor offline against fake_wspr.py, in a scratch
+directory, on an optionally shortened slot grid and with optional CPU load,
+TX scheduling settings (see rt_sched.py) or periodic transmitter crashes,
+then analyses the log it produced:
+
+    tx_timing.py analyze [--log PATH] [--max-p95-ms 100] ...
+    tx_timing.py bench --slots 10 [--slot-seconds 12] [--load 2] [--sched fifo:50]
+                       [--crash-every 3] [--keep]
+"""
+import argparse
+import calendar
+import glob
+import gzip
+import json
+import os
+import re
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+LOG_DIR = os.environ.get("WSPR_LOG_DIR", '/opt/wsprzero/wspr-zero/logs')
+TX_LOG = os.path.join(LOG_DIR, 'wspr-transmit.log')
+SLOT_SECONDS = 120
+NOMINAL_DELAY = 1.0     # WSPR transmissions begin one second into the slot
+SPAWN_LEAD = 4.0        # wspr_control's default, scaled with the slot in benches
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+_START = re.compile(rb'TX started at:\s*(?:UTC\s*)?(\d{4}-\d\d-\d\d)[ T](\d\d:\d\d:\d\d)(\.\d+)?')
+
+def _segments(path):
+    """Rotated segments oldest first (their names carry a UTC stamp), then the live log."""
+    rotated = sorted(p for p in glob.glob(glob.escape(path) + ".*") if not p.endswith(".tmp"))
+    return rotated + ([path] if os.path.exists(path) else [])
+
+def read_starts(path=TX_LOG):
+    """Epoch seconds of every transmission start logged in path and its rotated segments."""
+    starts = []
+    for seg in _segments(path):
+        opener = gzip.open if seg.endswith(".gz") else open
+        with opener(seg, "rb") as f:
+            for m in _START.finditer(f.read()):
+                t = calendar.timegm(time.strptime(f"{m[1].decode()} {m[2].decode()}", "%Y-%m-%d %H:%M:%S"))
+                starts.append(t + (float(m[3]) if m[3] else 0.0))
+    return sorted(starts)
+
+def offsets(starts, slot=SLOT_SECONDS, nominal=NOMINAL_DELAY):
+    """Offset of each start from its nearest slot boundary + nominal, in ms (late is positive)."""
+    out = []
+    for t in starts:
+        rel = t - nominal
+        out.append((rel - round(rel / slot) * slot) * 1000)
+    return out
+
+def skipped_slots(starts, slot=SLOT_SECONDS):
+    """Slots between consecutive starts with no transmission in them."""
+    return sum(max(0, round((b - a) / slot) - 1) for a, b in zip(starts, starts[1:]))
+
+def summarize(offs, skipped=0):
+    late = sorted(abs(x) for x in offs)
+    pct = lambda p: late[min(len(late) - 1, int(p / 100 * len(late)))]
+    return {
+        "starts": len(offs),
+        "skipped_slots": skipped,
+        "mean_ms": round(statistics.fmean(offs), 2) if offs else None,
+        "jitter_ms": round(statistics.pstdev(offs), 2) if offs else None,
+        "p50_ms": round(pct(50), 2) if offs else None,
+        "p95_ms": round(pct(95), 2) if offs else None,
+        "max_ms": round(late[-1], 2) if offs else None,
+    }
+
+def check(stats, args):
+    """Threshold violations as strings; empty means pass."""
+    fails = []
+    if stats["starts"] < args.min_starts:
+        fails.append(f"{stats['starts']} transmission starts < {args.min_starts}")
+    if not stats["starts"]:
+        return fails
+    for key, limit, value in (("mean", args.max_mean_ms, abs(stats["mean_ms"])),
+                              ("jitter", args.max_jitter_ms, stats["jitter_ms"]),
+                              ("p95", args.max_p95_ms, stats["p95_ms"]),
+                              ("max", args.max_max_ms, stats["max_ms"])):
+        if limit is not None and value > limit:
+            fails.append(f"|{key}| {value:.2f} ms > {limit} ms")
+    if args.max_skipped is not None and stats["skipped_slots"] > args.max_skipped:
+        fails.append(f"{stats['skipped_slots']} skipped slots > {args.max_skipped}")
+    return fails
+
+def report(stats, args):
+    if args.json:
+        print(json.dumps(stats))
+    else:
+        if stats["starts"]:
+            print(f"{stats['starts']} starts, {stats['skipped_slots']} skipped slot(s); offset from "
+                  f"slot + {args.nominal:g} s: mean {stats['mean_ms']:+.2f} ms, jitter (sd) "
+                  f"{stats['jitter_ms']:.2f} ms, |offset| p50 {stats['p50_ms']:.2f} / "
+                  f"p95 {stats['p95_ms']:.2f} / max {stats['max_ms']:.2f} ms")
+        else:
+            print("No transmission starts found.")
+    fails = check(stats, args)
+    for f in fails:
+        print(f"FAIL: {f}")
+    print("PASS" if not fails else "FAILED")
+    return 1 if fails else 0
+
+def cmd_analyze(args):
+    starts = read_starts(args.log)
+    return report(summarize(offsets(starts, args.slot, args.nominal), skipped_slots(starts, args.slot)), args)
+
+def cmd_bench(args):
+    scale = args.slot_seconds / SLOT_SECONDS
+    args.slot, args.nominal = args.slot_seconds, NOMINAL_DELAY * scale
+    work = tempfile.mkdtemp(prefix="wspr-bench-")
+    cfg_path = os.path.join(work, "wspr-config.json")
+    with open(cfg_path, "w") as f:
+        json.dump({"call_sign": "N0CALL", "maidenhead_grid": "AA00", "tx_band_frequency": ["20m"],
+                   "rx_band_frequency": "", "transmit_or_receive_option": "transmit"}, f)
+    env = dict(os.environ,
+               WSPR_CONFIG=cfg_path, WSPR_LOG_DIR=work, WSPR_BIN=os.path.join(HERE, "fake_wspr.py"),
+               WSPR_SLOT_SECONDS=str(args.slot_seconds), WSPR_SPAWN_LEAD=f"{SPAWN_LEAD * scale:g}",
+               WSPR_METRICS_FILE=os.path.join(work, "wspr.prom"), WSPR_READY_TIMEOUT="0",
+               WSPR_FAKE_TX_COUNT=str(args.crash_every or 0))
+    for name, value in (("WSPR_TX_SCHED", args.sched), ("WSPR_TX_CPU", args.cpu),
+                        ("WSPR_TX_IOCLASS", args.ioclass)):
+        if value is not None:
+            env[name] = value
+
+    # Run from just before one slot until the last transmission has started
+    now = time.time()
+    first = (int(now) // args.slot_seconds + 1) * args.slot_seconds
+    if first - now < SPAWN_LEAD * scale + 1:
+        first += args.slot_seconds
+    end = first + (args.slots - 1) * args.slot_seconds + args.nominal + 0.5
+    print(f"Bench: {args.slots} slots of {args.slot_seconds} s, {args.load} busy processes, "
+          f"~{end - now:.0f} s; scratch dir {work}", flush=True)
+
+    hogs = [subprocess.Popen([sys.executable, "-c", "while True: pass"]) for _ in range(args.load)]
+    try:
+        with open(os.path.join(work, "supervisor.log"), "wb") as out:
+            sup = subprocess.Popen([sys.executable, os.path.join(HERE, "wspr_control.py"), "run"],
+                                   env=env, stdout=out, stderr=subprocess.STDOUT)
+            try:
+                time.sleep(max(0.0, end - time.time()))
+            finally:
+                sup.send_signal(signal.SIGTERM)   # the supervisor flushes the log on the way out
+                sup.wait(timeout=60)
+    finally:
+        for h in hogs:
+            h.kill()
+            h.wait()
+
+    starts = [t for t in read_starts(os.path.join(work, "wspr-transmit.log")) if t >= first - 1]
+    # Every slot of the window counts, including ones missed before the first or after the last start
+    rc = report(summarize(offsets(starts, args.slot, args.nominal), args.slots - len(starts)), args)
+    if args.keep:
+        print(f"Kept {work}")
+    else:
+        shutil.rmtree(work, ignore_errors=True)
+    return rc
+
+def main():
+    ap = argparse.ArgumentParser(description="WSPR transmission start offset and jitter")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    a = sub.add_parser("analyze", help="analyse wspr-transmit.log")
+    a.add_argument("--log", default=TX_LOG)
+    a.add_argument("--slot", type=float, default=SLOT_SECONDS, help="slot length (s)")
+    a.add_argument("--nominal", type=float, default=NOMINAL_DELAY, help="intended start within the slot (s)")
+    b = sub.add_parser("bench", help="run the supervisor against fake_wspr.py and analyse the result")
+    b.add_argument("--slots", type=int, default=10, help="transmissions to wait for")
+    b.add_argument("--slot-seconds", type=int, default=SLOT_SECONDS, help="shorten the grid for quick runs")
+    b.add_argument("--load", type=int, default=0, help="busy-loop processes competing for the CPU")
+    b.add_argument("--crash-every", type=int, default=0, help="transmitter exits after this many TXs")
+    b.add_argument("--sched", help="WSPR_TX_SCHED for the run, e.g. fifo:50")
+    b.add_argument("--cpu", help="WSPR_TX_CPU for the run")
+    b.add_argument("--ioclass", help="WSPR_TX_IOCLASS for the run")
+    b.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    for p in (a, b):
+        p.add_argument("--json", action="store_true", help="print the statistics as JSON")
+        p.add_argument("--min-starts", type=int, default=1)
+        p.add_argument("--max-mean-ms", type=float, default=50, help="bias limit (default 50)")
+        p.add_argument("--max-jitter-ms", type=float, default=20, help="standard deviation limit (default 20)")
+        p.add_argument("--max-p95-ms", type=float, default=100, help="|offset| p95 limit (default 100)")
+        p.add_argument("--max-max-ms", type=float, help="worst |offset| limit (off by default)")
+        p.add_argument("--max-skipped", type=int, help="skipped slot limit (off by default)")
+    args = ap.parse_args()
+    return cmd_analyze(args) if args.cmd == "analyze" else cmd_bench(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
-import json
+import os
 import subprocess
 from datetime import datetime
-import time
+import wspr_config
 
 # Default configuration template
 DEFAULT_CONFIG = {
@@ -80,11 +80,11 @@ def get_hostname():
 
 def update_config():
     try:
-        # Check if the configuration file exists, if not, create it with default values
-        try:
-            with open('/opt/wsprzero/wspr-zero/wspr-config.json', 'r') as file:
-                config = json.load(file)
-        except FileNotFoundError:
+        # Check if the configuration file exists, if not, create it with default values.
+        # A file that exists but fails validation is left alone (ConfigError below).
+        if os.path.exists(wspr_config.CONFIG_PATH):
+            config = wspr_config.thaw(wspr_config.load())
+        else:
             config = DEFAULT_CONFIG.copy()  # Use default configuration if file not found
 
         # Update fields that are available from the local Pi
@@ -96,18 +96,21 @@ def update_config():
         config['model_number'] = model
         config['serial_number'] = serial
 
-        # Save updated configuration
-        with open('/opt/wsprzero/wspr-zero/wspr-config.json', 'w') as file:
-            json.dump(config, file, indent=4)
-
-        print("Configuration updated successfully.")
+        # Save updated configuration (atomic; skipped if nothing changed)
+        if wspr_config.write(config):
+            print("Configuration updated successfully.")
+        else:
+            print("Configuration unchanged.")
 
     except Exception as e:
         print(f"Failed to update configuration: {e}")
 
 if __name__ == "__main__":
+    # Early in boot, wait (up to 30 s) for the network instead of a fixed 30 s delay
     uptime_info, uptime_seconds = get_uptime()
     if uptime_seconds < 60:
-        time.sleep(30)  # Delay for 30 seconds if uptime is under 1 minute
+        from readiness import network_up, wait_for
+        if wait_for({"network": network_up}, 30):
+            print(f"Network not up after 30 s (uptime {uptime_info}); continuing")
     update_config()
 
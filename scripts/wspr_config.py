@@ -0,0 +1,172 @@
+"""The one place wspr-config.json is read, validated and written.
+
+load() parses and validates the file once and caches the result keyed on
+(inode, mtime, size), so a repeated load costs a single stat().  The value
+handed out is read-only (a mapping proxy with lists turned into tuples);
+thaw(cfg) gives a private, writable copy.  Problems raise ConfigError
+with the path and the offending field in the message.
+"""
+import json
+import os
+from types import MappingProxyType
+
+CONFIG_PATH = os.environ.get("WSPR_CONFIG", "/opt/wsprzero/wspr-zero/wspr-config.json")
+
+MODES = ("transmit", "receive", "")
+
+# Fields the node acts on: field -> allowed JSON types.  A wrong type here is a
+# ConfigError; every other field is kept as it is (see notes()).
+_STR = (str,)
+SCHEMA = {
+    "call_sign": _STR,
+    "maidenhead_grid": _STR,
+    "rx_band_frequency": _STR,
+    "tx_band_frequency": (str, list),
+    "transmit_or_receive_option": _STR,
+    "receivers": (list,),
+    "rx_schedule": (list,),
+}
+
+# Informational fields the check-in and the server fill in; never an error
+INFO_FIELDS = ("hostname", "MAC_address", "local_IP_address", "public_IP_address", "model_number",
+               "serial_number", "uptime", "last_checkin", "RTC_module", "setup_timestamp")
+
+class ConfigError(ValueError):
+    pass
+
+_cache = {}  # path -> ((st_ino, st_mtime_ns, st_size), frozen config)
+
+def _freeze(v):
+    if isinstance(v, dict):
+        return MappingProxyType({k: _freeze(x) for k, x in v.items()})
+    if isinstance(v, list):
+        return tuple(_freeze(x) for x in v)
+    return v
+
+def thaw(v):
+    """Writable deep copy of a config returned by load()."""
+    if isinstance(v, MappingProxyType):
+        return {k: thaw(x) for k, x in v.items()}
+    if isinstance(v, tuple):
+        return [thaw(x) for x in v]
+    return v
+
+def validate(data, source="config"):
+    """Raise ConfigError unless data matches SCHEMA; return data unchanged."""
+    if not isinstance(data, dict):
+        raise ConfigError(f"{source}: top level must be a JSON object, not {type(data).__name__}")
+    for key, types in SCHEMA.items():
+        if key in data and not isinstance(data[key], types):
+            names = " or ".join("null" if t is type(None) else t.__name__ for t in types)
+            raise ConfigError(f"{source}: '{key}' must be {names}, not {type(data[key]).__name__}")
+    tx = data.get("tx_band_frequency")
+    if isinstance(tx, list) and not all(isinstance(b, str) for b in tx):
+        raise ConfigError(f"{source}: 'tx_band_frequency' list entries must be strings")
+    _validate_schedule(data.get("rx_schedule"), f"{source}: rx_schedule")
+    for i, rx in enumerate(data.get("receivers") or ()):
+        if not isinstance(rx, dict) or not (isinstance(rx.get("band"), str) or "schedule" in rx):
+            raise ConfigError(f"{source}: receivers[{i}] must be an object with a 'band' string "
+                              "or a 'schedule'")
+        _validate_schedule(rx.get("schedule"), f"{source}: receivers[{i}].schedule")
+        dev = rx.get("device", 0)
+        if isinstance(dev, bool) or not isinstance(dev, (int, str)):
+            raise ConfigError(f"{source}: receivers[{i}].device must be an index or a serial string")
+        cpu = rx.get("cpu", 0)
+        if isinstance(cpu, bool) or not isinstance(cpu, int):
+            raise ConfigError(f"{source}: receivers[{i}].cpu must be an integer")
+    mode = data.get("transmit_or_receive_option", "")
+    if mode.strip().lower() not in MODES:
+        raise ConfigError(f"{source}: 'transmit_or_receive_option' must be 'transmit' or "
+                          f"'receive', not {mode!r}")
+    return data
+
+def notes(data):
+    """Things worth logging about a config that validates: fields this node does not
+    know (kept as they are) and informational fields that are not strings."""
+    out = []
+    unknown = sorted(k for k in data if k not in SCHEMA and k not in INFO_FIELDS)
+    if unknown:
+        out.append(f"unknown field(s) kept as they are: {', '.join(unknown)}")
+    for key in INFO_FIELDS:
+        if key in data and not isinstance(data[key], (str, type(None))):
+            out.append(f"'{key}' is {type(data[key]).__name__}, not a string")
+    return out
+
+def _validate_schedule(schedule, where):
+    """A band-hopping schedule: [{"band": "20m", "weight": 3}, ...]."""
+    if schedule is None:
+        return
+    if not isinstance(schedule, list) or not schedule:
+        raise ConfigError(f"{where} must be a non-empty list")
+    for i, entry in enumerate(schedule):
+        weight = entry.get("weight", 1) if isinstance(entry, dict) else None
+        if not isinstance(entry, dict) or not isinstance(entry.get("band"), str) \
+                or isinstance(weight, bool) or not isinstance(weight, int) or weight < 1:
+            raise ConfigError(f"{where}[{i}] must be {{\"band\": str, \"weight\": int >= 1}}")
+
+def load(path=CONFIG_PATH):
+    """Return the validated, read-only config at path (cached until the file changes)."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        raise ConfigError(f"{path}: file not found") from None
+    except OSError as e:
+        raise ConfigError(f"{path}: {e.strerror}") from None
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    hit = _cache.get(path)
+    if hit and hit[0] == key:
+        return hit[1]
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ConfigError(f"{path}: invalid JSON: {e}") from None
+    except OSError as e:
+        raise ConfigError(f"{path}: {e.strerror}") from None
+    cfg = _freeze(validate(data, path))
+    _cache[path] = (key, cfg)
+    return cfg
+
+def tx_bands(cfg):
+    """tx_band_frequency as a list (the file allows a single string too)."""
+    tx = cfg.get("tx_band_frequency") or []
+    return [tx] if isinstance(tx, str) else list(tx)
+
+def write(data, path=CONFIG_PATH):
+    """Validate data and replace the file atomically; False if it was already current.
+
+    Only the fields the node acts on are validated (SCHEMA), so a server
+    that adds fields never leaves the node on a stale config.
+
+    wspr-service.path reloads the service on every write, so an identical
+    config is not rewritten; a crash mid-write leaves the old file intact.
+    """
+    import tempfile
+    validate(data, path)
+    try:
+        if load(path) == _freeze(data):
+            return False
+    except ConfigError:
+        pass  # missing or unreadable: write it
+    fd, tmp = tempfile.mkstemp(prefix='.wspr-config.', dir=os.path.dirname(path))
+    try:
+        try:
+            st = os.stat(path)
+            os.fchmod(fd, st.st_mode & 0o7777)
+            os.fchown(fd, st.st_uid, st.st_gid)
+        except (FileNotFoundError, PermissionError):
+            os.fchmod(fd, 0o664)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        tmp = None
+        dfd = os.open(os.path.dirname(path), os.O_RDONLY)
+        try: os.fsync(dfd)
+        finally: os.close(dfd)
+    finally:
+        if tmp:
+            try: os.unlink(tmp)
+            except OSError: pass
+    return True
@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
-import json
 import subprocess
 import time
 import signal
 import sys
 import os
-import psutil
+import select
+import re
+import wspr_config
+# psutil, rotating_log, metrics and battery are imported where used, so `start`/`stop` stay cheap
 
 # --- register signal handlers immediately ---
 stop_flag = False
@@ -20,25 +22,28 @@ signal.signal(signal.SIGINT,  sigterm)
 signal.signal(signal.SIGHUP,  sighup)
 
 # --- Paths / constants ---
-CONFIG_PATH = '/opt/wsprzero/wspr-zero/wspr-config.json'
-LOG_DIR = '/opt/wsprzero/wspr-zero/logs'
-WSPR_BIN = '/opt/wsprzero/WsprryPi-zero/wspr'
+CONFIG_PATH = wspr_config.CONFIG_PATH
+LOG_DIR = os.environ.get("WSPR_LOG_DIR", '/opt/wsprzero/wspr-zero/logs')
+WSPR_BIN = os.environ.get("WSPR_BIN", '/opt/wsprzero/WsprryPi-zero/wspr')  # fake_wspr.py for offline benches
 RTLSDR_BIN = '/opt/wsprzero/rtlsdr-wsprd/rtlsdr_wsprd'
+READY_TIMEOUT = float(os.environ.get("WSPR_READY_TIMEOUT", "120"))  # max wait for clock/SDR at start
+READY_BOOT_WINDOW = float(os.environ.get("WSPR_READY_BOOT_SECS", "300"))  # uptime after which starts don't wait
+# Spool decoded spots for spot_spool.py to upload instead of letting rtlsdr_wsprd report them live
+SPOT_SPOOL = os.environ.get("WSPR_SPOT_SPOOL", "0") in ("1", "true", "yes", "on")
 
 if not os.path.isfile(WSPR_BIN):  print(f"ERROR: {WSPR_BIN} not found", flush=True)
 if not os.path.isfile(RTLSDR_BIN): print(f"ERROR: {RTLSDR_BIN} not found", flush=True)
 
 # If the config is missing/corrupt, don't crash the daemon on import.
 try:
-    with open(CONFIG_PATH) as f:
-        config = json.load(f)
-except Exception as e:
+    config = wspr_config.load(CONFIG_PATH)
+except wspr_config.ConfigError as e:
     print(f"WARNING: could not load initial config: {e}", flush=True)
     config = {}
 
 # Extract relevant data from the configuration (unchanged)
 call_sign = config.get("call_sign", "")
-tx_band_frequencies = config.get("tx_band_frequency", [])
+tx_band_frequencies = wspr_config.tx_bands(config)
 rx_band_frequency = config.get("rx_band_frequency", "")
 transmit_or_receive = config.get("transmit_or_receive_option", "")
 grid_location = config.get("maidenhead_grid", "")
@@ -50,10 +55,12 @@ def get_uptime():
 
 # -------- Original behaviors (unchanged) --------
 def transmit():
-    # TX-only delay like before
-    uptime_seconds = get_uptime()
-    if uptime_seconds < 120:
-        time.sleep(60)
+    # Early in boot TX needs a synchronised clock; wait for it rather than a fixed delay.
+    # Later starts (reloads) go ahead: an RTC-only unit never reports a synced clock.
+    if get_uptime() < READY_BOOT_WINDOW:
+        from readiness import clock_synced, wait_for
+        if wait_for({"clock": clock_synced}, READY_TIMEOUT):
+            print("WARNING: clock not synchronised; transmitting anyway", flush=True)
 
     tx_command = [
         WSPR_BIN,
@@ -83,7 +90,9 @@ def receive():
         subprocess.Popen(rx_command, stdout=log_file, stderr=subprocess.STDOUT)
 
 def stop_processes():
-    # Your safe killer (unchanged semantics)
+    # Full /proc scan: only for `stop` and orphans of the legacy `start` mode.
+    # Supervised children are stopped by process group in stop_child().
+    import psutil
     TARGET_BASENAMES = {"wspr", "rtlsdr_wsprd"}
 
     victims = []
@@ -122,6 +131,25 @@ def stop_processes():
         try: p.kill()
         except psutil.NoSuchProcess: pass
 
+def stop_child(child, timeout=5):
+    """Terminate the child's own process group; SIGKILL whatever outlives timeout."""
+    pgid = child.pid  # start_new_session=True makes the child its group leader
+    try: os.killpg(pgid, signal.SIGTERM)
+    except ProcessLookupError: pass
+    deadline = time.monotonic() + timeout
+    try:
+        child.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        pass
+    # Leader is gone (or stuck); give the rest of the group until the deadline
+    while time.monotonic() < deadline:
+        try: os.killpg(pgid, 0)
+        except ProcessLookupError: break
+        time.sleep(0.05)
+    try: os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError: pass
+    child.wait()
+
 def signal_handler(sig, frame):
     print('Stopping processes...')
     stop_processes()
@@ -129,78 +157,891 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 def load_config_fresh():
+    # Cached by wspr_config: one stat() unless the file changed
+    global config
     try:
-        with open(CONFIG_PATH) as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"WARNING: {CONFIG_PATH} missing; retrying…", flush=True)
-    except json.JSONDecodeError as e:
-        print(f"WARNING: invalid JSON in {CONFIG_PATH}: {e}; retrying…", flush=True)
-    except Exception as e:
-        print(f"WARNING: error reading {CONFIG_PATH}: {e}; retrying…", flush=True)
-    # fall back to last-known (import-time) values so we keep running
-    return {
-        "call_sign": config.get("call_sign"),
-        "tx_band_frequency": config.get("tx_band_frequency", []),
-        "rx_band_frequency": config.get("rx_band_frequency"),
-        "transmit_or_receive_option": config.get("transmit_or_receive_option", ""),
-        "maidenhead_grid": config.get("maidenhead_grid")
-    }
+        config = wspr_config.load(CONFIG_PATH)
+    except wspr_config.ConfigError as e:
+        # fall back to the last good config so we keep running
+        print(f"WARNING: {e}; keeping last good config", flush=True)
+    return config
 
-def start_child_from(cfg):
+def child_command(cfg):
+    """Return (argv, log_path) of the child this config asks for.
+
+    (None, None) when the battery governor has stopped transmitting and
+    there is no RX band to fall back on.
+    """
     tor = (cfg.get("transmit_or_receive_option") or "").strip().lower()
-    os.makedirs(LOG_DIR, exist_ok=True)
+    if tor == "transmit" and _battery and _battery.rx_only:
+        if not cfg.get("rx_band_frequency"):
+            return None, None
+        tor = "receive"  # battery governor: too little charge left to transmit
 
     if tor == "transmit":
-        if get_uptime() < 120:
-            time.sleep(60)
-
-        tx = cfg.get("tx_band_frequency", [])
-        if isinstance(tx, str):
-            tx = [tx]
-        elif not isinstance(tx, (list, tuple)):
-            tx = [str(tx)]
-
-        cmd = [WSPR_BIN, "-r", "-o", "-f", cfg["call_sign"], cfg["maidenhead_grid"], "20"] + list(tx)
+        # Below full duty wspr makes one pass of the band list per run (no -r) and the
+        # supervisor rests slots in between; see rest_slots()
+        repeat = [] if _battery and _battery.throttled else ["-r"]
+        cmd = [WSPR_BIN] + repeat + ["-o", "-f", cfg["call_sign"], cfg["maidenhead_grid"], "20"] + \
+              wspr_config.tx_bands(cfg)
         log_path = os.path.join(LOG_DIR, "wspr-transmit.log")
     elif tor == "receive":
         cmd = [RTLSDR_BIN, "-f", cfg["rx_band_frequency"], "-c", cfg["call_sign"], "-l",
-               cfg["maidenhead_grid"], "-d", "2", "-S"]
+               cfg["maidenhead_grid"], "-d", "2", "-S"] + (["-x"] if SPOT_SPOOL else [])
         log_path = os.path.join(LOG_DIR, "wspr-receive.log")
     else:
         print("Invalid configuration: transmit_or_receive_option should be 'transmit' or 'receive'.", flush=True)
         raise RuntimeError("Invalid configuration: transmit_or_receive_option should be 'transmit' or 'receive'.")
+    return cmd, log_path
+
+def start_child_from(cfg):
+    cmd, log_path = child_command(cfg)
+    if cmd is None:
+        raise RuntimeError("battery too low to transmit and no rx_band_frequency to receive on")
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    sched = {}
+    if cmd[0] == WSPR_BIN:
+        # The transmitter times its symbols in software: optional RT policy, core, I/O class
+        from rt_sched import tx_settings, describe
+        sched = tx_settings()
+        if sched:
+            print(f"Transmitter: {describe(**sched)}", flush=True)
+    return _spawn(cmd, **sched), log_path
+
+def _spawn(cmd, cpu=None, **sched):
+    # Output goes through a pipe to the supervisor's RotatingLogWriter.
+    # Own session/process group so stop_child() can signal exactly this tree.
+    # fork() copies the calling thread's affinity and policy, so every child thread has them too.
+    env = _line_buffered_env() if cmd[0] == RTLSDR_BIN else None
+    if cpu is None and not sched:
+        child = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                 start_new_session=True, env=env)
+    else:
+        from rt_sched import inherited
+        with inherited(cpu, **sched):
+            child = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                     start_new_session=True, env=env)
+    os.set_blocking(child.stdout.fileno(), False)
+    return child
+
+STDBUF_LIBS = ("/usr/libexec/coreutils/libstdbuf.so", "/usr/lib/coreutils/libstdbuf.so")
+
+def _line_buffered_env():
+    """Environment of `stdbuf -oL`: the decoder's stdio flushes each line into the pipe,
+    so the supervisor reads spots in the slot they are printed, not a buffer-full later."""
+    for lib in STDBUF_LIBS:
+        if os.path.exists(lib):
+            return dict(os.environ, LD_PRELOAD=lib, _STDBUF_O="L")
+    return None
+
+# --- event wait: signals arrive on a self-pipe, child exit on a pidfd (or SIGCHLD) ---
+_wake_r = None
+
+def _install_wakeup():
+    """Route every handled signal to a self-pipe so select() wakes on it."""
+    global _wake_r
+    if _wake_r is not None:
+        return
+    r, w = os.pipe()
+    os.set_blocking(r, False)
+    os.set_blocking(w, False)
+    signal.set_wakeup_fd(w)
+    # A Python-level handler is needed for the C handler to write the wakeup byte
+    signal.signal(signal.SIGCHLD, lambda _sig, _frm: None)
+    _wake_r = r
+
+def _drain_wakeup():
+    try:
+        while os.read(_wake_r, 512):
+            pass
+    except (BlockingIOError, InterruptedError):
+        pass
+
+def _open_pidfd(child):
+    try:
+        return os.pidfd_open(child.pid)
+    except (AttributeError, OSError):
+        return None  # old kernel/Python: SIGCHLD on the self-pipe covers it
+
+def _wait_event(pidfd=None, timeout=None, out_fd=None, fds=()):
+    """Block until a signal, child exit, child output, or timeout; return ready fds."""
+    fds = [fd for fd in (_wake_r, pidfd, out_fd, *fds) if fd is not None]
+    ready, _, _ = select.select(fds, [], [], timeout)
+    if _wake_r in ready:
+        _drain_wakeup()
+    return ready
+
+# --- child output: pipe -> batched, rotating, compressed log ---
+_log_writers = {}
+
+def _log_writer(path):
+    if path not in _log_writers:
+        from rotating_log import RotatingLogWriter
+        _log_writers[path] = RotatingLogWriter(path)
+    return _log_writers[path]
+
+def _pump_output(fd, log, spool_source=None):
+    """Copy whatever the child has written; return False once the pipe hits EOF."""
+    while True:
+        try:
+            data = os.read(fd, 65536)
+        except (BlockingIOError, InterruptedError):
+            return True
+        if not data:
+            return False
+        if spool_source:
+            _rx_output(log, data, spool_source)
+        else:
+            log.write(data)
+
+_rx_logs = {}  # receiver log path -> [slot of its last header, output so far ends mid-line]
+
+def _rx_output(log, data, source):
+    """Log (and spool) decoder output, headed by the slot it was read in at the first line read in each slot.
 
-    with open(log_path, "a") as log_file:
-        return subprocess.Popen(cmd, stdout=log_file, stderr=subprocess.STDOUT)
+    The spool gets the headers too: they date the spots that carry no time of their own.
+    """
+    slot = int(time.time()) // SLOT_SECONDS * SLOT_SECONDS
+    state = _rx_logs.setdefault(log.path, [None, False])
+    if state[0] != slot:
+        cut = data.find(b"\n") + 1 if state[1] else 0
+        if cut or not state[1]:
+            from spot_store import slot_header
+            data, state[0] = data[:cut] + slot_header(slot) + data[cut:], slot
+    log.write(data)
+    state[1] = not data.endswith(b"\n")
+    _spool_feed(data, source)
+
+def _close_logs():
+    for log in _log_writers.values():
+        try: log.close()
+        except OSError as e: print(f"WARNING: closing {log.path}: {e}", flush=True)
+    _log_writers.clear()
+
+def _earliest(*timeouts):
+    timeouts = [t for t in timeouts if t is not None]
+    return min(timeouts) if timeouts else None
+
+def _sleep_unless_stopped(seconds, wake_on_reload=False):
+    deadline = time.monotonic() + seconds
+    while not stop_flag and not (wake_on_reload and reload_flag):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        _wait_event(timeout=_earliest(remaining, _metrics and _metrics.due()))
+        if _metrics:
+            _metrics.maybe_write()
+
+# --- WSPR slot grid: children start just before a UTC even minute ---
+SLOT_SECONDS = int(os.environ.get("WSPR_SLOT_SECONDS", "120"))  # shorter only for offline benches
+SPAWN_LEAD = float(os.environ.get("WSPR_SPAWN_LEAD", "4"))  # seconds before the slot to spawn
+MAX_BACKOFF_SLOTS = 4                                       # crash-loop ceiling (8 minutes)
+HEALTHY_RUN = 2 * SLOT_SECONDS                              # a run this long clears the crash count
+
+_slots_lost = {}  # UTC date -> slots that had no child running
+
+def next_slot_start(now, lead=SPAWN_LEAD, skip=0):
+    """First slot boundary at least lead seconds after now, plus skip slots."""
+    slot = (int(now) // SLOT_SECONDS + 1) * SLOT_SECONDS
+    if slot - now < lead:
+        slot += SLOT_SECONDS
+    return slot + skip * SLOT_SECONDS
+
+def rest_slots(on, duty):
+    """Idle slots after a run of `on` TX slots, so the transmitter uses duty % of the slots."""
+    return round(on * (100 - duty) / duty)
+
+def backoff_slots(failures):
+    """Slots to skip after n consecutive failures: 0, 1, 2, 4, 4, ..."""
+    if failures <= 1:
+        return 0
+    return min(2 ** (failures - 2), MAX_BACKOFF_SLOTS)
+
+def _count_lost_slots(down_since, first_slot):
+    """Count slots from the one the child died in up to (not incl.) first_slot."""
+    lost = max(0, (int(first_slot) - int(down_since) // SLOT_SECONDS * SLOT_SECONDS) // SLOT_SECONDS)
+    if lost:
+        day = time.strftime('%Y-%m-%d', time.gmtime(first_slot))
+        _slots_lost[day] = _slots_lost.get(day, 0) + lost
+        _metric_inc("wspr_slots_lost_total", lost)
+    return lost
+
+def slots_lost_today():
+    return _slots_lost.get(time.strftime('%Y-%m-%d', time.gmtime()), 0)
+
+# --- node_exporter textfile metrics (WSPR_METRICS_FILE="" turns them off) ---
+_metrics = None
+_child_ps = None      # psutil.Process of the running child
+_child_since = None   # monotonic time it started
+_slot_cursor = None   # next slot boundary not yet counted as attempted
+
+def _init_metrics():
+    global _metrics
+    from metrics import METRICS_FILE, TextfileMetrics
+    if not METRICS_FILE:
+        return
+    m = TextfileMetrics(METRICS_FILE)
+    m.describe("wspr_child_restarts_total", "counter",
+               "Child restarts by cause (exit, reload, battery, duty, hop, config_error, start_error)")
+    m.describe("wspr_config_reloads_total", "counter", "SIGHUP config reloads")
+    m.describe("wspr_slots_attempted_total", "counter", "WSPR slots that began with the child running")
+    m.describe("wspr_slots_lost_total", "counter", "WSPR slots with no child running")
+    m.describe("wspr_child_up", "gauge", "1 while a TX/RX child is running")
+    m.describe("wspr_child_uptime_seconds", "gauge", "Seconds since the running child started")
+    m.describe("wspr_child_cpu_seconds_total", "counter", "CPU time of TX/RX children, user+system")
+    m.describe("wspr_child_rss_bytes", "gauge", "Resident memory of the running child")
+    m.describe("wspr_supervisor_cpu_seconds_total", "counter", "CPU time of this supervisor, user+system")
+    m.describe("wspr_rx_up", "gauge", "1 while this receiver's decoder runs (multi-receiver mode)")
+    m.describe("wspr_rx_spots_total", "counter", "Spots decoded per receiver")
+    m.describe("wspr_rx_cpu_seconds_total", "counter", "Decoder CPU time per receiver, user+system")
+    m.describe("wspr_rx_band_slots_total", "counter", "Slots a receiver listened on each band")
+    m.describe("wspr_rx_band_spots_total", "counter", "Spots a receiver decoded on each band")
+    if _battery:
+        m.describe("wspr_battery_soc_percent", "gauge", "UPS-Lite state of charge")
+        m.describe("wspr_battery_volts", "gauge", "UPS-Lite cell voltage")
+        m.describe("wspr_battery_runtime_hours", "gauge", "Predicted runtime left (-1: not discharging)")
+        m.describe("wspr_tx_duty_percent", "gauge", "Share of slots the battery governor lets TX use (0: none)")
+    # Export every counter series from the start so rate() has a baseline
+    for cause in ("exit", "reload", "battery", "duty", "hop", "config_error", "start_error"):
+        m.set("wspr_child_restarts_total", 0, cause=cause)
+    for name in ("wspr_config_reloads_total", "wspr_slots_attempted_total", "wspr_slots_lost_total"):
+        m.set(name, 0)
+    m.collectors.append(_sample_child)
+    _metrics = m
+
+def _metric_inc(name, n=1, **labels):
+    if _metrics:
+        _metrics.inc(name, n, **labels)
+
+def _count_attempted_slots(now):
+    global _slot_cursor
+    while _slot_cursor is not None and _slot_cursor <= now:
+        _metric_inc("wspr_slots_attempted_total")
+        _slot_cursor += SLOT_SECONDS
+
+def _sample_child():
+    import resource
+    _count_attempted_slots(time.time())
+    # Reaped children are in RUSAGE_CHILDREN; add the live one from /proc
+    ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu, rss = ru.ru_utime + ru.ru_stime, 0
+    if _child_ps is not None:
+        try:
+            with _child_ps.oneshot():
+                t = _child_ps.cpu_times()
+                cpu += t.user + t.system
+                rss = _child_ps.memory_info().rss
+        except Exception:
+            pass  # exited since the last poll; stop_child() will notice
+    own = os.times()
+    _metrics.set("wspr_child_up", int(_child_ps is not None))
+    _metrics.set("wspr_child_uptime_seconds",
+                 round(time.monotonic() - _child_since, 1) if _child_ps is not None else 0)
+    _metrics.set("wspr_child_cpu_seconds_total", round(cpu, 2))
+    _metrics.set("wspr_child_rss_bytes", rss)
+    _metrics.set("wspr_supervisor_cpu_seconds_total", round(own.user + own.system, 2))
+    if _battery:
+        left = _battery.runtime_hours()
+        _metrics.set("wspr_battery_soc_percent", round(_battery.soc, 1))
+        _metrics.set("wspr_battery_volts", _battery.volts)
+        _metrics.set("wspr_battery_runtime_hours", round(left, 2) if left is not None else -1)
+        _metrics.set("wspr_tx_duty_percent", 0 if _battery.rx_only else _battery.duty)
+
+def _track_child(child, slot):
+    global _child_ps, _child_since, _slot_cursor
+    if not _metrics:
+        return
+    import psutil
+    try:
+        _child_ps = psutil.Process(child.pid)
+    except psutil.Error:
+        _child_ps = None
+    _child_since, _slot_cursor = time.monotonic(), slot
+    _metrics.write()
+
+def _untrack_child(cause=None):
+    global _child_ps, _slot_cursor
+    if not _metrics:
+        return
+    _count_attempted_slots(time.time())
+    _child_ps = _slot_cursor = None
+    if cause:
+        _metrics.inc("wspr_child_restarts_total", cause=cause)
+    _metrics.write()
+
+# --- UPS-Lite battery governor (only when a fuel gauge answers) ---
+_battery = None
+
+def _init_battery():
+    global _battery
+    from battery import Governor
+    gov = Governor()
+    gov.sample()
+    if gov.soc is None:
+        return
+    _battery = gov
+    print(f"BATTERY: {gov.status()}", flush=True)
+
+def _battery_changed():
+    """Sample the gauge if due; True when the governor picked a new duty/mode."""
+    if _battery and _battery.maybe_sample():
+        print(f"BATTERY: {_battery.status()}", flush=True)
+        return True
+    return False
+
+# --- offline spot spool (WSPR_SPOT_SPOOL=1; drained by spot_spool.py upload) ---
+_spool = None
+
+def _init_spool():
+    global _spool
+    if SPOT_SPOOL:
+        from spot_spool import Spool
+        _spool = Spool()
+
+def _spool_feed(data, source):
+    if _spool is None:
+        return
+    try:
+        _spool.feed(data, source)
+    except OSError as e:
+        print(f"WARNING: spooling spots: {e}", flush=True)
 
 def run_supervisor():
-    global stop_flag, reload_flag
-    backoff = 5
+    _install_wakeup()
+    _init_battery()
+    _init_metrics()
+    _init_spool()
+    # One-time sweep for children orphaned by the legacy `start` mode
+    stop_processes()
+    try:
+        _supervise()
+    finally:
+        _close_logs()
+        if _spool:
+            _spool.close()
+        if _metrics:
+            _metrics.write()
+
+def _changed_fields(old, new):
+    return sorted(k for k in set(old) | set(new) if old.get(k) != new.get(k))
+
+def _reload_needs_restart(child, cfg, new_cfg):
+    """Decide (and log) whether a SIGHUP with new_cfg must restart child."""
+    fields = ", ".join(_changed_fields(cfg, new_cfg)) or "none"
+    if _multi_rx(new_cfg):
+        print(f"RELOAD: changed fields: {fields}; switching to multi-receiver mode; "
+              f"stopping pid {child.pid}", flush=True)
+        return True
+    try:
+        new_cmd, _ = child_command(new_cfg)
+    except Exception as e:
+        print(f"RELOAD: changed fields: {fields}; new config invalid ({e}); "
+              f"keeping pid {child.pid}", flush=True)
+        return False
+    if new_cmd is None:
+        print(f"RELOAD: changed fields: {fields}; battery too low to transmit and no RX band; "
+              f"stopping pid {child.pid}", flush=True)
+        return True
+    if new_cmd == child.args:
+        print(f"RELOAD: changed fields: {fields}; child command unchanged; "
+              f"keeping pid {child.pid}", flush=True)
+        return False
+    print(f"RELOAD: changed fields: {fields}; child command changed; restarting pid {child.pid}\n"
+          f"  old: {' '.join(child.args)}\n  new: {' '.join(new_cmd)}", flush=True)
+    return True
+
+_ready_gated = False
+
+def _wait_ready(cmd):
+    """At the first start after boot, block until the child's dependencies are ready
+    (or READY_TIMEOUT passes).  Crash and reload restarts go ahead at once: a unit that
+    free-runs (-f) or keeps time by RTC alone never reports a synchronised clock."""
+    global _ready_gated
+    if _ready_gated or get_uptime() >= READY_BOOT_WINDOW:
+        return
+    _ready_gated = True
+    from readiness import clock_synced, sdr_present, wait_for
+    checks = {"clock synchronised": clock_synced}
+    if cmd[0] == RTLSDR_BIN:
+        checks["RTL-SDR present"] = sdr_present
+    t0 = time.monotonic()
+    failing = wait_for(checks, READY_TIMEOUT, sleep=_sleep_unless_stopped,
+                       abort=lambda: stop_flag)
+    waited = time.monotonic() - t0
+    if failing and not stop_flag:
+        print(f"WARNING: not ready after {waited:.0f} s ({', '.join(failing)}); "
+              "starting anyway", flush=True)
+    elif waited >= 1:
+        print(f"Ready after {waited:.1f} s", flush=True)
+
+_first_slot_reported = False
+
+# --- multi-receiver mode: "receivers": [{"device": 0 | "serial", "band": "20m", "cpu": 2}, ...] ---
+# A receiver may hop bands instead: "schedule": [{"band": "20m", "weight": 3}, ...], or for a
+# single dongle the top-level "rx_schedule".  rtlsdr_wsprd cannot retune, so each run of
+# identical slots in the plan is one decoder started with -n <slots>: it finishes decoding
+# its last window and exits by itself, and the next run of the plan starts at the next
+# usable slot, however late that is.
+RX_REPORT_INTERVAL = float(os.environ.get("WSPR_RX_REPORT_SECS", "3600"))  # throughput log line
+HOP_LEAD = 1.0  # seconds of startup a hop needs before the slot it is aiming for
+_SPOT_LINE = re.compile(rb'^[^\n]*?Spot\s*:', re.M)
+
+def _multi_rx(cfg):
+    tor = (cfg.get("transmit_or_receive_option") or "").strip().lower()
+    return tor == "receive" and bool(cfg.get("receivers") or cfg.get("rx_schedule"))
+
+def hop_plan(schedule):
+    """Band for each slot of one hopping cycle; each band holds `weight` consecutive slots."""
+    return tuple(e["band"] for e in schedule for _ in range(e.get("weight", 1)))
+
+def plan_run(plan, pos):
+    """(band, slots, next pos) of the run starting at position pos of the plan: up to
+    the next band change.  A receiver walks the plan run by run, so a hop that lands a
+    slot late still takes the next band:
+
+    >>> plan, pos, runs = hop_plan([{"band": "20m", "weight": 3}, {"band": "40m"}]), 0, []
+    >>> for _ in range(4):
+    ...     band, slots, pos = plan_run(plan, pos)
+    ...     runs.append((band, slots))
+    >>> runs
+    [('20m', 3), ('40m', 1), ('20m', 3), ('40m', 1)]
+    >>> [plan_run(("20m", "40m"), pos)[0] for pos in (0, 1, 0, 1)]
+    ['20m', '40m', '20m', '40m']
+    """
+    band, n = plan[pos], 1
+    while n < len(plan) and plan[(pos + n) % len(plan)] == band:
+        n += 1
+    if n == len(plan):
+        return band, None, pos  # a one-band plan never hops
+    return band, n, (pos + n) % len(plan)
+
+def _decoder_cpus(n):
+    """Default CPU per decoder: spread over the cores, core 0 (USB IRQs, supervisor) last."""
+    cores = sorted(os.sched_getaffinity(0))
+    order = cores[1:] + cores[:1]
+    return [order[i % len(order)] for i in range(n)]
+
+def receiver_specs(cfg):
+    """[(name, device, band, cpu, plan)] for each receiver; band is None when it hops."""
+    rxs = cfg.get("receivers") or ()
+    if not rxs and cfg.get("rx_schedule"):
+        rxs = [{"device": 0, "schedule": cfg["rx_schedule"]}]
+    specs = []
+    for rx, cpu in zip(rxs, _decoder_cpus(len(rxs))):
+        dev = rx.get("device", 0)
+        plan = hop_plan(rx["schedule"]) if rx.get("schedule") else None
+        name = re.sub(r'[^A-Za-z0-9._-]', '_', f"hop-{dev}" if plan else f"{rx['band']}-{dev}")
+        specs.append((name, dev, None if plan else rx["band"], rx.get("cpu", cpu), plan))
+    return specs
+
+def receiver_command(cfg, device, band, slots=None):
+    from readiness import sdr_index
+    cmd = [RTLSDR_BIN, "-f", band, "-c", cfg["call_sign"], "-l", cfg["maidenhead_grid"],
+           "-d", "2", "-S", "-i", str(sdr_index(device))] + (["-x"] if SPOT_SPOOL else [])
+    return cmd + ["-n", str(slots)] if slots else cmd
+
+class _Receiver:
+    """One decoder of multi-receiver mode: own process, log, backoff and CPU."""
+    def __init__(self, name, device, band, cpu, plan=None):
+        self.name, self.device, self.band, self.cpu, self.plan = name, device, band, cpu, plan
+        self.log_path = os.path.join(LOG_DIR, f"wspr-receive-{name}.log")
+        self.run_slots = None   # -n of the current run when hopping
+        self.plan_pos = None    # position in the plan of the current (or next) run
+        self.next_pos = None    # ...and of the run after it
+        self.bands = {}         # band -> [slots listened, spots]
+        self.hop_since = time.monotonic()
+        self.child = self.pidfd = self.ps = None
+        self.failures = 0
+        self.down_since = None
+        self.started = None
+        self.slot = self.start_at = None
+        self.spots = 0
+        self.cpu_done = 0.0     # CPU seconds of earlier runs
+        self.cpu_live = 0.0     # last sample of the running decoder
+        self.reported = (0, 0.0)  # (spots, cpu) at the last throughput report
+        self._tail = b""
+        self.schedule()
+
+    def spec(self):
+        return self.device, None if self.plan else self.band, self.cpu, self.plan
+
+    def command(self, cfg):
+        if self.plan:
+            if self.plan_pos is None:  # first run: where the slot falls in the cycle
+                self.plan_pos = int(self.slot) // SLOT_SECONDS % len(self.plan)
+            self.band, self.run_slots, self.next_pos = plan_run(self.plan, self.plan_pos)
+        return receiver_command(cfg, self.device, self.band, self.run_slots)
+
+    def schedule(self):
+        self.slot = next_slot_start(time.time(), skip=backoff_slots(self.failures))
+        self.start_at = self.slot - SPAWN_LEAD
+
+    def start(self, cfg):
+        if self.down_since is not None:
+            lost = _count_lost_slots(self.down_since, self.slot)
+            if lost or not self.plan:
+                print(f"RX {self.name}: restarting for slot {time.strftime('%H:%M', time.gmtime(self.slot))}Z; "
+                      f"{lost} slot(s) lost", flush=True)
+        try:
+            cmd = self.command(cfg)
+            os.makedirs(LOG_DIR, exist_ok=True)
+            self.child = _spawn(cmd, self.cpu)
+        except Exception as e:
+            print(f"ERROR: RX {self.name}: failed to start: {e}", flush=True)
+            _metric_inc("wspr_child_restarts_total", cause="start_error")
+            self.down_since = self.down_since or time.time()
+            self.failures += 1
+            self.schedule()
+            return
+        import psutil
+        try:
+            self.ps = psutil.Process(self.child.pid)
+        except psutil.Error:
+            self.ps = None
+        self.pidfd = _open_pidfd(self.child)
+        self.started = time.monotonic()
+        print(f"RX {self.name}: pid {self.child.pid} on cpu{self.cpu}: {' '.join(cmd)}", flush=True)
+
+    def fds(self):
+        if self.child is None:
+            return []
+        return [fd for fd in (self.pidfd, None if self.child.stdout.closed else self.child.stdout.fileno())
+                if fd is not None]
+
+    def pump(self):
+        """Copy the decoder's output to its log, counting spot lines."""
+        log = _log_writer(self.log_path)
+        fd = self.child.stdout.fileno()
+        while True:
+            try:
+                data = os.read(fd, 65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            if not data:
+                self.child.stdout.close()
+                return
+            _rx_output(log, data, self.name)
+            buf = self._tail + data
+            cut = buf.rfind(b"\n") + 1
+            n = len(_SPOT_LINE.findall(buf, 0, cut))
+            self.spots += n
+            self.bands.setdefault(self.band, [0, 0])[1] += n
+            self._tail = buf[cut:][-512:]
+
+    def sample_cpu(self):
+        if self.ps is not None:
+            try:
+                t = self.ps.cpu_times()
+                self.cpu_live = t.user + t.system
+            except Exception:
+                pass
+        return self.cpu_done + self.cpu_live
+
+    def stop(self, cause=None):
+        """Stop the decoder (cause None: shutting down or reconfigured)."""
+        self.sample_cpu()
+        if self.pidfd is not None:
+            os.close(self.pidfd)
+        stop_child(self.child)
+        if not self.child.stdout.closed:
+            self.pump()
+            self.child.stdout.close()
+        _log_writer(self.log_path).flush()
+        self.cpu_done += self.cpu_live
+        self.cpu_live = 0.0
+        self.down_since = now = time.time()
+        run_end = self.slot + self.run_slots * SLOT_SECONDS if self.run_slots else now
+        returncode, self.child, self.pidfd, self.ps = self.child.returncode, None, None, None
+        # -n ran out: the decoder exits once its last window is decoded, late in the final slot
+        hopped = cause and self.run_slots and returncode == 0 and now > run_end - SLOT_SECONDS
+        listened = self.run_slots if hopped else int(min(now, run_end) - self.slot) // SLOT_SECONDS
+        self.bands.setdefault(self.band, [0, 0])[0] += max(0, listened)
+        if hopped:
+            # Planned hop: the decoder finished its last window; the next run of the plan
+            # takes the next free slot, even if finishing late cost one
+            _metric_inc("wspr_child_restarts_total", cause="hop")
+            self.down_since = run_end
+            self.plan_pos = self.next_pos
+            self.slot = next_slot_start(now, lead=HOP_LEAD)
+            self.start_at = self.slot - HOP_LEAD
+            print(f"RX {self.name}: {self.band} done after {self.run_slots} slot(s); next: "
+                  f"{plan_run(self.plan, self.plan_pos)[0]} at {time.strftime('%H:%M', time.gmtime(self.slot))}Z",
+                  flush=True)
+        elif cause:
+            if self.run_slots and listened > 0:  # crashed mid-run: resume after the slots it did hear
+                self.plan_pos = (self.plan_pos + min(listened, self.run_slots)) % len(self.plan)
+            _metric_inc("wspr_child_restarts_total", cause=cause)
+            self.failures = 1 if time.monotonic() - self.started >= HEALTHY_RUN else self.failures + 1
+            self.schedule()
+            print(f"RX {self.name}: exited with {returncode}; restarting after "
+                  f"{backoff_slots(self.failures)} skipped slot(s)", flush=True)
+
+def _report_rx(rxs, elapsed):
+    """Log spots/h and CPU use per decoder and per core since the last report."""
+    cores = {}
+    for rx in rxs.values():
+        total = rx.sample_cpu()
+        spots, cpu = rx.spots - rx.reported[0], total - rx.reported[1]
+        rx.reported = (rx.spots, total)
+        c = cores.setdefault(rx.cpu, [0, 0.0, []])
+        c[0] += spots; c[1] += cpu; c[2].append(rx.name)
+    print("RX throughput over %.0f min: " % (elapsed / 60) + "; ".join(
+        f"cpu{core} [{', '.join(names)}] {spots * 3600 / elapsed:.0f} spots/h, "
+        f"{cpu / elapsed * 100:.1f}% busy, {spots / cpu if cpu else 0:.2f} spots/CPU-s"
+        for core, (spots, cpu, names) in sorted(cores.items())), flush=True)
+    for rx in rxs.values():
+        if rx.plan:
+            print(f"RX {rx.name}: {_hop_comparison(rx)}", flush=True)
+
+def _hop_comparison(rx):
+    """Hopped vs fixed: spots per hour listened on each band, and what hopping yields overall."""
+    listened = {b: (slots, spots) for b, (slots, spots) in rx.bands.items() if slots}
+    if not listened:
+        return "no complete slots yet"
+    rate = {b: spots * 3600 / (slots * SLOT_SECONDS) for b, (slots, spots) in listened.items()}
+    slots = sum(s for s, _ in listened.values())
+    spots = sum(n for _, n in listened.values())
+    best = max(rate, key=rate.get)
+    wall = (time.monotonic() - rx.hop_since) / SLOT_SECONDS
+    return (", ".join(f"{b} {rate[b]:.0f} spots/h over {listened[b][0]} slot(s)" for b in sorted(rate))
+            + f"; hopped {spots * 3600 / (slots * SLOT_SECONDS):.0f} spots/h while listening, "
+              f"{slots / wall * 100 if wall else 0:.0f}% of slots listened, "
+              f"{len(listened)} band(s); fixed on {best} would give ~{rate[best]:.0f} spots/h on one band")
+
+def _supervise_receivers(cfg):
+    """Run one decoder per cfg["receivers"] entry; return the new config if a reload leaves this mode."""
+    global reload_flag
+    rxs = {}
+
+    def sync(cfg):
+        wanted = {spec[0]: spec for spec in receiver_specs(cfg)}
+        for name, rx in list(rxs.items()):
+            spec = wanted.get(name)
+            if spec and spec[1:] == rx.spec() and (rx.child is None or _rx_args_current(rx, cfg)):
+                continue
+            if rx.child is not None:
+                rx.stop()
+            del rxs[name]
+            print(f"RX {name}: {'reconfigured' if spec else 'removed'}", flush=True)
+        for name, spec in wanted.items():
+            if name not in rxs:
+                rxs[name] = _Receiver(*spec)
+
+    def collect():
+        for name in ("wspr_rx_up", "wspr_rx_spots_total", "wspr_rx_cpu_seconds_total",
+                     "wspr_rx_band_slots_total", "wspr_rx_band_spots_total"):
+            _metrics.forget(name)
+        for rx in rxs.values():
+            labels = dict(receiver=rx.name, band="hop" if rx.plan else rx.band, cpu=rx.cpu)
+            _metrics.set("wspr_rx_up", int(rx.child is not None), receiver=rx.name)
+            _metrics.set("wspr_rx_spots_total", rx.spots, **labels)
+            _metrics.set("wspr_rx_cpu_seconds_total", round(rx.sample_cpu(), 2), **labels)
+            for band, (slots, spots) in rx.bands.items():
+                _metrics.set("wspr_rx_band_slots_total", slots, receiver=rx.name, band=band)
+                _metrics.set("wspr_rx_band_spots_total", spots, receiver=rx.name, band=band)
+
+    _wait_ready([RTLSDR_BIN])
+    sync(cfg)
+    if _metrics:
+        _metrics.collectors.append(collect)
+    report_from = time.monotonic()
+    try:
+        while not stop_flag:
+            if reload_flag:
+                reload_flag = False
+                _metric_inc("wspr_config_reloads_total")
+                new_cfg = load_config_fresh()
+                print(f"RELOAD: changed fields: {', '.join(_changed_fields(cfg, new_cfg)) or 'none'}",
+                      flush=True)
+                if not _multi_rx(new_cfg):
+                    return new_cfg
+                cfg = new_cfg
+                sync(cfg)
+            for rx in rxs.values():
+                if rx.child is None and time.time() >= rx.start_at:
+                    rx.start(cfg)
+
+            now = time.time()
+            timeouts = [max(0.0, rx.start_at - now) for rx in rxs.values() if rx.child is None]
+            timeouts += [_log_writer(rx.log_path).flush_due() for rx in rxs.values()]
+            timeouts += [_metrics and _metrics.due(),
+                         max(0.0, report_from + RX_REPORT_INTERVAL - time.monotonic())]
+            ready = _wait_event(timeout=_earliest(*timeouts),
+                                fds=[fd for rx in rxs.values() for fd in rx.fds()])
+
+            for rx in rxs.values():
+                if rx.child is None:
+                    continue
+                if not rx.child.stdout.closed and rx.child.stdout.fileno() in ready:
+                    rx.pump()
+                if rx.child.poll() is not None:
+                    rx.stop(cause="exit")
+                _log_writer(rx.log_path).maybe_flush()
+            if _metrics:
+                _metrics.maybe_write()
+            if time.monotonic() - report_from >= RX_REPORT_INTERVAL:
+                _report_rx(rxs, time.monotonic() - report_from)
+                report_from = time.monotonic()
+    finally:
+        for rx in rxs.values():
+            if rx.child is not None:
+                rx.stop()
+        if _metrics:
+            rxs.clear()
+            collect()
+            _metrics.collectors.remove(collect)
+    return None
+
+def _rx_args_current(rx, cfg):
+    try:
+        return rx.command(cfg) == rx.child.args
+    except Exception:
+        return False
+
+def _duty_run(child):
+    """A transmitter run without -r: one pass of its bands, then it exits by itself."""
+    return child.args[0] == WSPR_BIN and "-r" not in child.args
+
+def _wait_for_charge():
+    """Idle while the governor allows no TX and there is no RX band to use instead."""
+    global reload_flag
+    print(f"BATTERY: {_battery.status()}; no rx_band_frequency, so nothing runs until it recovers",
+          flush=True)
+    while not stop_flag and not reload_flag and not _battery_changed():
+        _wait_event(timeout=_earliest(_battery.due(), _metrics and _metrics.due()))
+        if _metrics:
+            _metrics.maybe_write()
+    if reload_flag:
+        reload_flag = False
+        _metric_inc("wspr_config_reloads_total")
+
+def _supervise():
+    global reload_flag, _first_slot_reported
+    failures = 0          # consecutive crashes / failed starts
+    down_since = None     # wall time the previous child stopped
+    resume_slot = None    # first slot after a duty-cycle rest
+    next_cfg = None
     while not stop_flag:
-        cfg = load_config_fresh()
+        cfg = next_cfg or load_config_fresh()
+        next_cfg = None
+        if _multi_rx(cfg):
+            next_cfg = _supervise_receivers(cfg)
+            continue
+        _battery_changed()
         try:
-            child = start_child_from(cfg)
+            cmd, _ = child_command(cfg)
         except Exception as e:
             print(f"ERROR: failed to start child: {e}", flush=True)
-            time.sleep(backoff)
-            backoff = min(backoff * 2, 60)
+            _metric_inc("wspr_child_restarts_total", cause="config_error")
+            failures += 1
+            # A bad config won't fix itself: wait for the next reload (or a few slots)
+            _sleep_unless_stopped((backoff_slots(failures) + 1) * SLOT_SECONDS, wake_on_reload=True)
+            reload_flag = False
+            continue
+        if cmd is None:
+            down_since = resume_slot = None  # a deliberate pause, not lost slots
+            _wait_for_charge()
             continue
 
-        while child.poll() is None and not stop_flag and not reload_flag:
-            time.sleep(1)
+        _wait_ready(cmd)
+        if stop_flag:
+            break
 
+        # Spawn just ahead of the next usable even-minute slot
+        slot = max(next_slot_start(time.time(), skip=backoff_slots(failures)), resume_slot or 0)
+        resume_slot = None
+        _sleep_unless_stopped(slot - SPAWN_LEAD - time.time())
         if stop_flag:
-            stop_processes()
             break
         if reload_flag:
             reload_flag = False
-            stop_processes()
-            backoff = 5
+            _metric_inc("wspr_config_reloads_total")
+            cfg = load_config_fresh()
+        if down_since is not None:
+            lost = _count_lost_slots(down_since, slot)
+            print(f"Restarting for slot {time.strftime('%H:%M', time.gmtime(slot))}Z; "
+                  f"{lost} slot(s) lost, {slots_lost_today()} today", flush=True)
+
+        try:
+            child, log_path = start_child_from(cfg)
+        except Exception as e:
+            print(f"ERROR: failed to start child: {e}", flush=True)
+            _metric_inc("wspr_child_restarts_total", cause="start_error")
+            down_since = down_since or time.time()
+            failures += 1
+            continue
+        started = time.monotonic()
+        _track_child(child, slot)
+        if not _first_slot_reported:
+            _first_slot_reported = True
+            print(f"First {'TX' if cmd[0] == WSPR_BIN else 'RX'} slot at "
+                  f"{get_uptime() + slot - time.time():.0f} s after power-on", flush=True)
+
+        log = _log_writer(log_path)
+        spool_source = log_path if cmd[0] == RTLSDR_BIN else None
+        out_fd = child.stdout.fileno()
+        pidfd = _open_pidfd(child)
+        cause = "exit"
+        try:
+            while child.poll() is None and not stop_flag:
+                if reload_flag:
+                    reload_flag = False
+                    _metric_inc("wspr_config_reloads_total")
+                    new_cfg = load_config_fresh()
+                    if _reload_needs_restart(child, cfg, new_cfg):
+                        next_cfg, cause = new_cfg, "reload"
+                        break
+                    cfg = new_cfg
+                # A duty-cycled run ends after its pass anyway; don't cut a transmission short
+                if _battery_changed() and child_command(cfg)[0] != child.args and not _duty_run(child):
+                    new_cmd = child_command(cfg)[0]
+                    print(f"BATTERY: restarting pid {child.pid} as: "
+                          f"{' '.join(new_cmd) if new_cmd else 'nothing (no TX, no RX band)'}", flush=True)
+                    next_cfg, cause = cfg, "battery"
+                    break
+                timeout = _earliest(log.flush_due(), _metrics and _metrics.due(),
+                                    _battery and _battery.due())
+                ready = _wait_event(pidfd, timeout, out_fd if not child.stdout.closed else None)
+                if out_fd in ready and not _pump_output(out_fd, log, spool_source):
+                    child.stdout.close()  # child closed its output; stop watching it
+                log.maybe_flush()
+                if _metrics:
+                    _metrics.maybe_write()
+        finally:
+            if pidfd is not None:
+                os.close(pidfd)
+
+        # Every path stops the group (a crashed child may leave stragglers)
+        stop_child(child)
+        down_since = time.time()
+        if not child.stdout.closed:
+            _pump_output(out_fd, log, spool_source)
+            child.stdout.close()
+        log.flush()
+        duty_done = cause == "exit" and child.returncode == 0 and _duty_run(child)
+        _untrack_child(None if stop_flag else "duty" if duty_done else cause)
+
+        if stop_flag:
+            break
+        if next_cfg is not None:
+            failures = 0
+            continue
+        if duty_done:
+            # The pass went out on the grid from `slot`; rest so TX keeps to the governor's share
+            on = len(wspr_config.tx_bands(cfg))
+            resume_slot = slot + on * SLOT_SECONDS
+            failures, down_since = 0, None
+            if _battery and _battery.throttled:  # otherwise the next pass decides: full TX, RX or none
+                rest = rest_slots(on, _battery.duty)
+                resume_slot += rest * SLOT_SECONDS
+                print(f"TX duty {_battery.duty}%: {on} slot(s) sent, resting {rest}; next TX at "
+                      f"{time.strftime('%H:%M', time.gmtime(resume_slot))}Z", flush=True)
             continue
 
-        time.sleep(backoff)
-        backoff = min(backoff * 2, 60)
+        failures = 1 if time.monotonic() - started >= HEALTHY_RUN else failures + 1
+        print(f"Child exited with {child.returncode}; restarting after "
+              f"{backoff_slots(failures)} skipped slot(s)", flush=True)
 
 # -------- CLI entrypoint (start/stop unchanged; run added) --------
 if __name__ == "__main__":
@@ -208,9 +1049,11 @@ if __name__ == "__main__":
         print("Usage: python wspr_control.py <start|stop|run>")
         sys.exit(1)
 
-    # Original handlers for start/stop (unchanged)
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    # Original handlers for start/stop (unchanged); `run` keeps the flag handlers
+    # above so the supervisor stops its own child and writes its final metrics
+    if sys.argv[1] != "run":
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
 
     if sys.argv[1] == "start" and (not call_sign or not grid_location):
         print("ERROR: missing call_sign or maidenhead_grid in config")